@@ -1,14 +1,27 @@
 from flask import Flask, Response, render_template, send_file, redirect, request, jsonify
 import time
 import json
-import csv
 import os
 import sys
 import pandas as pd
 import datetime
-from io import StringIO
+import functools
+import hashlib
 import geoip2.database
-import subprocess
+import urllib.request
+
+from dashboard.anomaly_index import AnomalyIndex
+from dashboard.attack_index import AttackIndex
+from dashboard.jobs import JOB_KINDS, JobManager
+from dashboard.label_store import LabelStore
+from dashboard.log_export import (
+    RENDERERS, ExportFilter, OffsetIndex, gzip_stream, iter_commands, normalize_timestamp,
+)
+from dashboard.log_tailer import LogTailer
+from dashboard.stream_events import EventFilter, build_stream_event
+from data_processing.dataset_manager import DatasetManager
+from honeypot_server.event_store import FILTER_COLUMNS, connect as connect_event_store, query_events
+from honeypot_server.metrics import parse_prometheus_text
 
 app = Flask(__name__)
 
@@ -30,6 +43,21 @@ LOG_FILE_PATH = "logs/ssh_log.log"
 ANOMALOUS_COMMANDS_FILE = "logs/anomalous_commands.csv"
 LABELED_DATA_FILE = "model_assets/labeled_anomalies.csv"
 ATTACK_DATA_FILE = "model_assets/attack_data.csv"
+ATTACK_DATA_INDEX_FILE = "model_assets/attack_data.index.json"
+ATTACK_INDEX_FILE = "logs/attack_index.json"
+# SQLite event store written by the SSH runtime ([event_store] in config.ini)
+EVENT_STORE_PATH = os.environ.get("HONEYPOT_EVENT_STORE", "logs/events.db")
+EVENTS_PAGE_LIMIT = 1000
+# Review queue page size, and the most one request may ask for
+ANOMALY_PAGE_SIZE = 500
+ANOMALY_PAGE_LIMIT = 5000
+BULK_LABEL_LIMIT = 50000
+# GeoIP answers are cached per process and by browsers
+GEOIP_CACHE_SIZE = 65536
+GEOIP_BATCH_LIMIT = 1000
+GEOIP_MAX_AGE = 86400
+# Where the SSH runtime serves its Prometheus metrics ([metrics] in config.ini)
+RUNTIME_METRICS_URL = os.environ.get("HONEYPOT_METRICS_URL", "http://127.0.0.1:9108/metrics")
 
 # Create necessary directories if they don't exist
 os.makedirs('logs', exist_ok=True)
@@ -43,6 +71,7 @@ if not os.path.exists(ANOMALOUS_COMMANDS_FILE):
 # Track processed anomalies to avoid duplicate notifications
 processed_anomalies = set()
 
+@functools.lru_cache(maxsize=GEOIP_CACHE_SIZE)
 def get_location(ip_address):
     try:
         if not geo_db_available:
@@ -65,59 +94,82 @@ def get_location(ip_address):
         print(f"GeoIP lookup failed: {e}")
         return None
 
+# Sparse timestamp → offset index, so exports seek straight to their range
+log_offset_index = OffsetIndex(LOG_FILE_PATH)
+
+# Hashed index of the training set, for incremental integration
+dataset_manager = DatasetManager(ATTACK_DATA_FILE, ATTACK_DATA_INDEX_FILE)
+
+# Append-only label journal (latest label per command wins)
+label_store = LabelStore(LABELED_DATA_FILE)
+
+# Unlabeled anomalies, refreshed from the files only when they change
+anomaly_index = AnomalyIndex(ANOMALOUS_COMMANDS_FILE, label_store)
+
+def training_job_succeeded(job):
+    # A published LSTM is what "trained on this dataset version" means
+    if job.kind == "lstm" and job.dataset_version:
+        dataset_manager.mark_trained(job.dataset_version)
+
+# Training runs, one at a time in a worker process
+training_jobs = JobManager(on_success=training_job_succeeded)
+
+# Per-IP attack counts, updated incrementally from the log
+attack_index = AttackIndex(LOG_FILE_PATH, ATTACK_INDEX_FILE, get_location)
+
+def geoip_response(body):
+    """JSON response browsers may cache, revalidated by ETag."""
+    response = jsonify(body)
+    response.set_etag(hashlib.sha1(
+        json.dumps(body, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = GEOIP_MAX_AGE
+    return response.make_conditional(request)
+
 @app.route("/geoip/<ip>")
 def geo_lookup(ip):
-    return get_location(ip) or {"latitude": 0, "longitude": 0}
+    return geoip_response(get_location(ip) or {"latitude": 0, "longitude": 0})
+
+@app.route("/api/geoip", methods=["GET", "POST"])
+def geo_lookup_batch():
+    """
+    Locations of many IPs at once: ?ips=a,b,c or a JSON body {"ips": [...]}.
+    Returns {"locations": {ip: location or null}}.
+    """
+    if request.method == "POST":
+        ips = (request.get_json(silent=True) or {}).get("ips") or []
+    else:
+        ips = [ip for ip in request.args.get("ips", "").split(",") if ip]
+    if not isinstance(ips, list):
+        return jsonify({"error": "ips must be a list"}), 400
+    ips = sorted(set(str(ip).strip() for ip in ips))
+    if len(ips) > GEOIP_BATCH_LIMIT:
+        return jsonify({"error": f"At most {GEOIP_BATCH_LIMIT} IPs per request"}), 400
+    return geoip_response({"locations": {ip: get_location(ip) for ip in ips}})
 
 @app.route('/api/attack-data')
 def attack_data():
-    """Get attack data for the map visualization."""
-    attack_locations = []
-    ip_counts = {}
-
-    # Check if log file exists
-    if not os.path.exists(LOG_FILE_PATH):
-        return jsonify([])
+    """
+    Get attack data for the map visualization. With bbox=west,south,east,north
+    and zoom, returns the clusters covering that viewport; without them, one
+    point per IP.
+    """
+    attack_index.ensure_started()
+    if 'bbox' not in request.args:
+        return jsonify(attack_index.attack_locations())
 
     try:
-        # Read the log file
-        with open(LOG_FILE_PATH, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    src_ip = data.get("src_ip")
-
-                    # Skip if no IP address
-                    if not src_ip:
-                        continue
-
-                    # Count occurrences of each IP
-                    if src_ip in ip_counts:
-                        ip_counts[src_ip] += 1
-                    else:
-                        ip_counts[src_ip] = 1
-
-                except json.JSONDecodeError:
-                    continue
-
-        # Process IP addresses to get location data
-        for ip, count in ip_counts.items():
-            location = get_location(ip)
-            if location and location.get("latitude") and location.get("longitude"):
-                attack_locations.append({
-                    "ip": ip,
-                    "lat": location.get("latitude"),
-                    "lng": location.get("longitude"),
-                    "count": count,
-                    "country": location.get("country", "Unknown"),
-                    "city": location.get("city", "Unknown")
-                })
-
-        return jsonify(attack_locations)
+        west, south, east, north = (float(v) for v in request.args['bbox'].split(','))
+        zoom = int(request.args.get('zoom', 2))
+    except ValueError:
+        return jsonify({"error": "bbox must be west,south,east,north and zoom an integer"}), 400
+    return jsonify(attack_index.clusters(west, south, east, north, zoom))
 
-    except Exception as e:
-        print(f"Error generating attack data: {e}")
-        return jsonify([])
+@app.route('/api/attack-data/status')
+def attack_data_status():
+    attack_index.ensure_started()
+    return jsonify(attack_index.stats())
 
 def check_for_anomalous_commands():
     """Check for new anomalous commands and send them to the event stream"""
@@ -142,218 +194,190 @@ def check_for_anomalous_commands():
         print(f"Error checking anomalous commands: {e}")
         return []
 
-def generate_log_stream():
-    if not os.path.exists(LOG_FILE_PATH):
-        print(f"❌ Log file not found at: {LOG_FILE_PATH}", file=sys.stderr)
-        return
-
-    with open(LOG_FILE_PATH, "r", encoding="utf-8") as f:
-        f.seek(0, os.SEEK_END)
+# One tailer thread follows the log for every /stream client.
+log_tailer = LogTailer(LOG_FILE_PATH, lambda data: build_stream_event(data, get_location))
 
+def generate_log_stream(subscription):
+    try:
         # Send initial connection message
-        yield "data: 🔌 Connected to log stream\n\n"
-
-        # Track last connection message time to avoid too many
-        last_connection_msg_time = time.time()
-        # Set throttle interval to 30 seconds
-        connection_msg_throttle = 30
-
-        while True:
-            # Check if we need to send a keepalive message
-            current_time = time.time()
-            send_keepalive = False
-
-            # Only send keepalive messages every 30 seconds
-            if current_time - last_connection_msg_time > connection_msg_throttle:
-                send_keepalive = True
-                last_connection_msg_time = current_time
-
-            # Check for new log lines
-            line = f.readline()
-            if line:
-                try:
-                    data = json.loads(line)
-                    print("📥 Parsed log line:", data)
-
-                    message = data.get("message", "")
-                    timestamp = data.get("timestamp", "N/A")
-                    src_ip = data.get("src_ip", "N/A")
-                    location_data = data.get("location", "Unknown")
-
-                    if location_data == "Unknown":
-                        loc = get_location(src_ip)
-                        if loc:
-                            city = loc.get("city") or ""
-                            country = loc.get("country") or ""
-                            location_data = f"{city}, {country}".strip(", ")
-
-                    formatted_lines = []
-
-                    if message == "Command Classified":
-                        command = data.get("command", "N/A")
-                        classification = data.get("classification", "N/A")
-                        formatted_lines = [
-                            f"[{timestamp}] 🌍 IP: {src_ip} ({location_data})",
-                            f"💻 Command: {command}",
-                            f"⚠️ Classification: {classification}",
-                            "-" * 60,
-                        ]
-                    elif message == "SSH connection received":
-                        formatted_lines = [
-                            f"[{timestamp}] 🔌 New SSH connection from {src_ip} ({location_data})",
-                            "-" * 60,
-                        ]
-                    elif message == "User attempting to authenticate":
-                        username = data.get("username", "N/A")
-                        formatted_lines = [
-                            f"[{timestamp}] 🧪 Auth attempt for user: {username} from {src_ip} ({location_data})",
-                        ]
-                    elif message == "Authentication success":
-                        username = data.get("username", "N/A")
-                        formatted_lines = [
-                            f"[{timestamp}] ✅ Authentication success for user: {username} from {src_ip} ({location_data})",
-                        ]
-                    elif message == "Authentication failed":
-                        username = data.get("username", "N/A")
-                        formatted_lines = [
-                            f"[{timestamp}] ❌ Authentication failed for user: {username} from {src_ip} ({location_data})",
-                        ]
-                    elif message == "Session Summary":
-                        summary = data.get("summary", "")
-                        formatted_lines = [summary]
-
-                    if formatted_lines:
-                        sse_data = "\n".join([f"data: {line}" for line in formatted_lines]) + "\n\n"
-                        print("🚀 Yielding:", sse_data)
-                        yield sse_data
-
-                except json.JSONDecodeError as e:
-                    print(f"❌ JSON parse error: {e}")
-                    continue
-                except Exception as e:
-                    print(f"❌ Unknown error: {e}")
-                    continue
-            else:
-                # Only send a keepalive message if it's time (based on our throttle check at the top)
-                if send_keepalive:
-                    # Use a silent keepalive that doesn't show in the UI
-                    yield "data: \n\n"
+        yield 'data: {"type":"status","message":"Connected to log stream"}\n\n'
 
-                time.sleep(0.5)
+        for frame, _ in log_tailer.frames(subscription, keepalive=30):
+            if frame is None:
+                # SSE comment as keepalive; EventSource doesn't surface it
+                yield ": keepalive\n\n"
+            else:
+                yield frame
+    finally:
+        log_tailer.unsubscribe(subscription)
 
 @app.route('/stream')
 def stream():
-    print("🚀 Client connected to /stream")
-    return Response(generate_log_stream(), mimetype="text/event-stream")
+    """
+    Live events as compact JSON. Optional filters: types (command, connection,
+    auth, summary), classification, ip (address or CIDR) and sensor; each
+    takes a comma-separated list. Resumes after Last-Event-ID (header, or the
+    last_event_id parameter for a manual reconnect).
+    """
+    try:
+        event_filter = EventFilter.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    subscription = log_tailer.subscribe(
+        None if event_filter.matches_all else event_filter, last_event_id
+    )
+    return Response(generate_log_stream(subscription), mimetype="text/event-stream")
+
+@app.route('/api/stream/stats')
+def stream_stats():
+    """Fan-out health: connected clients, drops, and log write → send latency."""
+    return jsonify(log_tailer.stats())
+
+@app.route('/api/events')
+def api_events():
+    """
+    Query the event store, newest first. Filters: src_ip, session, message,
+    classification, sensor, from/to (ISO 8601). Pages hold `limit` events
+    (default 100); pass the response's `next` as `cursor` for the next page.
+    """
+    if not os.path.exists(EVENT_STORE_PATH):
+        return jsonify({"error": "Event store not found"}), 404
+    try:
+        filters = {name: request.args[name] for name in FILTER_COLUMNS if request.args.get(name)}
+        start = normalize_timestamp(request.args["from"]) if request.args.get("from") else None
+        end = normalize_timestamp(request.args["to"]) if request.args.get("to") else None
+        limit = max(1, min(int(request.args.get("limit", 100)), EVENTS_PAGE_LIMIT))
+        connection = connect_event_store(EVENT_STORE_PATH, readonly=True)
+        try:
+            page = query_events(connection, filters, start, end, request.args.get("cursor"), limit)
+        finally:
+            connection.close()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@app.route('/api/runtime-health')
+def runtime_health():
+    """Summarize the SSH runtime's metrics for the dashboard health panel."""
+    try:
+        with urllib.request.urlopen(RUNTIME_METRICS_URL, timeout=2) as response:
+            samples = parse_prometheus_text(response.read().decode("utf-8"))
+    except Exception as e:
+        return jsonify({"up": False, "error": str(e)})
+
+    def total(name, **labels):
+        return sum(
+            value for sample_labels, value in samples.get(name, [])
+            if all(sample_labels.get(k) == v for k, v in labels.items())
+        )
+
+    def mean_ms(name, **labels):
+        count = total(f"{name}_count", **labels)
+        return round(total(f"{name}_sum", **labels) / count * 1000, 2) if count else None
+
+    hits = total("honeypot_classifier_lookups_total", result="hit")
+    lookups = total("honeypot_classifier_lookups_total")
+
+    return jsonify({
+        "up": True,
+        "sessions_open": total("honeypot_sessions_open"),
+        "sessions_total": total("honeypot_sessions_total"),
+        "connections_admitted": total("honeypot_connections_admitted"),
+        "connections_excess": total("honeypot_connections_excess"),
+        "connections_rejected": total("honeypot_admission_decisions_total", decision="reject"),
+        "commands": {
+            classification: total("honeypot_commands_total", classification=classification)
+            for classification in ("BENIGN", "SUSPICIOUS", "MALICIOUS", "ANOMALOUS")
+        },
+        "classifier_ms": mean_ms("honeypot_classifier_seconds"),
+        "classifier_cache_hit_ratio": round(hits / lookups, 3) if lookups else None,
+        "llm_ms": mean_ms("honeypot_llm_request_seconds"),
+        "llm_errors": total("honeypot_llm_requests_total", outcome="error"),
+        "llm_tokens": total("honeypot_llm_tokens_total"),
+        "loop_lag_ms": mean_ms("honeypot_event_loop_lag_seconds"),
+        "event_loop_tasks": total("honeypot_event_loop_tasks"),
+        "tarpit_held": total("honeypot_tarpit_held"),
+        "tarpit_memory_bytes": total("honeypot_tarpit_memory_bytes"),
+        "credential_attempts": total("honeypot_credential_attempts_total"),
+    })
 
 @app.route('/')
 def index():
     return render_template("index.html")
 
-@app.route('/export/csv')
-def export_csv():
+@app.route('/export/<export_format>')
+def export_logs(export_format):
+    """
+    Streams classified commands as csv, json or ndjson (add .gz, or gzip=1,
+    for a gzipped download). Optional filters: from/to (ISO 8601),
+    classification and ip (address or CIDR), comma-separated.
+    """
+    compress = export_format.endswith(".gz") or request.args.get("gzip") in ("1", "true")
+    export_format = export_format.removesuffix(".gz")
+    if export_format not in RENDERERS:
+        return "Unknown export format", 404
     if not os.path.exists(LOG_FILE_PATH):
         return "Log file not found", 404
-
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["timestamp", "src_ip", "command", "classification"])
-
-    with open(LOG_FILE_PATH, "r") as f:
-        for line in f:
-            try:
-                data = json.loads(line)
-                if data.get("message") == "Command Classified":
-                    writer.writerow([
-                        data.get("timestamp", ""),
-                        data.get("src_ip", ""),
-                        data.get("command", ""),
-                        data.get("classification", "")
-                    ])
-            except:
-                continue
-
-    output.seek(0)
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=honeypot_logs.csv"})
-
-@app.route('/export/json')
-def export_json():
-    if not os.path.exists(LOG_FILE_PATH):
-        return "Log file not found", 404
-
-    logs = []
-    with open(LOG_FILE_PATH, "r") as f:
-        for line in f:
-            try:
-                data = json.loads(line)
-                if data.get("message") == "Command Classified":
-                    logs.append({
-                        "timestamp": data.get("timestamp", ""),
-                        "src_ip": data.get("src_ip", ""),
-                        "command": data.get("command", ""),
-                        "classification": data.get("classification", "")
-                    })
-            except:
-                continue
-
-    return Response(json.dumps(logs, indent=2), mimetype="application/json")
+    try:
+        export_filter = ExportFilter.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    render, mimetype = RENDERERS[export_format]
+    body = render(iter_commands(LOG_FILE_PATH, log_offset_index, export_filter))
+    filename = f"honeypot_logs.{export_format}"
+    if compress:
+        body = gzip_stream(body)
+        mimetype = "application/gzip"
+        filename += ".gz"
+    return Response(body, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment;filename={filename}"})
+
+def anomaly_page_args():
+    offset = max(0, int(request.args.get("offset", 0)))
+    limit = max(1, min(int(request.args.get("limit", ANOMALY_PAGE_SIZE)), ANOMALY_PAGE_LIMIT))
+    return offset, limit
 
 @app.route('/anomalies')
 def anomalies():
-    # Load anomalous commands
-    if os.path.exists(ANOMALOUS_COMMANDS_FILE):
-        try:
-            # Read as a single column CSV without header
-            anomalies_df = pd.read_csv(ANOMALOUS_COMMANDS_FILE, header=None, names=['command'])
-            # Remove duplicates
-            anomalies_df = anomalies_df.drop_duplicates()
-            anomalies = anomalies_df['command'].tolist()
-        except Exception as e:
-            anomalies = []
-            print(f"Error reading anomalies file: {e}")
-    else:
-        anomalies = []
-
-    # Check if labeled data file exists
-    if not os.path.exists(LABELED_DATA_FILE):
-        # Create it with headers
-        pd.DataFrame(columns=['command', 'label', 'date_labeled']).to_csv(LABELED_DATA_FILE, index=False)
-
-    # Load already labeled commands to avoid showing them again
-    if os.path.exists(LABELED_DATA_FILE):
-        labeled_df = pd.read_csv(LABELED_DATA_FILE)
-        labeled_commands = labeled_df['command'].tolist()
-        # Filter out already labeled commands
-        anomalies = [cmd for cmd in anomalies if cmd not in labeled_commands]
-
-    return render_template('review_anomalies.html', anomalies=anomalies)
+    anomaly_index.refresh()
+    try:
+        offset, limit = anomaly_page_args()
+    except ValueError:
+        return "offset and limit must be integers", 400
+    page = anomaly_index.pending(offset, limit)
+    return render_template('review_anomalies.html',
+                           anomalies=[item["command"] for item in page["items"]],
+                           total=page["total"])
 
 @app.route('/api/anomalies', methods=['GET'])
 def get_anomalies():
-    """API endpoint to get anomalous commands for AJAX refresh"""
-    # Load anomalous commands
-    if os.path.exists(ANOMALOUS_COMMANDS_FILE):
-        try:
-            # Read as a single column CSV without header
-            anomalies_df = pd.read_csv(ANOMALOUS_COMMANDS_FILE, header=None, names=['command'])
-            # Remove duplicates
-            anomalies_df = anomalies_df.drop_duplicates()
-            anomalies = anomalies_df['command'].tolist()
-        except Exception as e:
-            anomalies = []
-            print(f"Error reading anomalies file: {e}")
-    else:
-        anomalies = []
-
-    # Load already labeled commands to avoid showing them again
-    if os.path.exists(LABELED_DATA_FILE):
-        labeled_df = pd.read_csv(LABELED_DATA_FILE)
-        labeled_commands = labeled_df['command'].tolist()
-        # Filter out already labeled commands
-        anomalies = [cmd for cmd in anomalies if cmd not in labeled_commands]
-
-    return jsonify({"anomalies": anomalies})
+    """
+    API endpoint to get anomalous commands for AJAX refresh. Paginated with
+    offset/limit; answers 304 to If-None-Match while nothing has changed.
+    """
+    try:
+        offset, limit = anomaly_page_args()
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    etag = f"{anomaly_index.refresh()}-{offset}-{limit}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    page = anomaly_index.pending(offset, limit)
+    response = jsonify({
+        "anomalies": [item["command"] for item in page["items"]],
+        "items": page["items"],
+        "total": page["total"],
+        "offset": offset,
+        "limit": limit,
+    })
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/api/label', methods=['POST'])
 def api_label_anomalies():
@@ -365,123 +389,176 @@ def api_label_anomalies():
     if len(commands) != len(labels):
         return jsonify({"success": False, "message": "Commands and labels must have the same length"})
 
-    # Create dataframe with labeled data
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    data_rows = []
-    for cmd, label in zip(commands, labels):
-        if label in ['BENIGN', 'SUSPICIOUS', 'MALICIOUS']:
-            data_rows.append({
-                'command': cmd,
-                'label': label,
-                'date_labeled': now
-            })
-
     # Append to labeled data file
-    if data_rows:
-        new_df = pd.DataFrame(data_rows)
-        if os.path.exists(LABELED_DATA_FILE):
-            labeled_df = pd.read_csv(LABELED_DATA_FILE)
-            combined_df = pd.concat([labeled_df, new_df])
-            combined_df.to_csv(LABELED_DATA_FILE, index=False)
-        else:
-            new_df.to_csv(LABELED_DATA_FILE, index=False)
-
-        return jsonify({"success": True, "message": f"Successfully labeled {len(data_rows)} commands"})
+    written = label_store.append(zip(commands, labels))
+    if written:
+        return jsonify({"success": True, "message": f"Successfully labeled {written} commands"})
     else:
         return jsonify({"success": False, "message": "No valid labels provided"})
 
+@app.route('/api/labels/bulk', methods=['POST'])
+def api_bulk_label():
+    """
+    Label many commands in one request: {"labels": [{"command": ..., "label": ...}, ...]}.
+    All valid labels are appended in a single journal write.
+    """
+    items = (request.get_json(silent=True) or {}).get('labels')
+    if not isinstance(items, list):
+        return jsonify({"success": False, "message": "labels must be a list"}), 400
+    if len(items) > BULK_LABEL_LIMIT:
+        return jsonify({"success": False, "message": f"At most {BULK_LABEL_LIMIT} labels per request"}), 400
+
+    pairs = [
+        (item.get('command'), item.get('label'))
+        for item in items if isinstance(item, dict)
+    ]
+    written = label_store.append(pairs)
+    return jsonify({
+        "success": written > 0,
+        "labeled": written,
+        "rejected": len(items) - written,
+        "message": f"Successfully labeled {written} commands",
+    })
+
+@app.route('/api/labels', methods=['GET'])
+def api_labels():
+    """The latest label for every labeled command."""
+    return jsonify({
+        "labels": [
+            {"command": command, "label": label, "date_labeled": date_labeled}
+            for command, (label, date_labeled) in label_store.latest().items()
+        ]
+    })
+
 @app.route('/label', methods=['POST'])
 def label_anomalies():
     """Traditional form submission endpoint (fallback for non-JS browsers)"""
     commands = request.form.getlist('command')
     labels = request.form.getlist('label')
 
-    # Create dataframe with labeled data
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    data = []
-    for cmd, label in zip(commands, labels):
-        if label in ['BENIGN', 'SUSPICIOUS', 'MALICIOUS']:
-            data.append({
-                'command': cmd,
-                'label': label,
-                'date_labeled': now
-            })
-
     # Append to labeled data file
-    if data:
-        new_df = pd.DataFrame(data)
-        if os.path.exists(LABELED_DATA_FILE):
-            labeled_df = pd.read_csv(LABELED_DATA_FILE)
-            combined_df = pd.concat([labeled_df, new_df])
-            combined_df.to_csv(LABELED_DATA_FILE, index=False)
-        else:
-            new_df.to_csv(LABELED_DATA_FILE, index=False)
+    label_store.append(zip(commands, labels))
 
     return redirect('/anomalies')
 
 @app.route('/api/integrate', methods=['POST'])
 def integrate_data():
     # Integrate labeled anomalies into training dataset
-    if os.path.exists(LABELED_DATA_FILE):
-        labeled_df = pd.read_csv(LABELED_DATA_FILE)
-        if not labeled_df.empty:
-            # Load original training data
-            if os.path.exists(ATTACK_DATA_FILE):
-                train_df = pd.read_csv(ATTACK_DATA_FILE)
-                # Combine datasets
-                combined_df = pd.concat([train_df, labeled_df[['command', 'label']]])
-                # Remove duplicates (keep first occurrence)
-                combined_df = combined_df.drop_duplicates(subset=['command'], keep='first')
-                # Save back to training file
-                combined_df.to_csv(ATTACK_DATA_FILE, index=False)
-
-                # Clear the processed anomalies file
-                if os.path.exists(ANOMALOUS_COMMANDS_FILE):
-                    # Create backup
-                    now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                    backup_file = f"logs/anomalous_commands_backup_{now}.csv"
-                    os.rename(ANOMALOUS_COMMANDS_FILE, backup_file)
-                    # Create new empty file
-                    open(ANOMALOUS_COMMANDS_FILE, 'w').close()
-
-                # Also clear the processed anomalies tracking file
-                processed_file = "logs/processed_anomalies.csv"
-                if os.path.exists(processed_file):
-                    os.remove(processed_file)
-
-                # Reset the processed_anomalies set
-                global processed_anomalies
-                processed_anomalies = set()
-
-                return jsonify({"success": True, "message": "Data integrated successfully. You can now retrain the model."})
-            else:
-                return jsonify({"success": False, "message": "Error: Training data file not found."})
-        else:
-            return jsonify({"success": False, "message": "No labeled data to integrate."})
+    labels = label_store.latest()
+    if not labels:
+        return jsonify({"success": False, "message": "No labeled data to integrate."})
+
+    # Only commands the dataset doesn't have yet are appended
+    report = dataset_manager.integrate(
+        (command, label) for command, (label, _) in labels.items()
+    )
+
+    # Clear the processed anomalies file
+    if os.path.exists(ANOMALOUS_COMMANDS_FILE):
+        # Create backup
+        now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        backup_file = f"logs/anomalous_commands_backup_{now}.csv"
+        os.rename(ANOMALOUS_COMMANDS_FILE, backup_file)
+        # Create new empty file
+        open(ANOMALOUS_COMMANDS_FILE, 'w').close()
+
+    # Also clear the processed anomalies tracking file
+    processed_file = "logs/processed_anomalies.csv"
+    if os.path.exists(processed_file):
+        os.remove(processed_file)
+
+    # Reset the processed_anomalies set
+    global processed_anomalies
+    processed_anomalies = set()
+
+    if report["changed"]:
+        message = f"Added {report['added']} new commands. You can now retrain the model."
     else:
-        return jsonify({"success": False, "message": "Error: Labeled data file not found."})
+        message = "No new commands; the training data is unchanged."
+    if report["conflicts"]:
+        message += f" {len(report['conflicts'])} labels conflict with the training data and were not applied."
+    return jsonify({"success": True, "message": message, **report})
+
+@app.route('/retrain')
+def retrain_page():
+    return render_template('retrain.html', job_kinds=list(JOB_KINDS))
+
+def request_flag(name):
+    value = request.args.get(name)
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get(name)
+    return str(value).lower() in ("1", "true")
 
 @app.route('/api/retrain', methods=['POST'])
 def api_retrain():
-    # Execute the retrain_model script
-    try:
-        result = subprocess.run(
-            ["python", "retrain_model.py"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
+    """Queues LSTM training and then the Q-table on top of it; returns at once."""
+    dataset_manager.sync()
+    if not dataset_manager.needs_training() and not request_flag("force"):
         return jsonify({
             "success": True,
-            "message": "Model retrained successfully.",
-            "details": result.stdout
-        })
-    except subprocess.CalledProcessError as e:
-        return jsonify({
-            "success": False,
-            "message": "Error retraining model.",
-            "details": e.stderr
+            "skipped": True,
+            "message": f"Training data unchanged since the last training run ({dataset_manager.version}).",
         })
 
+    lstm_job = training_jobs.submit("lstm", dataset_version=dataset_manager.version)
+    qtable_job = training_jobs.submit("qtable", after=lstm_job, dataset_version=dataset_manager.version)
+    return jsonify({
+        "success": True,
+        "message": "Retraining queued; follow its progress on the retraining page.",
+        "jobs": [lstm_job.to_dict(), qtable_job.to_dict()],
+    }), 202
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def api_jobs():
+    if request.method == 'GET':
+        return jsonify({"jobs": training_jobs.list(), "manifest": training_jobs.manifest()})
+
+    data = request.get_json(silent=True) or {}
+    kind = data.get("kind") or request.args.get("kind")
+    dataset_manager.sync()
+    try:
+        job = training_jobs.submit(kind, dataset_version=dataset_manager.version)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(job.to_dict()), 202
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"No job {job_id}"}), 404
+    return jsonify({**job.to_dict(), "log": [line for _, line in job.log]})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"No job {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+def generate_job_stream(job, after_seq):
+    for kind, seq, payload in training_jobs.events(job, after_seq):
+        if kind == "log":
+            yield f"id: {seq}\nevent: log\ndata: {json.dumps(payload)}\n\n"
+        elif kind == "job":
+            yield f"event: job\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+        else:
+            yield ": keepalive\n\n"
+
+@app.route('/api/jobs/<job_id>/stream')
+def api_job_stream(job_id):
+    """
+    SSE: `log` events (one output line each, id = line number) and `job`
+    events with status and progress. Resumes after Last-Event-ID; the stream
+    ends when the job does.
+    """
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"No job {job_id}"}), 404
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or "0"
+    after_seq = int(last_event_id) if last_event_id.isdigit() else 0
+    return Response(generate_job_stream(job, after_seq), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
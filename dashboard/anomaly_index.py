@@ -0,0 +1,96 @@
+import datetime
+import os
+import threading
+
+
+def file_stamp(path: str):
+    """(inode, size, mtime) of `path`, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class AnomalyIndex:
+    """
+    The anomaly review queue, kept in memory. The runtime appends one raw
+    command per line to the anomalies file; the index reads only what was
+    appended since its last offset, counting each command and noting when it
+    was first seen (the time of the refresh that found it, since the file has
+    no timestamps). A file that was replaced or truncated, as "integrate"
+    does, starts the queue over.
+
+    Labeled commands come from the LabelStore, which reads its journal
+    incrementally too. `version` changes whenever either file does, so
+    callers can use it as an ETag and skip all work while nothing changed.
+    """
+
+    def __init__(self, anomalies_path: str, label_store):
+        self.anomalies_path = anomalies_path
+        self.label_store = label_store
+        self.lock = threading.Lock()
+        self.commands = {}
+        self.offset = 0
+        self.inode = None
+        self.anomalies_stamp = None
+        self.labeled = {}
+        self.labels_version = None
+        self.generation = 0
+        self._pending = None
+
+    @property
+    def version(self) -> str:
+        return f"{self.generation:x}-{self.offset:x}-{self.labels_version}"
+
+    def refresh(self) -> str:
+        """Picks up changes to either file; returns the current version."""
+        with self.lock:
+            stamp = file_stamp(self.anomalies_path)
+            if stamp != self.anomalies_stamp:
+                self._read_anomalies(stamp)
+                self.anomalies_stamp = stamp
+                self._pending = None
+            labels_version = self.label_store.refresh()
+            if labels_version != self.labels_version:
+                self.labeled = self.label_store.latest()
+                self.labels_version = labels_version
+                self._pending = None
+            return self.version
+
+    def _read_anomalies(self, stamp) -> None:
+        if stamp is None or stamp[0] != self.inode or stamp[1] < self.offset:
+            self.commands = {}
+            self.offset = 0
+            self.inode = stamp[0] if stamp else None
+            self.generation += 1
+        if stamp is None:
+            return
+        seen = datetime.datetime.now(datetime.timezone.utc).isoformat(sep="T", timespec="seconds")
+        with open(self.anomalies_path, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                command = line[:-1].decode("utf-8", errors="replace").rstrip("\r")
+                if not command:
+                    continue
+                entry = self.commands.get(command)
+                if entry is None:
+                    self.commands[command] = [1, seen]
+                else:
+                    entry[0] += 1
+
+    def pending(self, offset: int = 0, limit: int | None = None) -> dict:
+        """Unlabeled anomalies in first-seen order, with their counts."""
+        with self.lock:
+            if self._pending is None:
+                self._pending = [
+                    {"command": command, "count": count, "first_seen": first_seen}
+                    for command, (count, first_seen) in self.commands.items()
+                    if command not in self.labeled
+                ]
+            items = self._pending
+            end = None if limit is None else offset + limit
+            return {"total": len(items), "offset": offset, "items": items[offset:end]}
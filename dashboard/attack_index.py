@@ -0,0 +1,308 @@
+import json
+import math
+import os
+import threading
+import time
+
+STATE_VERSION = 2
+# Bytes at the start of the log that identify it, to notice a file that was
+# truncated and refilled past our offset between two refreshes.
+HEAD_BYTES = 256
+
+# Map cells are Web Mercator tiles ("slippy map" z/x/y). Aggregates are kept
+# for every zoom up to this one; a tile at zoom 12 is ~10 km across.
+MAX_CLUSTER_ZOOM = 12
+# A map at zoom z is clustered by the tiles of zoom z + 2, i.e. 64px cells.
+CLUSTER_ZOOM_OFFSET = 2
+MAX_LATITUDE = 85.0511287798
+
+
+def tile_of(lat: float, lng: float, zoom: int = MAX_CLUSTER_ZOOM) -> tuple:
+    n = 1 << zoom
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+class AttackIndex:
+    """
+    Per-source-IP attack counts for the map, kept up to date incrementally.
+    The index remembers how far into the log it has read (byte offset plus
+    the file's inode), so each refresh only parses lines appended since the
+    last one, and every IP is geolocated once, when it is first seen. The
+    state is saved atomically to `state_path` and reloaded on start, so a
+    dashboard restart doesn't reparse the log either.
+
+    Counts accumulate across rotations: when the log is rotated the rest of
+    the old file is read from `<log>.1` (if it is still there) before the new
+    file is read from its start, and a truncated log (smaller than the
+    offset, or with different first bytes) is read from the top.
+
+    For the map, every located IP also feeds a pyramid of tile cells (one
+    level per zoom) holding hit counts, distinct IPs per country, a centroid
+    and the classification breakdown of the IPs' commands. Cells are updated as lines
+    are indexed and rebuilt from the per-IP entries on load, so a viewport
+    query only touches the cells it covers.
+    """
+
+    def __init__(self, log_path: str, state_path: str, locate, refresh_interval: float = 2.0,
+                 save_interval: float = 30.0):
+        self.log_path = log_path
+        self.state_path = state_path
+        self.locate = locate
+        self.refresh_interval = refresh_interval
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.thread = None
+        self.ips = {}
+        self.offset = 0
+        self.inode = None
+        self.head = ""
+        self.lines_indexed = 0
+        self.version = 0
+        self.saved_version = 0
+        self.last_saved = time.monotonic()
+        self._snapshot = None
+        self._snapshot_version = -1
+        self.cells = [{} for _ in range(MAX_CLUSTER_ZOOM + 1)]
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable attack index {self.state_path}: {e}")
+            return
+        if state.get("version") != STATE_VERSION:
+            return
+        self.ips = state.get("ips", {})
+        self.offset = state.get("offset", 0)
+        self.inode = state.get("inode")
+        self.head = state.get("head", "")
+        self.lines_indexed = state.get("lines_indexed", 0)
+        for ip, entry in self.ips.items():
+            if entry.get("tile"):
+                self._add_to_cells(ip, entry, entry["count"], True, entry["classifications"])
+
+    def save(self) -> None:
+        with self.lock:
+            state = {
+                "version": STATE_VERSION,
+                "offset": self.offset,
+                "inode": self.inode,
+                "head": self.head,
+                "lines_indexed": self.lines_indexed,
+                "ips": self.ips,
+            }
+            data = json.dumps(state, separators=(",", ":"))
+            version = self.version
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        self.saved_version = version
+        self.last_saved = time.monotonic()
+
+    def ensure_started(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="attack-index", daemon=True)
+                self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+                if self.version != self.saved_version and (
+                    time.monotonic() - self.last_saved >= self.save_interval
+                ):
+                    self.save()
+            except Exception as e:
+                print(f"❌ Error updating attack index: {e}")
+            time.sleep(self.refresh_interval)
+
+    def refresh(self) -> None:
+        """Indexes whatever was appended to the log since the last refresh."""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+
+        if self.inode is not None and stat.st_ino != self.inode:
+            # Rotated: finish the old file if it is still around as <log>.1.
+            rotated = f"{self.log_path}.1"
+            try:
+                if os.stat(rotated).st_ino == self.inode:
+                    self._read(rotated, self.offset)
+            except FileNotFoundError:
+                pass
+            self.offset, self.head = 0, ""
+        elif stat.st_size < self.offset or not self._read_head().startswith(self.head):
+            # Truncated in place.
+            self.offset, self.head = 0, ""
+        self.inode = stat.st_ino
+        if len(self.head) < HEAD_BYTES * 2:
+            self.head = self._read_head()
+
+        if stat.st_size > self.offset:
+            self.offset = self._read(self.log_path, self.offset)
+
+    def _read_head(self) -> str:
+        with open(self.log_path, "rb") as f:
+            return f.read(HEAD_BYTES).hex()
+
+    def _read(self, path: str, offset: int) -> int:
+        """Indexes complete lines of `path` from `offset`; returns the new offset."""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partially written; pick it up on the next refresh.
+                    break
+                offset += len(line)
+                self._index_line(line)
+        return offset
+
+    def _index_line(self, line: bytes) -> None:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return
+        src_ip = data.get("src_ip")
+        if not src_ip or src_ip == "-":
+            return
+        timestamp = data.get("timestamp")
+        classification = None
+        if data.get("message") == "Command Classified":
+            classification = data.get("classification")
+        with self.lock:
+            self.lines_indexed += 1
+            entry = self.ips.get(src_ip)
+            is_new = entry is None
+            if is_new:
+                location = self.locate(src_ip)
+                entry = self.ips[src_ip] = {
+                    "count": 0,
+                    "first_seen": timestamp,
+                    "last_seen": timestamp,
+                    "location": location,
+                    "tile": None,
+                    "classifications": {},
+                }
+                if location and location.get("latitude") and location.get("longitude"):
+                    entry["tile"] = tile_of(location["latitude"], location["longitude"])
+            entry["count"] += 1
+            if timestamp:
+                entry["last_seen"] = timestamp
+            if classification:
+                counts = entry["classifications"]
+                counts[classification] = counts.get(classification, 0) + 1
+            if entry["tile"]:
+                self._add_to_cells(
+                    src_ip, entry, 1, is_new, {classification: 1} if classification else None
+                )
+            self.version += 1
+
+    def _add_to_cells(self, ip: str, entry: dict, hits: int, is_new: bool, classifications) -> None:
+        x, y = entry["tile"]
+        location = entry["location"]
+        for zoom, level in enumerate(self.cells):
+            shift = MAX_CLUSTER_ZOOM - zoom
+            key = (x >> shift, y >> shift)
+            cell = level.get(key)
+            if cell is None:
+                cell = level[key] = {
+                    "count": 0, "ips": 0, "lat_sum": 0.0, "lng_sum": 0.0,
+                    "classifications": {}, "countries": {}, "ip": ip,
+                }
+            cell["count"] += hits
+            if is_new:
+                cell["ips"] += 1
+                cell["lat_sum"] += location["latitude"]
+                cell["lng_sum"] += location["longitude"]
+                country = location.get("country") or "Unknown"
+                cell["countries"][country] = cell["countries"].get(country, 0) + 1
+            if classifications:
+                counts = cell["classifications"]
+                for name, count in classifications.items():
+                    counts[name] = counts.get(name, 0) + count
+
+    def clusters(self, west: float, south: float, east: float, north: float, zoom: int) -> dict:
+        """
+        Aggregated cells covering a viewport, for a map showing `zoom`. The
+        result is bounded by the viewport's size in cells, not by the number
+        of IPs in the index.
+        """
+        level_zoom = max(0, min(MAX_CLUSTER_ZOOM, zoom + CLUSTER_ZOOM_OFFSET))
+        west, east = max(-180.0, min(west, east)), min(180.0, max(west, east))
+        south, north = min(south, north), max(south, north)
+        # Tile y grows southwards.
+        x0, y0 = tile_of(north, west, level_zoom)
+        x1, y1 = tile_of(south, east, level_zoom)
+
+        with self.lock:
+            level = self.cells[level_zoom]
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(level):
+                keys = ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+                cells = [(key, level[key]) for key in keys if key in level]
+            else:
+                cells = [
+                    (key, cell) for key, cell in level.items()
+                    if x0 <= key[0] <= x1 and y0 <= key[1] <= y1
+                ]
+            clusters = []
+            for (x, y), cell in cells:
+                cluster = {
+                    "tile": f"{level_zoom}/{x}/{y}",
+                    "lat": round(cell["lat_sum"] / cell["ips"], 5),
+                    "lng": round(cell["lng_sum"] / cell["ips"], 5),
+                    "count": cell["count"],
+                    "ips": cell["ips"],
+                    "classifications": dict(cell["classifications"]),
+                    "countries": dict(cell["countries"]),
+                }
+                if cell["ips"] == 1:
+                    entry = self.ips[cell["ip"]]
+                    cluster["ip"] = cell["ip"]
+                    cluster["country"] = entry["location"].get("country") or "Unknown"
+                    cluster["city"] = entry["location"].get("city") or "Unknown"
+                clusters.append(cluster)
+        return {"zoom": level_zoom, "clusters": clusters}
+
+    def attack_locations(self) -> list:
+        """The map's view of the index, rebuilt only when the index has changed."""
+        with self.lock:
+            if self._snapshot_version == self.version:
+                return self._snapshot
+            locations = []
+            for ip, entry in self.ips.items():
+                location = entry["location"]
+                if location and location.get("latitude") and location.get("longitude"):
+                    locations.append({
+                        "ip": ip,
+                        "lat": location.get("latitude"),
+                        "lng": location.get("longitude"),
+                        "count": entry["count"],
+                        "country": location.get("country") or "Unknown",
+                        "city": location.get("city") or "Unknown",
+                        "first_seen": entry["first_seen"],
+                        "last_seen": entry["last_seen"],
+                    })
+            self._snapshot = locations
+            self._snapshot_version = self.version
+            return locations
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "ips": len(self.ips),
+                "lines_indexed": self.lines_indexed,
+                "offset": self.offset,
+                "log_size": os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0,
+            }
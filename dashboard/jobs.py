@@ -0,0 +1,366 @@
+import collections
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+MODEL_ASSETS_DIR = "model_assets"
+
+# kind → (script, artifacts it must produce). Scripts take --output-dir and
+# write only there; whatever they write is published when they succeed.
+JOB_KINDS = {
+    "lstm": ("model_training/train_lstm_model.py", ("lstm_attack_model.h5", "tokenizer.json")),
+    "finetune": ("model_training/finetune_lstm_model.py", ("lstm_attack_model.h5", "tokenizer.json")),
+    "qtable": ("model_training/train_rl_model.py", ("q_table.npy",)),
+    "evaluate": ("model_training/evaluate_lstm_model.py", ("misclassified_commands.csv",)),
+}
+
+# kind → {exit status: what it means}, for scripts that exit non-zero on purpose.
+EXIT_REASONS = {
+    "finetune": {3: "no commands labeled since the last fine-tune"},
+}
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+# Keras / script output worth turning into progress.
+FOLD_LINE = re.compile(r"Training fold (\d+)/(\d+)")
+EPOCH_LINE = re.compile(r"^Epoch (\d+)/(\d+)")
+STEP_LINE = re.compile(r"^\s*(\d+)/(\d+) \[")
+ROWS_LINE = re.compile(r"Processed rows \d+ to (\d+)/(\d+)")
+
+
+def now_iso() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(sep="T", timespec="seconds")
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Job:
+    def __init__(self, job_id: str, kind: str, after: "Job | None" = None,
+                 dataset_version: str | None = None, log_size: int = 2000):
+        self.id = job_id
+        self.kind = kind
+        self.after = after
+        self.dataset_version = dataset_version
+        self.status = "queued"
+        self.created_at = now_iso()
+        self.started_at = None
+        self.finished_at = None
+        self.returncode = None
+        self.error = None
+        self.artifacts = []
+        self.progress = {"fraction": 0.0}
+        self.log = collections.deque(maxlen=log_size)
+        self.seq = 0
+        self.process = None
+        self.cancel_requested = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "after": self.after.id if self.after else None,
+            "dataset_version": self.dataset_version,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "returncode": self.returncode,
+            "error": self.error,
+            "artifacts": self.artifacts,
+            "progress": dict(self.progress),
+        }
+
+    def update_progress(self, line: str) -> bool:
+        """Folds a line of output into `progress`; False for progress-bar noise not worth logging."""
+        progress = self.progress
+        match = STEP_LINE.match(line)
+        if match:
+            progress["step"], progress["steps"] = int(match.group(1)), int(match.group(2))
+            self._update_fraction()
+            return False
+        match = EPOCH_LINE.match(line)
+        if match:
+            progress["epoch"], progress["epochs"] = int(match.group(1)), int(match.group(2))
+            progress.pop("step", None)
+        match = FOLD_LINE.search(line)
+        if match:
+            progress["fold"], progress["folds"] = int(match.group(1)), int(match.group(2))
+            progress.pop("epoch", None)
+            progress.pop("step", None)
+        match = ROWS_LINE.search(line)
+        if match:
+            progress["rows"], progress["total_rows"] = int(match.group(1)), int(match.group(2))
+        self._update_fraction()
+        return True
+
+    def _update_fraction(self) -> None:
+        p = self.progress
+        if "total_rows" in p:
+            p["fraction"] = p["rows"] / max(p["total_rows"], 1)
+            return
+        epoch = 0.0
+        if "epochs" in p and "epoch" in p:
+            step = p["step"] / max(p["steps"], 1) if "step" in p else 0.0
+            epoch = (p["epoch"] - 1 + step) / max(p["epochs"], 1)
+        if "folds" in p:
+            p["fraction"] = (p["fold"] - 1 + epoch) / max(p["folds"], 1)
+        else:
+            p["fraction"] = epoch
+        p["fraction"] = round(p["fraction"], 4)
+
+
+class JobManager:
+    """
+    Training runs (LSTM, Q-table, evaluation) as a queue of jobs. One worker
+    thread takes them in order and runs each script in its own process, so
+    at most one trains at a time and no request thread ever waits on one.
+    Output is read line by line into a bounded per-job log, and Keras'
+    fold/epoch/step lines into `progress`; `events()` follows both for SSE.
+
+    A job writes into a staging directory next to the model assets. If it
+    succeeds, each file is moved into place with os.replace and the manifest
+    (sha256 and job of each artifact) is rewritten last, atomically, so a
+    reader that watches the manifest never sees a half-published set. A
+    failed or cancelled job leaves the live assets untouched.
+    """
+
+    def __init__(self, assets_dir: str = MODEL_ASSETS_DIR, on_success=None,
+                 history_size: int = 50, cancel_timeout: float = 10.0):
+        self.assets_dir = assets_dir
+        self.manifest_path = os.path.join(assets_dir, "manifest.json")
+        self.staging_root = os.path.join(assets_dir, ".staging")
+        self.on_success = on_success
+        self.cancel_timeout = cancel_timeout
+        self.jobs = collections.OrderedDict()
+        self.history_size = history_size
+        self.queue = queue.Queue()
+        self.changed = threading.Condition()
+        self.ids = itertools.count(1)
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="training-jobs", daemon=True)
+                self.thread.start()
+
+    def submit(self, kind: str, after: Job | None = None, dataset_version: str | None = None) -> Job:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind!r}; expected one of {', '.join(JOB_KINDS)}")
+        self.ensure_started()
+        with self.changed:
+            for job in self.jobs.values():
+                # Queuing the same run twice would only repeat it.
+                if job.kind == kind and job.status == "queued":
+                    return job
+            job = Job(f"{int(time.time()):x}-{next(self.ids)}", kind, after, dataset_version)
+            self.jobs[job.id] = job
+            self._trim()
+        self.queue.put(job)
+        return job
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self.jobs) - self.history_size)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Job | None:
+        with self.changed:
+            return self.jobs.get(job_id)
+
+    def list(self) -> list:
+        with self.changed:
+            return [job.to_dict() for job in reversed(self.jobs.values())]
+
+    def cancel(self, job_id: str) -> Job | None:
+        with self.changed:
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_requested = True
+            if job.status == "queued":
+                self._finish(job, "cancelled")
+                return job
+            process = job.process
+        if process is not None:
+            process.terminate()
+        return job
+
+    def _append(self, job: Job, line: str) -> None:
+        with self.changed:
+            if job.update_progress(line):
+                job.seq += 1
+                job.log.append((job.seq, line))
+            self.changed.notify_all()
+
+    def _finish(self, job: Job, status: str, error: str | None = None) -> None:
+        # Called with self.changed held.
+        job.status = status
+        job.error = error
+        job.finished_at = now_iso()
+        if status == "succeeded":
+            job.progress["fraction"] = 1.0
+        self.changed.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            job = self.queue.get()
+            with self.changed:
+                if job.finished:
+                    continue
+                if job.after is not None and job.after.status != "succeeded":
+                    self._finish(job, "cancelled", f"{job.after.kind} job {job.after.id} did not succeed")
+                    continue
+                job.status = "running"
+                job.started_at = now_iso()
+                self.changed.notify_all()
+            try:
+                status, error = self._execute(job)
+            except Exception as e:
+                status, error = "failed", str(e)
+            with self.changed:
+                self._finish(job, status, error)
+            if status == "succeeded" and self.on_success is not None:
+                try:
+                    self.on_success(job)
+                except Exception as e:
+                    self._append(job, f"on_success hook failed: {e}")
+
+    def _execute(self, job: Job) -> tuple:
+        script, required = JOB_KINDS[job.kind]
+        staging = os.path.join(self.staging_root, job.id)
+        os.makedirs(staging, exist_ok=True)
+        env = dict(os.environ, PYTHONUNBUFFERED="1", MPLBACKEND="Agg")
+        try:
+            job.process = subprocess.Popen(
+                [sys.executable, script, "--output-dir", staging],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                text=True,
+                errors="replace",
+                env=env,
+            )
+            with self.changed:
+                cancelled = job.cancel_requested
+            if cancelled:
+                job.process.terminate()
+            # Universal newlines split Keras' \r progress bars into lines too.
+            for line in job.process.stdout:
+                line = line.rstrip()
+                if line:
+                    self._append(job, line)
+            try:
+                job.returncode = job.process.wait(timeout=self.cancel_timeout)
+            except subprocess.TimeoutExpired:
+                job.process.kill()
+                job.returncode = job.process.wait()
+            job.process = None
+
+            if job.cancel_requested:
+                return "cancelled", None
+            if job.returncode != 0:
+                reason = EXIT_REASONS.get(job.kind, {}).get(job.returncode)
+                return "failed", f"{script} exited with status {job.returncode}" + (f": {reason}" if reason else "")
+            missing = [name for name in required if not os.path.exists(os.path.join(staging, name))]
+            if missing:
+                return "failed", f"{script} did not produce {', '.join(missing)}"
+            job.artifacts = self._publish(job, staging)
+            return "succeeded", None
+        finally:
+            if job.process is not None and job.process.poll() is None:
+                job.process.kill()
+            job.process = None
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _publish(self, job: Job, staging: str) -> list:
+        manifest = self.manifest()
+        artifacts = manifest.setdefault("artifacts", {})
+        published = []
+        for name in sorted(os.listdir(staging)):
+            source = os.path.join(staging, name)
+            if not os.path.isfile(source):
+                continue
+            artifacts[name] = {
+                "sha256": sha256_file(source),
+                "size": os.path.getsize(source),
+                "job": job.id,
+                "kind": job.kind,
+                "dataset_version": job.dataset_version,
+                "published_at": now_iso(),
+            }
+            os.replace(source, os.path.join(self.assets_dir, name))
+            published.append(name)
+        manifest["updated_at"] = now_iso()
+        manifest["job"] = job.id
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        self._append(job, f"Published {', '.join(published)}")
+        return published
+
+    def manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def events(self, job: Job, after_seq: int = 0, keepalive: float = 15.0,
+               progress_interval: float = 0.5):
+        """
+        Yields ("log", seq, line) for log lines after `after_seq`, ("job", None,
+        dict) when the status changes (progress at most every
+        `progress_interval` seconds) and (None, None, None) as a keepalive;
+        ends once the job has finished. Lines that already fell out of the
+        bounded log are skipped.
+        """
+        last_state, last_sent = None, 0.0
+        while True:
+            with self.changed:
+                while True:
+                    state = job.to_dict()
+                    status_changed = last_state is None or state["status"] != last_state["status"]
+                    progress_due = state != last_state and time.monotonic() - last_sent >= progress_interval
+                    if job.seq > after_seq or status_changed or progress_due:
+                        break
+                    if state == last_state:
+                        if not self.changed.wait(timeout=keepalive):
+                            break
+                    else:
+                        self.changed.wait(timeout=progress_interval - (time.monotonic() - last_sent))
+                lines = [(seq, line) for seq, line in job.log if seq > after_seq]
+
+            for seq, line in lines:
+                yield "log", seq, line
+                after_seq = seq
+            if status_changed or progress_due:
+                yield "job", None, state
+                last_state, last_sent = state, time.monotonic()
+            elif not lines:
+                yield None, None, None
+            if state["status"] in FINISHED:
+                return
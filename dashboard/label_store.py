@@ -0,0 +1,143 @@
+import csv
+import datetime
+import io
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows; the in-process lock still serializes writers.
+    fcntl = None
+
+LABELS = ("BENIGN", "SUSPICIOUS", "MALICIOUS")
+FIELDS = ("command", "label", "date_labeled")
+
+
+class _FileLock:
+    """flock on a sidecar file, so several dashboard processes can share the journal."""
+
+    def __init__(self, path: str, exclusive: bool):
+        self.path = path
+        self.exclusive = exclusive
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.file = open(self.path, "a")
+            fcntl.flock(self.file, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+class LabelStore:
+    """
+    Analyst labels as an append-only journal: the labels CSV (command, label,
+    date_labeled) only ever gets rows appended, under a lock, so concurrent
+    submissions can't overwrite each other and a label costs one write no
+    matter how many came before it. A command labeled twice keeps its latest
+    label in `latest()`.
+
+    The journal is read incrementally by offset. Once it holds more than
+    `compact_ratio` times as many rows as distinct commands (and at least
+    `compact_min_rows`), it is compacted: rewritten with only the latest row
+    per command and swapped in atomically.
+    """
+
+    def __init__(self, path: str, compact_min_rows: int = 10000, compact_ratio: float = 2.0):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.compact_min_rows = compact_min_rows
+        self.compact_ratio = compact_ratio
+        self.lock = threading.Lock()
+        self.labels = {}
+        self.rows = 0
+        self.offset = 0
+        self.inode = None
+
+    @property
+    def version(self) -> str:
+        return f"{self.inode or 0:x}-{self.offset:x}"
+
+    def refresh(self) -> str:
+        """Reads rows appended since the last call; returns the journal version."""
+        with self.lock, _FileLock(self.lock_path, exclusive=False):
+            self._refresh()
+            return self.version
+
+    def _refresh(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.labels, self.rows, self.offset, self.inode = {}, 0, 0, None
+            return
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # Compacted (by us or another process) or replaced: read it again.
+            self.labels, self.rows, self.offset, self.inode = {}, 0, 0, stat.st_ino
+        if stat.st_size == self.offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        # Appends are whole rows under the lock; only parse complete ones.
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        text = data[:end].decode("utf-8", errors="replace")
+        reader = csv.reader(io.StringIO(text, newline=""))
+        for row in reader:
+            if len(row) < 2 or (self.offset == 0 and reader.line_num == 1 and row[0] == "command"):
+                continue
+            self.labels[row[0]] = (row[1], row[2] if len(row) > 2 else "")
+            self.rows += 1
+        self.offset += end
+
+    def latest(self) -> dict:
+        """{command: (label, date_labeled)} with the latest label for each command."""
+        self.refresh()
+        with self.lock:
+            return dict(self.labels)
+
+    def append(self, pairs) -> int:
+        """Appends (command, label) pairs with valid labels; returns how many were written."""
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [(command, label, now) for command, label in pairs if command and label in LABELS]
+        if not rows:
+            return 0
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        with self.lock, _FileLock(self.lock_path, exclusive=True):
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                writer.writerow(FIELDS)
+            writer.writerows(rows)
+            with open(self.path, "a", encoding="utf-8", newline="") as f:
+                f.write(buffer.getvalue())
+            self._refresh()
+            if self.rows >= self.compact_min_rows and self.rows > self.compact_ratio * len(self.labels):
+                self._compact()
+        return len(rows)
+
+    def compact(self) -> None:
+        with self.lock, _FileLock(self.lock_path, exclusive=True):
+            self._refresh()
+            self._compact()
+
+    def _compact(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(FIELDS)
+            for command, (label, date_labeled) in self.labels.items():
+                writer.writerow((command, label, date_labeled))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # The new file is read from scratch on the next refresh.
+        self.inode = None
+        self._refresh()
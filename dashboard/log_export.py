@@ -0,0 +1,224 @@
+import bisect
+import csv
+import datetime
+import io
+import ipaddress
+import json
+import os
+import threading
+import zlib
+
+EXPORT_FIELDS = ("timestamp", "src_ip", "command", "classification")
+# Flush rendered rows to the client (and the gzip stream) in chunks this big.
+CHUNK_SIZE = 64 * 1024
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    Parses a from/to parameter into the log's own timestamp format (UTC,
+    millisecond ISO 8601), so the two compare correctly as plain strings.
+    Naive times are taken as UTC.
+    """
+    parsed = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc).isoformat(sep="T", timespec="milliseconds")
+
+
+class OffsetIndex:
+    """
+    Sparse timestamp → byte offset index of the log: one sample every
+    `every` bytes, taken by seeking there and reading the next full line, so
+    building it never scans the file. The log is written in time order, so a
+    time range maps to the byte range between the samples around it.
+
+    Samples are added as the log grows; the index starts over when the log
+    is rotated (new inode) or truncated.
+    """
+
+    def __init__(self, path: str, every: int = 256 * 1024):
+        self.path = path
+        self.every = every
+        self.lock = threading.Lock()
+        self.inode = None
+        self.size = 0
+        self.timestamps = []
+        self.offsets = []
+
+    def refresh(self) -> int:
+        """Samples the part of the log written since the last call; returns its size."""
+        stat = os.stat(self.path)
+        with self.lock:
+            if stat.st_ino != self.inode or stat.st_size < self.size:
+                self.inode = stat.st_ino
+                self.timestamps, self.offsets = [], []
+                self.size = 0
+            if stat.st_size - self.size < self.every and self.offsets:
+                return stat.st_size
+            with open(self.path, "rb") as f:
+                position = self.offsets[-1] + self.every if self.offsets else 0
+                while position < stat.st_size:
+                    f.seek(position)
+                    if position:
+                        f.readline()  # Skip to the next line boundary.
+                    offset = f.tell()
+                    timestamp = self._timestamp(f.readline())
+                    if timestamp is None:
+                        # Partial last line; sample it on a later refresh.
+                        break
+                    if not self.timestamps or timestamp >= self.timestamps[-1]:
+                        self.timestamps.append(timestamp)
+                        self.offsets.append(offset)
+                    position = offset + self.every
+            self.size = stat.st_size
+            return stat.st_size
+
+    @staticmethod
+    def _timestamp(line: bytes) -> str | None:
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            return json.loads(line).get("timestamp") or ""
+        except ValueError:
+            return ""
+
+    def byte_range(self, start: str | None, end: str | None) -> tuple:
+        """(first, last) byte offsets that cover every line from `start` to `end`."""
+        size = self.refresh()
+        with self.lock:
+            first, last = 0, size
+            # Each bound is widened by one extra sample, as slack for lines
+            # that were logged slightly out of order.
+            if start is not None:
+                i = bisect.bisect_left(self.timestamps, start) - 2
+                if i > 0:
+                    first = self.offsets[i]
+            if end is not None:
+                i = bisect.bisect_right(self.timestamps, end) + 1
+                if i < len(self.offsets):
+                    last = self.offsets[i]
+            return first, last
+
+
+class ExportFilter:
+    """Time range, classification and source IP/CIDR filters for exports."""
+
+    def __init__(self, start=None, end=None, classifications=(), networks=()):
+        self.start = start
+        self.end = end
+        self.classifications = frozenset(classifications)
+        self.networks = tuple(networks)
+
+    @classmethod
+    def from_args(cls, args) -> "ExportFilter":
+        def values(name):
+            return [v.strip() for value in args.getlist(name) for v in value.split(",") if v.strip()]
+
+        try:
+            start = normalize_timestamp(args["from"]) if args.get("from") else None
+            end = normalize_timestamp(args["to"]) if args.get("to") else None
+        except ValueError:
+            raise ValueError("from and to must be ISO 8601 timestamps") from None
+        networks = []
+        for value in values("ip"):
+            try:
+                networks.append(ipaddress.ip_network(value, strict=False))
+            except ValueError:
+                raise ValueError(f"Invalid IP address or CIDR: {value}") from None
+        return cls(start, end, [c.upper() for c in values("classification")], networks)
+
+    def __call__(self, record: dict) -> bool:
+        timestamp = record.get("timestamp") or ""
+        if self.start is not None and timestamp < self.start:
+            return False
+        if self.end is not None and timestamp > self.end:
+            return False
+        if self.classifications and str(record.get("classification", "")).upper() not in self.classifications:
+            return False
+        if self.networks:
+            try:
+                address = ipaddress.ip_address(record.get("src_ip") or "")
+            except ValueError:
+                return False
+            if not any(address in network for network in self.networks):
+                return False
+        return True
+
+
+def iter_commands(path: str, index: OffsetIndex, export_filter: ExportFilter):
+    """Yields the classified commands matching `export_filter`, reading only its byte range."""
+    first, last = index.byte_range(export_filter.start, export_filter.end)
+    with open(path, "rb") as f:
+        f.seek(first)
+        position = first
+        for line in f:
+            if position >= last or not line.endswith(b"\n"):
+                break
+            position += len(line)
+            # Cheap test before paying for json.loads on every line.
+            if b'"Command Classified"' in line:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    data = None
+                if data and data.get("message") == "Command Classified":
+                    record = {field: data.get(field, "") for field in EXPORT_FIELDS}
+                    if export_filter(record):
+                        yield record
+
+
+def render_csv(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        writer.writerow([record[field] for field in EXPORT_FIELDS])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def render_json(records):
+    """A JSON array, written one record at a time."""
+    parts, size, separator = ["["], 1, "\n  "
+    for record in records:
+        part = separator + json.dumps(record)
+        separator = ",\n  "
+        parts.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield "".join(parts)
+            parts, size = [], 0
+    parts.append("\n]\n" if separator != "\n  " else "]\n")
+    yield "".join(parts)
+
+
+def render_ndjson(records):
+    parts, size = [], 0
+    for record in records:
+        part = json.dumps(record) + "\n"
+        parts.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield "".join(parts)
+            parts, size = [], 0
+    yield "".join(parts)
+
+
+RENDERERS = {
+    "csv": (render_csv, "text/csv"),
+    "json": (render_json, "application/json"),
+    "ndjson": (render_ndjson, "application/x-ndjson"),
+}
+
+
+def gzip_stream(chunks):
+    """Gzips a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,284 @@
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # Optional; we fall back to polling the file.
+    INotify = None
+
+
+class Subscription:
+    """One SSE client: its event filter and a bounded queue of pre-rendered frames."""
+
+    def __init__(self, maxsize: int, accepts=None):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.accepts = accepts
+        self.dropped = False
+
+    def wants(self, event: dict) -> bool:
+        return self.accepts is None or self.accepts(event)
+
+
+class LatencyStats:
+    """Recent log-write → SSE-send latencies, for /api/stream/stats."""
+
+    def __init__(self, window: int = 2048):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            samples = sorted(self.samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+
+        def pct(fraction):
+            return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000, 1)
+
+        return {
+            "count": count,
+            "p50_ms": pct(0.50),
+            "p90_ms": pct(0.90),
+            "p99_ms": pct(0.99),
+            "max_ms": round(samples[-1] * 1000, 1),
+        }
+
+
+def parse_log_timestamp(value) -> float | None:
+    try:
+        return datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class LogTailer:
+    """
+    Follows the honeypot log in one background thread and fans every event
+    out to all connected SSE clients. Each line is parsed, turned into a
+    compact event by `render(record) -> dict | None` and serialized once, no
+    matter how many clients are watching; clients only receive the events
+    their filter accepts. Clients get a bounded queue; one that falls
+    `queue_size` frames behind is dropped rather than slowing the others down.
+
+    Every event gets an SSE id, and the last `replay_size` events are kept so
+    a client reconnecting with `Last-Event-ID` is sent only what it missed.
+    Ids carry the tailer's start time, so ids from before a dashboard restart
+    are recognised and don't replay anything.
+
+    Uses inotify when `inotify_simple` is installed, polling otherwise, and
+    reopens the file when it is rotated or truncated.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        render,
+        queue_size: int = 512,
+        replay_size: int = 2048,
+        poll_interval: float = 0.5,
+    ):
+        self.path = path
+        self.render = render
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.epoch = f"{int(time.time()):x}"
+        self.sequence = 0
+        # (sequence, event, frame, written_at) of the most recent events.
+        self.history = deque(maxlen=replay_size)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.events_total = 0
+        self.dropped_total = 0
+        self.replayed_total = 0
+        self.broadcast_latency = LatencyStats()
+        self.send_latency = LatencyStats()
+
+    def ensure_started(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="log-tailer", daemon=True)
+                self.thread.start()
+
+    def subscribe(self, accepts=None, last_event_id: str | None = None) -> Subscription:
+        """
+        Registers a client. `accepts(event) -> bool` filters what it receives;
+        with `last_event_id`, buffered events after that id are queued first.
+        """
+        self.ensure_started()
+        subscription = Subscription(self.queue_size, accepts)
+        resume_after = self._parse_event_id(last_event_id)
+        with self.lock:
+            # Replaying and registering under one lock means every event is
+            # either replayed or published to this client, never both.
+            if resume_after is not None:
+                missed = [
+                    (frame, written_at)
+                    for sequence, event, frame, written_at in self.history
+                    if sequence > resume_after and subscription.wants(event)
+                ]
+                missed = missed[-self.queue_size:]
+                for item in missed:
+                    subscription.queue.put_nowait(item)
+                self.replayed_total += len(missed)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def _parse_event_id(self, event_id: str | None) -> int | None:
+        if not event_id:
+            return None
+        epoch, _, sequence = event_id.strip().partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def frames(self, subscription: Subscription, keepalive: float = 30.0):
+        """
+        Yields `(frame, written_at)` for one client until it is dropped.
+        `frame` is None when nothing arrived within `keepalive` seconds.
+        """
+        while not subscription.dropped:
+            try:
+                frame, written_at = subscription.queue.get(timeout=keepalive)
+            except queue.Empty:
+                yield None, None
+                continue
+            if written_at is not None:
+                self.send_latency.record(max(0.0, time.time() - written_at))
+            yield frame, written_at
+
+    def stats(self) -> dict:
+        with self.lock:
+            subscribers = len(self.subscribers)
+        return {
+            "subscribers": subscribers,
+            "events_total": self.events_total,
+            "dropped_clients_total": self.dropped_total,
+            "replayed_events_total": self.replayed_total,
+            "buffered_events": len(self.history),
+            "inotify": INotify is not None,
+            "write_to_broadcast": self.broadcast_latency.snapshot(),
+            "write_to_send": self.send_latency.snapshot(),
+        }
+
+    def publish(self, event: dict, written_at: float | None) -> None:
+        payload = json.dumps(event, separators=(",", ":"), ensure_ascii=False)
+        with self.lock:
+            self.sequence += 1
+            frame = f"id: {self.epoch}-{self.sequence}\ndata: {payload}\n\n"
+            self.history.append((self.sequence, event, frame, written_at))
+            subscribers = [s for s in self.subscribers if s.wants(event)]
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((frame, written_at))
+            except queue.Full:
+                subscription.dropped = True
+                self.dropped_total += 1
+                self.unsubscribe(subscription)
+
+    def _handle_line(self, line: str) -> None:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        try:
+            event = self.render(record)
+        except Exception as e:
+            print(f"❌ Error rendering log event: {e}")
+            return
+        self.events_total += 1
+        if event is None:
+            return
+        written_at = parse_log_timestamp(record.get("timestamp"))
+        if written_at is not None:
+            self.broadcast_latency.record(max(0.0, time.time() - written_at))
+        self.publish(event, written_at)
+
+    def _wait_for_change(self, notifier) -> None:
+        if notifier is not None:
+            notifier.read(timeout=int(self.poll_interval * 1000 * 4))
+        else:
+            time.sleep(self.poll_interval)
+
+    def _open_notifier(self):
+        if INotify is None:
+            return None
+        try:
+            notifier = INotify()
+            mask = (
+                inotify_flags.MODIFY
+                | inotify_flags.CREATE
+                | inotify_flags.MOVED_TO
+                | inotify_flags.DELETE
+            )
+            notifier.add_watch(os.path.dirname(os.path.abspath(self.path)), mask)
+            return notifier
+        except OSError as e:
+            print(f"⚠️ inotify unavailable, polling {self.path}: {e}")
+            return None
+
+    def _run(self) -> None:
+        notifier = self._open_notifier()
+        at_start = True
+        while True:
+            if not os.path.exists(self.path):
+                self._wait_for_change(notifier)
+                at_start = False
+                continue
+            try:
+                with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+                    # Only the first open skips history; a file that shows up
+                    # after a rotation is read from its beginning.
+                    if at_start:
+                        f.seek(0, os.SEEK_END)
+                    at_start = False
+                    self._follow(f, notifier)
+            except OSError as e:
+                print(f"❌ Error tailing {self.path}: {e}")
+                time.sleep(self.poll_interval)
+
+    def _follow(self, f, notifier) -> None:
+        inode = os.fstat(f.fileno()).st_ino
+        pending = ""
+        while True:
+            chunk = f.readline()
+            if chunk:
+                pending += chunk
+                if pending.endswith("\n"):
+                    self._handle_line(pending)
+                    pending = ""
+                continue
+
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                stat = None
+            if stat is None or stat.st_ino != inode:
+                # Rotated: drain what is left of the old file, then reopen.
+                for line in f:
+                    pending += line
+                if pending.strip():
+                    self._handle_line(pending)
+                return
+            if stat.st_size < f.tell():
+                # Truncated in place; start over from the top.
+                f.seek(0)
+                pending = ""
+                continue
+            self._wait_for_change(notifier)
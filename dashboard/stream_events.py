@@ -0,0 +1,127 @@
+import ipaddress
+
+# Log message → (stream event type, auth result) for the events /stream carries.
+STREAM_MESSAGES = {
+    "Command Classified": ("command", None),
+    "SSH connection received": ("connection", None),
+    "User attempting to authenticate": ("auth", "attempt"),
+    "Authentication success": ("auth", "success"),
+    "Authentication failed": ("auth", "failed"),
+    "Session Summary": ("summary", None),
+    "Credential summary": ("credentials", None),
+}
+EVENT_TYPES = {event_type for event_type, _ in STREAM_MESSAGES.values()}
+
+
+def compact_location(location):
+    if not location:
+        return None
+    return {
+        "city": location.get("city"),
+        "country": location.get("country"),
+        "lat": location.get("latitude"),
+        "lng": location.get("longitude"),
+    }
+
+
+def build_stream_event(data: dict, locate) -> dict | None:
+    """
+    Turns one log record into the compact event /stream sends, with the
+    location already attached, or None for records the stream doesn't carry.
+    `locate(ip)` is the dashboard's GeoIP lookup.
+    """
+    kind = STREAM_MESSAGES.get(data.get("message", ""))
+    if kind is None:
+        return None
+    event_type, auth_result = kind
+
+    src_ip = data.get("src_ip")
+    event = {
+        "type": event_type,
+        "ts": data.get("timestamp"),
+        "ip": src_ip,
+        "sensor": data.get("sensor_name"),
+        "session": data.get("task_name"),
+    }
+    if event_type == "credentials":
+        # Aggregated over many sources; the record's own src_ip means nothing.
+        event["ip"] = None
+    elif event_type != "summary" and src_ip and src_ip != "-":
+        event["loc"] = compact_location(locate(src_ip))
+    if event_type == "command":
+        event["command"] = data.get("command")
+        event["classification"] = data.get("classification")
+    elif event_type == "auth":
+        event["result"] = auth_result
+        event["username"] = data.get("username")
+    elif event_type == "summary":
+        event["summary"] = data.get("summary", "")
+    elif event_type == "credentials":
+        # Window totals repeat on every part of a split summary.
+        for field in ("attempts", "successes", "distinct_credentials", "overflow_distinct",
+                      "window_seconds", "part", "parts"):
+            event[field] = data.get(field)
+    return {key: value for key, value in event.items() if value is not None}
+
+
+def _split(values) -> list:
+    return [v.strip() for value in values for v in value.split(",") if v.strip()]
+
+
+class EventFilter:
+    """
+    A /stream subscription filter. Each criterion is a set of allowed values
+    (empty means "any"); an event has to pass all of them. A classification
+    filter selects commands; other event types only get through it when they
+    are named in `types` as well.
+    """
+
+    def __init__(self, types=(), classifications=(), networks=(), sensors=()):
+        self.types = frozenset(types)
+        self.classifications = frozenset(c.upper() for c in classifications)
+        self.networks = tuple(networks)
+        self.sensors = frozenset(sensors)
+
+    @classmethod
+    def from_args(cls, args) -> "EventFilter":
+        """Builds a filter from query parameters; each may repeat or be comma-separated."""
+        types = _split(args.getlist("types") + args.getlist("type"))
+        unknown = set(types) - EVENT_TYPES
+        if unknown:
+            raise ValueError(f"Unknown event type(s): {', '.join(sorted(unknown))}")
+        networks = []
+        for value in _split(args.getlist("ip")):
+            try:
+                networks.append(ipaddress.ip_network(value, strict=False))
+            except ValueError:
+                raise ValueError(f"Invalid IP address or CIDR: {value}") from None
+        return cls(
+            types=types,
+            classifications=_split(args.getlist("classification")),
+            networks=networks,
+            sensors=_split(args.getlist("sensor")),
+        )
+
+    @property
+    def matches_all(self) -> bool:
+        return not (self.types or self.classifications or self.networks or self.sensors)
+
+    def __call__(self, event: dict) -> bool:
+        if self.types and event["type"] not in self.types:
+            return False
+        if self.classifications:
+            if event["type"] == "command":
+                if str(event.get("classification", "")).upper() not in self.classifications:
+                    return False
+            elif event["type"] not in self.types:
+                return False
+        if self.sensors and event.get("sensor") not in self.sensors:
+            return False
+        if self.networks:
+            try:
+                address = ipaddress.ip_address(event.get("ip") or "")
+            except ValueError:
+                return False
+            if not any(address in network for network in self.networks):
+                return False
+        return True
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows; the in-process lock still serializes writers.
+    fcntl = None
+
+# Dataset paths
+DATASET_DIR = "model_assets"
+DATA_FILE = os.path.join(DATASET_DIR, "attack_data.csv")
+INDEX_FILE = os.path.join(DATASET_DIR, "attack_data.index.json")
+
+INDEX_VERSION = 1
+DIGEST_MASK = (1 << 64) - 1
+
+
+def normalize_command(command: str) -> str:
+    """Commands that differ only in whitespace are the same training example."""
+    return " ".join(str(command).split())
+
+
+def command_hash(command: str) -> str:
+    return hashlib.sha1(normalize_command(command).encode("utf-8")).hexdigest()[:16]
+
+
+def row_digest(key: str, label: str) -> int:
+    return int(hashlib.sha1(f"{key}\t{label}".encode("utf-8")).hexdigest()[:16], 16)
+
+
+class _FileLock:
+    """Exclusive flock on a sidecar file, shared with other processes updating the dataset."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.file = open(self.path, "a")
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+class DatasetManager:
+    """
+    Keeps a persistent index of the training set (`attack_data.csv`): the
+    hash of every normalized command with its label, plus how far into the
+    CSV the index has read. Integrating new labels touches only the new rows:
+    commands already present are skipped (a different label is reported as a
+    conflict and the existing row kept), and the rest are appended.
+
+    The dataset version is content-addressed: the row count and the sum
+    (mod 2^64) of each (command hash, label) digest, so it doesn't depend on
+    row order and is the same for the same data however it was built. The
+    last version a model was trained on is kept too, so retraining can be
+    skipped when nothing changed.
+
+    One instance is shared by the dashboard's request and job threads, and
+    other processes (ingest_logs) update the same files, so every operation
+    holds a thread lock and a flock on `<index>.lock`, and first reloads the
+    index if another process saved it since.
+    """
+
+    def __init__(self, data_file: str = DATA_FILE, index_file: str = INDEX_FILE):
+        self.data_file = data_file
+        self.index_file = index_file
+        self.labels = {}
+        self.rows = 0
+        self.digest = 0
+        self.offset = 0
+        self.inode = None
+        self.trained_version = None
+        self.lock = threading.Lock()
+        self.lock_path = f"{index_file}.lock"
+        self._index_stamp = None
+        with self._locked():
+            self._sync()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Holds both locks; reloads the index first if another process saved it."""
+        with self.lock, _FileLock(self.lock_path):
+            if self._stamp() != self._index_stamp:
+                self._load()
+            yield
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.index_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @property
+    def version(self) -> str:
+        return f"{self.rows:x}-{self.digest:016x}"
+
+    def _load(self) -> None:
+        self._reset()
+        self.inode, self.trained_version = None, None
+        self._index_stamp = self._stamp()
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Rebuilding unreadable dataset index {self.index_file}: {e}")
+            return
+        if index.get("index_version") != INDEX_VERSION:
+            return
+        self.labels = index["labels"]
+        self.rows = index["rows"]
+        self.digest = int(index["digest"], 16)
+        self.offset = index["offset"]
+        self.inode = index["inode"]
+        self.trained_version = index.get("trained_version")
+
+    def save(self) -> None:
+        with self._locked():
+            self._save()
+
+    def _save(self) -> None:
+        index = {
+            "index_version": INDEX_VERSION,
+            "dataset_version": self.version,
+            "trained_version": self.trained_version,
+            "rows": self.rows,
+            "digest": f"{self.digest:016x}",
+            "offset": self.offset,
+            "inode": self.inode,
+            "labels": self.labels,
+        }
+        tmp_path = f"{self.index_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_file)
+        self._index_stamp = self._stamp()
+
+    def _reset(self) -> None:
+        self.labels, self.rows, self.digest, self.offset = {}, 0, 0, 0
+
+    def _add(self, key: str, label: str) -> None:
+        self.labels[key] = label
+        self.rows += 1
+        self.digest = (self.digest + row_digest(key, label)) & DIGEST_MASK
+
+    def sync(self) -> None:
+        """Indexes rows that reached the CSV some other way (e.g. a regenerated dataset)."""
+        with self._locked():
+            self._sync()
+
+    def _sync(self) -> None:
+        try:
+            stat = os.stat(self.data_file)
+        except FileNotFoundError:
+            self._reset()
+            self.inode = None
+            return
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self._reset()
+            self.inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return
+
+        with open(self.data_file, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        # A row still being written is left for the next sync.
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        reader = csv.reader(io.StringIO(data[:end].decode("utf-8", errors="replace"), newline=""))
+        for row in reader:
+            if self.offset == 0 and reader.line_num == 1 and row[:2] == ["command", "label"]:
+                continue
+            if len(row) < 2:
+                continue
+            key = command_hash(row[0])
+            if key not in self.labels:
+                self._add(key, row[1])
+        self.offset += end
+        self._save()
+
+    def integrate(self, rows) -> dict:
+        """
+        Appends the (command, label) rows whose command isn't in the dataset
+        yet, and reports what happened, including label conflicts.
+        """
+        with self._locked():
+            return self._integrate(rows)
+
+    def _integrate(self, rows) -> dict:
+        self._sync()
+        previous_version = self.version
+        new_rows, duplicates, conflicts = [], 0, []
+        for command, label in rows:
+            key = command_hash(command)
+            existing = self.labels.get(key)
+            if existing is None:
+                self._add(key, label)
+                new_rows.append((command, label))
+            elif existing == label:
+                duplicates += 1
+            else:
+                conflicts.append({"command": command, "existing": existing, "new": label})
+
+        if new_rows:
+            write_header = not os.path.exists(self.data_file) or os.path.getsize(self.data_file) == 0
+            with open(self.data_file, "a", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f, lineterminator="\n")
+                if write_header:
+                    writer.writerow(["command", "label"])
+                writer.writerows(new_rows)
+                f.flush()
+                self.offset = f.tell()
+            self.inode = os.stat(self.data_file).st_ino
+            self._save()
+
+        return {
+            "added": len(new_rows),
+            "duplicates": duplicates,
+            "conflicts": conflicts,
+            "previous_version": previous_version,
+            "version": self.version,
+            "changed": self.version != previous_version,
+            "needs_training": self.needs_training(),
+        }
+
+    def needs_training(self) -> bool:
+        return self.version != self.trained_version
+
+    def mark_trained(self, version: str | None = None) -> None:
+        with self._locked():
+            self.trained_version = version or self.version
+            self._save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or update the training dataset index.")
+    parser.add_argument("--data-file", default=DATA_FILE)
+    parser.add_argument("--index-file", default=INDEX_FILE)
+    parser.add_argument("--mark-trained", action="store_true",
+                        help="Record the current dataset version as trained.")
+    args = parser.parse_args()
+
+    manager = DatasetManager(args.data_file, args.index_file)
+    if args.mark_trained:
+        manager.mark_trained()
+    print(f"📦 Dataset version {manager.version}: {manager.rows} distinct commands")
+    print(f"🧠 Last trained on: {manager.trained_version or 'never'}")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+
+from data_processing.dataset_manager import DATA_FILE, INDEX_FILE, DatasetManager, command_hash, normalize_command
+
+LOG_FILE = os.path.join("logs", "ssh_log.log")
+DATASET_DIR = "model_assets"
+CANDIDATES_FILE = os.path.join(DATASET_DIR, "candidate_commands.csv")
+CHECKPOINT_FILE = os.path.join(DATASET_DIR, "log_ingest.checkpoint.json")
+CANDIDATE_FIELDS = ["command", "label", "confidence", "first_seen"]
+LABELS = ("BENIGN", "SUSPICIOUS", "MALICIOUS")
+
+CHECKPOINT_VERSION = 1
+# Bytes at the start of a segment that identify it, wherever rotation moved it.
+HEAD_BYTES = 256
+
+
+def open_segment(path: str):
+    """A binary stream of the segment's log lines, decompressing .gz segments."""
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def read_head(path: str) -> str:
+    try:
+        with open_segment(path) as f:
+            return f.read(HEAD_BYTES).hex()
+    except (OSError, EOFError):
+        return ""
+
+
+def rotated_segments(log_path: str) -> list:
+    """
+    The rotated copies of the log, oldest first: numbered (`.1`, `.2.gz`) or
+    dated (`-20250101.gz`) names, compressed or not.
+    """
+    paths = set(glob.glob(f"{glob.escape(log_path)}.*")) | set(glob.glob(f"{glob.escape(log_path)}-*"))
+    paths = [path for path in paths if os.path.isfile(path) and not path.endswith(".tmp")]
+    return sorted(paths, key=os.path.getmtime)
+
+
+def parse_confidence(prediction) -> float | None:
+    """The winning softmax probability from a logged prediction like "[[0.1, 0.2, 0.7]]"."""
+    try:
+        values = json.loads(prediction) if isinstance(prediction, str) else prediction
+        while isinstance(values, list) and values and isinstance(values[0], list):
+            values = values[0]
+        return round(float(max(values)), 4)
+    except (TypeError, ValueError):
+        return None
+
+
+class LogIngester:
+    """
+    Turns the runtime's JSON-lines log ("Command Classified" records) into
+    candidate training rows, incrementally. The checkpoint remembers which
+    segment was read last (by its first bytes, which survive a rename or a
+    compression) and how far into it, so a run reads only what was logged
+    since the previous one.
+
+    When the log has been rotated since, the rest of the checkpointed segment
+    is read from its rotated copy (`<log>.1`, `<log>.1.gz`, `<log>-<date>.gz`),
+    then any segment rotated after it, oldest first, then the live log from
+    the top. A compressed segment has to be decompressed up to the offset,
+    but only once, on the run right after it was rotated.
+
+    Every command seen is normalized and hashed like the training set does;
+    commands already in the training set or already a candidate are skipped.
+    New ones are appended to `candidates_file` with the model's label and
+    confidence, for review, fine-tuning or `integrate_above`.
+    """
+
+    def __init__(self, log_path: str = LOG_FILE, checkpoint_file: str = CHECKPOINT_FILE,
+                 candidates_file: str = CANDIDATES_FILE, dataset_manager: DatasetManager | None = None):
+        self.log_path = log_path
+        self.checkpoint_file = checkpoint_file
+        self.candidates_file = candidates_file
+        self.dataset_manager = dataset_manager or DatasetManager()
+        self.offset = 0
+        self.head = ""
+        self.seen = set()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            checkpoint = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable checkpoint {self.checkpoint_file}: {e}")
+            checkpoint = {}
+        if checkpoint.get("version") == CHECKPOINT_VERSION and checkpoint.get("log_path") == self.log_path:
+            self.offset = checkpoint["offset"]
+            self.head = checkpoint["head"]
+
+        # The candidates file itself is the record of what was already taken,
+        # so a run that stopped before saving its checkpoint never duplicates rows.
+        try:
+            with open(self.candidates_file, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    self.seen.add(command_hash(row.get("command") or ""))
+        except FileNotFoundError:
+            pass
+
+    def save(self) -> None:
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "log_path": self.log_path,
+            "offset": self.offset,
+            "head": self.head,
+        }
+        tmp_path = f"{self.checkpoint_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_file)
+
+    def pending_segments(self) -> list:
+        """(path, offset) for everything not read yet, oldest first."""
+        segments = rotated_segments(self.log_path)
+        if os.path.exists(self.log_path):
+            segments.append(self.log_path)
+        if not self.head:
+            return [(path, 0) for path in segments]
+
+        # Newest first, so a rotated copy never shadows the live log.
+        for index in range(len(segments) - 1, -1, -1):
+            if read_head(segments[index]).startswith(self.head):
+                return [(segments[index], self.offset)] + [(path, 0) for path in segments[index + 1:]]
+        print(f"⚠️ The checkpointed segment of {self.log_path} is gone; reading every segment still present")
+        return [(path, 0) for path in segments]
+
+    def _read(self, path: str, offset: int, stats: dict):
+        """Candidate rows from complete lines of `path` after `offset`; sets the new offset."""
+        with open_segment(path) as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partially written; picked up on the next run.
+                    break
+                offset += len(line)
+                stats["bytes"] += len(line)
+                # Cheap test before paying for json.loads on every line.
+                if b'"Command Classified"' not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("message") != "Command Classified":
+                    continue
+                stats["records"] += 1
+                row = self._candidate(record, stats)
+                if row is not None:
+                    yield row
+        self.offset = offset
+
+    def _candidate(self, record: dict, stats: dict) -> dict | None:
+        command = normalize_command(record.get("command") or "")
+        label = record.get("classification")
+        if not command:
+            return None
+        if label not in LABELS:
+            # ANOMALOUS commands have no model label; they go through manual labeling.
+            stats["unlabeled"] += 1
+            return None
+        key = command_hash(command)
+        if key in self.seen or key in self.dataset_manager.labels:
+            stats["duplicates"] += 1
+            return None
+        self.seen.add(key)
+        return {
+            "command": command,
+            "label": label,
+            "confidence": parse_confidence(record.get("prediction")),
+            "first_seen": record.get("timestamp", ""),
+        }
+
+    def ingest(self, integrate_above: float | None = None) -> dict:
+        """
+        Reads everything logged since the last run and appends the new
+        candidates. With `integrate_above`, candidates at least that
+        confident are also added to the training set.
+        """
+        self.dataset_manager.sync()
+        stats = {"segments": 0, "bytes": 0, "records": 0, "unlabeled": 0, "duplicates": 0}
+        candidates = []
+        write_header = not os.path.exists(self.candidates_file) or os.path.getsize(self.candidates_file) == 0
+        with open(self.candidates_file, "a", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CANDIDATE_FIELDS, lineterminator="\n")
+            if write_header:
+                writer.writeheader()
+            for path, offset in self.pending_segments():
+                head = read_head(path)
+                if not head:
+                    # Empty (just rotated); keep pointing at the last segment with data.
+                    continue
+                stats["segments"] += 1
+                self.head = head
+                for row in self._read(path, offset, stats):
+                    writer.writerow(row)
+                    candidates.append(row)
+        self.save()
+
+        report = {**stats, "candidates": len(candidates)}
+        if integrate_above is not None:
+            confident = [(row["command"], row["label"]) for row in candidates
+                         if row["confidence"] is not None and row["confidence"] >= integrate_above]
+            report["integrated"] = self.dataset_manager.integrate(confident)
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest new production log records as candidate training rows.")
+    parser.add_argument("--log-file", default=LOG_FILE)
+    parser.add_argument("--checkpoint-file", default=CHECKPOINT_FILE)
+    parser.add_argument("--candidates-file", default=CANDIDATES_FILE)
+    parser.add_argument("--data-file", default=DATA_FILE)
+    parser.add_argument("--index-file", default=INDEX_FILE)
+    parser.add_argument("--integrate-above", type=float, default=None,
+                        help="Also add candidates at least this confident (e.g. 0.98) to the training set.")
+    args = parser.parse_args()
+
+    ingester = LogIngester(args.log_file, args.checkpoint_file, args.candidates_file,
+                           DatasetManager(args.data_file, args.index_file))
+    report = ingester.ingest(args.integrate_above)
+    print(f"📥 Read {report['bytes']} new bytes from {report['segments']} segments: "
+          f"{report['records']} classified commands, {report['duplicates']} already known, "
+          f"{report['unlabeled']} without a model label")
+    print(f"✅ {report['candidates']} new candidates appended to '{args.candidates_file}'")
+    if "integrated" in report:
+        integrated = report["integrated"]
+        print(f"📦 {integrated['added']} added to the training set (version {integrated['version']})")
@@ -1,25 +1,161 @@
 #!/usr/bin/env python3
+"""
+Turns honeypot logs into the training CSV (command, label), streaming.
+
+Input is the NDJSON shards written by model_assets/datasets_generator.py
+(optionally gzipped), or a legacy honeypot_logs.json array, which is decoded
+one entry at a time instead of loaded whole. Shards are parsed in parallel,
+each into its own part file, and the parts are joined in shard order, so the
+output is the same for any number of processes and memory never depends on
+the dataset size.
+"""
+import argparse
+import csv
+import glob
+import gzip
+import io
 import json
-import pandas as pd
+import multiprocessing
 import os
+import shutil
+import tempfile
 
 # Define dataset directory
 DATASET_DIR = "model_assets"
+LOG_DIR = os.path.join(DATASET_DIR, "honeypot_logs")
 LOG_FILE = os.path.join(DATASET_DIR, "honeypot_logs.json")
 OUTPUT_CSV = os.path.join(DATASET_DIR, "attack_data.csv")
+SHARD_PATTERNS = ("*.ndjson", "*.ndjson.gz", "*.jsonl", "*.jsonl.gz", "*.json", "*.json.gz")
+READ_SIZE = 1 << 20
+
+
+def expand_inputs(patterns):
+    """Files matching the patterns (a directory means every log shard in it), sorted."""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for shard_pattern in SHARD_PATTERNS:
+                files.update(glob.glob(os.path.join(pattern, shard_pattern)))
+        else:
+            files.update(glob.glob(pattern))
+    return sorted(path for path in files if os.path.isfile(path))
+
+
+def open_text(path):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def iter_json_array(f):
+    """The elements of a top-level JSON array, decoded one at a time."""
+    decoder = json.JSONDecoder()
+    buffer, pos = f.read(READ_SIZE).lstrip(), 1
+    if not buffer.startswith("["):
+        raise ValueError("expected a JSON array")
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            entry, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                raise
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield entry
+        pos = end
+        if pos > READ_SIZE:
+            buffer, pos = buffer[pos:], 0
+
+
+class _Prefixed:
+    """A text stream with already-read characters put back in front (gzip streams can't seek)."""
+
+    def __init__(self, prefix, f):
+        self.prefix, self.f = prefix, f
+
+    def read(self, size=-1):
+        data, self.prefix = self.prefix + self.f.read(size), ""
+        return data
+
+    def __iter__(self):
+        first, self.prefix = self.prefix + self.f.readline(), ""
+        if first:
+            yield first
+        yield from self.f
+
+
+def iter_entries(path):
+    """Log entries from an NDJSON shard or a JSON array file, read incrementally."""
+    with open_text(path) as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        stream = _Prefixed(first, f)
+        if first == "[":
+            yield from iter_json_array(stream)
+            return
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def parse_shard(job):
+    """Writes the shard's (command, label) rows to `part_file`; returns the row count."""
+    path, part_file = job
+    count = 0
+    with open(part_file, "w", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out, lineterminator="\n")
+        for log in iter_entries(path):
+            if isinstance(log, dict) and log.get("event") == "Session summary":
+                writer.writerow((log.get("details", ""), log.get("judgement", "UNKNOWN")))
+                count += 1
+    return count
+
+
+def parse_logs(files, output_csv=OUTPUT_CSV, processes=None):
+    output_dir = os.path.dirname(output_csv) or "."
+    os.makedirs(output_dir, exist_ok=True)
+    total = 0
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix=".parse_logs-") as parts_dir:
+        jobs = [(path, os.path.join(parts_dir, f"{index:05d}.csv")) for index, path in enumerate(files)]
+        with multiprocessing.Pool(processes) as pool:
+            for (path, _), count in zip(jobs, pool.imap(parse_shard, jobs)):
+                total += count
+                print(f"✅ Parsed {count} entries from {path}", flush=True)
+
+        tmp_path = f"{output_csv}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+            csv.writer(out, lineterminator="\n").writerow(("command", "label"))
+            for _, part_file in jobs:
+                with open(part_file, "r", encoding="utf-8", newline="") as part:
+                    shutil.copyfileobj(part, out, READ_SIZE)
+        os.replace(tmp_path, output_csv)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse honeypot logs into the training CSV.")
+    parser.add_argument("--input", nargs="+", default=None,
+                        help=f"Log files, globs or directories (default: {LOG_DIR}, else {LOG_FILE}).")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per CPU).")
+    args = parser.parse_args()
 
-commands = []
-labels = []
-
-with open(LOG_FILE, "r") as f:
-    logs = json.load(f)
-    for log in logs:
-        if log.get("event") == "Session summary":
-            command_text = log.get("details", "")
-            judgement = log.get("judgement", "UNKNOWN")
-            commands.append(command_text)
-            labels.append(judgement)
-
-df = pd.DataFrame({"command": commands, "label": labels})
-df.to_csv(OUTPUT_CSV, index=False)
-print(f"✅ Processed {len(df)} attack entries and saved as '{OUTPUT_CSV}'")
+    patterns = args.input or ([LOG_DIR] if os.path.isdir(LOG_DIR) else [LOG_FILE])
+    files = expand_inputs(patterns)
+    if not files:
+        raise SystemExit(f"❌ No log files match {', '.join(patterns)}")
+    total = parse_logs(files, args.output, args.processes)
+    print(f"✅ Processed {total} attack entries and saved as '{args.output}'")
@@ -0,0 +1,227 @@
+import ipaddress
+import time
+from collections import Counter, OrderedDict
+
+ADMIT = "admit"
+REJECT = "reject"
+TARPIT = "tarpit"
+AUTH_ONLY = "auth_only"
+EXCESS_POLICIES = (REJECT, TARPIT, AUTH_ONLY)
+
+
+def source_prefix(ip_address: str) -> str:
+    """
+    Collapses a source address to the network it is rate limited by:
+    /24 for IPv4 and /64 for IPv6 (IPv4-mapped addresses count as IPv4).
+    """
+    if ":" not in ip_address:
+        head, sep, _ = ip_address.rpartition(".")
+        return f"{head}.0/24" if sep else ip_address
+    try:
+        addr = ipaddress.ip_address(ip_address.split("%", 1)[0])
+    except ValueError:
+        return ip_address
+    if addr.ipv4_mapped is not None:
+        return source_prefix(str(addr.ipv4_mapped))
+    return str(ipaddress.ip_network(f"{addr}/64", strict=False))
+
+
+class TokenBucket:
+    """Classic token bucket; `rate` tokens per second up to `capacity`."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class _PrefixState:
+    __slots__ = ("active", "bucket")
+
+    def __init__(self, bucket: TokenBucket | None):
+        self.active = 0
+        self.bucket = bucket
+
+
+class Admission:
+    """The outcome of `AdmissionController.admit` for one connection."""
+
+    __slots__ = ("decision", "reason", "prefix", "released")
+
+    def __init__(self, decision: str, reason: str, prefix: str):
+        self.decision = decision
+        self.reason = reason
+        self.prefix = prefix
+        self.released = False
+
+    @property
+    def admitted(self) -> bool:
+        return self.decision == ADMIT
+
+
+class AdmissionController:
+    """
+    Decides, before key exchange, whether a new SSH connection gets a full
+    session. Connections over the global or per-prefix concurrency caps, or
+    over the global or per-prefix connection rates, are handled according to
+    `excess_policy`:
+
+        reject     close the connection immediately
+        tarpit     keep it open but make every auth attempt slow and fail
+        auth_only  accept credentials for harvesting but never open a shell
+
+    A limit of 0 disables that check. Everything runs on the event loop
+    thread, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 0,
+        max_sessions_per_prefix: int = 0,
+        connection_rate: float = 0.0,
+        connection_burst: float = 0.0,
+        prefix_connection_rate: float = 0.0,
+        prefix_connection_burst: float = 0.0,
+        excess_policy: str = REJECT,
+        max_excess_connections: int = 0,
+        max_tracked_prefixes: int = 65536,
+        clock=time.monotonic,
+    ):
+        if excess_policy not in EXCESS_POLICIES:
+            raise ValueError(
+                f"Invalid excess policy {excess_policy!r}, expected one of {EXCESS_POLICIES}."
+            )
+        self.max_sessions = max_sessions
+        self.max_sessions_per_prefix = max_sessions_per_prefix
+        self.prefix_connection_rate = prefix_connection_rate
+        self.prefix_connection_burst = max(prefix_connection_burst, 1.0)
+        self.excess_policy = excess_policy
+        self.max_excess_connections = max_excess_connections
+        self.max_tracked_prefixes = max_tracked_prefixes
+        self.clock = clock
+
+        now = clock()
+        self.global_bucket = (
+            TokenBucket(connection_rate, max(connection_burst, 1.0), now)
+            if connection_rate > 0
+            else None
+        )
+        self.active_sessions = 0
+        self.excess_connections = 0
+        self.prefixes: "OrderedDict[str, _PrefixState]" = OrderedDict()
+        self.decisions: Counter = Counter()
+
+    @classmethod
+    def from_config(cls, section) -> "AdmissionController":
+        """Builds a controller from the `[admission]` config section."""
+        if not section.getboolean("enabled", True):
+            return cls()
+        return cls(
+            max_sessions=section.getint("max_sessions", 0),
+            max_sessions_per_prefix=section.getint("max_sessions_per_prefix", 0),
+            connection_rate=section.getfloat("connection_rate", 0.0),
+            connection_burst=section.getfloat("connection_burst", 0.0),
+            prefix_connection_rate=section.getfloat("prefix_connection_rate", 0.0),
+            prefix_connection_burst=section.getfloat("prefix_connection_burst", 0.0),
+            excess_policy=section.get("excess_policy", REJECT).strip().lower(),
+            max_excess_connections=section.getint("max_excess_connections", 0),
+            max_tracked_prefixes=section.getint("max_tracked_prefixes", 65536),
+        )
+
+    def _prefix_state(self, prefix: str, now: float) -> _PrefixState:
+        state = self.prefixes.get(prefix)
+        if state is not None:
+            self.prefixes.move_to_end(prefix)
+            return state
+
+        bucket = (
+            TokenBucket(self.prefix_connection_rate, self.prefix_connection_burst, now)
+            if self.prefix_connection_rate > 0
+            else None
+        )
+        if len(self.prefixes) >= self.max_tracked_prefixes:
+            self._evict()
+        state = self.prefixes[prefix] = _PrefixState(bucket)
+        return state
+
+    def _evict(self) -> None:
+        # Drop the least recently seen prefix that holds no sessions; busy
+        # prefixes are rotated to the back so one probe never scans the map.
+        for _ in range(8):
+            prefix, state = next(iter(self.prefixes.items()))
+            if state.active == 0:
+                del self.prefixes[prefix]
+                return
+            self.prefixes.move_to_end(prefix)
+
+    def _check(self, state: _PrefixState, now: float) -> str | None:
+        if self.max_sessions and self.active_sessions >= self.max_sessions:
+            return "max_sessions"
+        if self.max_sessions_per_prefix and state.active >= self.max_sessions_per_prefix:
+            return "max_sessions_per_prefix"
+        if state.bucket is not None and not state.bucket.take(now):
+            return "prefix_connection_rate"
+        if self.global_bucket is not None and not self.global_bucket.take(now):
+            return "connection_rate"
+        return None
+
+    def admit(self, src_ip: str) -> Admission:
+        now = self.clock()
+        prefix = source_prefix(src_ip)
+        state = self._prefix_state(prefix, now)
+
+        reason = self._check(state, now)
+        if reason is None:
+            decision = ADMIT
+            reason = "ok"
+            self.active_sessions += 1
+            state.active += 1
+        elif (
+            self.max_excess_connections
+            and self.excess_connections >= self.max_excess_connections
+        ):
+            decision = REJECT
+            reason = "max_excess_connections"
+        else:
+            decision = self.excess_policy
+            if decision != REJECT:
+                self.excess_connections += 1
+
+        self.decisions[(decision, reason)] += 1
+        return Admission(decision, reason, prefix)
+
+    def release(self, admission: Admission | None) -> None:
+        """Returns the slot held by an admitted or excess connection."""
+        if admission is None or admission.released:
+            return
+        admission.released = True
+
+        if admission.decision == ADMIT:
+            self.active_sessions -= 1
+            state = self.prefixes.get(admission.prefix)
+            if state is not None:
+                state.active -= 1
+        elif admission.decision != REJECT:
+            self.excess_connections -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "active_sessions": self.active_sessions,
+            "excess_connections": self.excess_connections,
+            "tracked_prefixes": len(self.prefixes),
+            "decisions": {
+                f"{decision}:{reason}": count
+                for (decision, reason), count in self.decisions.items()
+            },
+        }
@@ -1,6 +1,5 @@
 # honeypot_server/command_classifier.py
 import os
-import json
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.preprocessing.sequence import pad_sequences
@@ -14,23 +13,52 @@ TOKENIZER_FILE = os.path.join(DATASET_DIR, "tokenizer.json")
 ATTACK_DATA_FILE = os.path.join(DATASET_DIR, "attack_data.csv")
 MAX_SEQUENCE_LENGTH = 20
 
-# ✅ Load the pre-trained LSTM model
-if not os.path.exists(LSTM_MODEL_FILE):
-    raise FileNotFoundError(f"❌ LSTM model file '{LSTM_MODEL_FILE}' not found!")
-lstm_model = tf.keras.models.load_model(LSTM_MODEL_FILE)
+# Rewritten (atomically, last) whenever a training job publishes new files
+MANIFEST_FILE = os.path.join(DATASET_DIR, "manifest.json")
+
+def load_models():
+    """Loads (lstm_model, Q_table, tokenizer) from the model files."""
+    # ✅ Load the pre-trained LSTM model
+    if not os.path.exists(LSTM_MODEL_FILE):
+        raise FileNotFoundError(f"❌ LSTM model file '{LSTM_MODEL_FILE}' not found!")
+    model = tf.keras.models.load_model(LSTM_MODEL_FILE)
+
+    # ✅ Load Q-learning table
+    if not os.path.exists(Q_TABLE_FILE):
+        raise FileNotFoundError(f"❌ Q-table file '{Q_TABLE_FILE}' not found!")
+    q_table = np.load(Q_TABLE_FILE)
+
+    # ✅ Load Tokenizer properly
+    if not os.path.exists(TOKENIZER_FILE):
+        raise FileNotFoundError(f"❌ Tokenizer file '{TOKENIZER_FILE}' not found!")
+    with open(TOKENIZER_FILE, 'r') as f:
+        tokenizer_json_str = f.read()
+    return model, q_table, tf.keras.preprocessing.text.tokenizer_from_json(tokenizer_json_str)
+
+def manifest_stamp():
+    try:
+        return os.stat(MANIFEST_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
-# ✅ Load Q-learning table
-if not os.path.exists(Q_TABLE_FILE):
-    raise FileNotFoundError(f"❌ Q-table file '{Q_TABLE_FILE}' not found!")
-Q_table = np.load(Q_TABLE_FILE)
+loaded_manifest = manifest_stamp()
+# (lstm_model, Q_table, tokenizer), swapped as one object so a reload never
+# pairs a new model with an old tokenizer; readers unpack it once per call.
+models = load_models()
 
-# ✅ Load Tokenizer properly
-if not os.path.exists(TOKENIZER_FILE):
-    raise FileNotFoundError(f"❌ Tokenizer file '{TOKENIZER_FILE}' not found!")
-with open(TOKENIZER_FILE, 'r') as f:
-    tokenizer_data = json.load(f)
-    tokenizer_json_str = json.dumps(tokenizer_data)  # Convert to JSON string
-    tokenizer = tf.keras.preprocessing.text.tokenizer_from_json(tokenizer_json_str)
+def reload_if_published():
+    """
+    Reloads the model files if a training job published new ones since they
+    were loaded (the manifest changed). Blocking; returns True if it reloaded.
+    """
+    global models, loaded_manifest
+    stamp = manifest_stamp()
+    if stamp == loaded_manifest:
+        return False
+    # Stamp first: a publish during the load is picked up on the next call.
+    models = load_models()
+    loaded_manifest = stamp
+    return True
 
 # ✅ Load labeled commands from attack_data.csv
 labeled_commands = {}
@@ -45,6 +73,9 @@ if os.path.exists(ATTACK_DATA_FILE):
     except Exception as e:
         print(f"❌ Error loading attack data: {str(e)}")
 
+# How often analyze_command is answered from the labeled dataset instead of the model.
+lookup_stats = {"hit": 0, "miss": 0}
+
 def analyze_command(command):
     """
     ✅ Analyze a command using the LSTM model.
@@ -58,6 +89,7 @@ def analyze_command(command):
 
     # 🔹 First check if this command is in our labeled dataset
     if command in labeled_commands:
+        lookup_stats["hit"] += 1
         print(f"✅ Command '{command}' found in labeled dataset with label: {labeled_commands[command]}")
         # Create a prediction that will result in the correct classification
         label = labeled_commands[command]
@@ -71,6 +103,9 @@ def analyze_command(command):
             prediction = None
         return prediction, False  # Not an anomaly since we have a label for it
 
+    lookup_stats["miss"] += 1
+    lstm_model, _, tokenizer = models
+
     # 🔹 Tokenize
     sequences = tokenizer.texts_to_sequences([command])
 
@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import math
+import time
+from array import array
+
+from honeypot_server.admission import source_prefix
+
+
+class CountMinSketch:
+    """
+    Fixed-size frequency sketch. Estimates never undercount, and overcount by
+    at most ~e/width of the total with probability 1 - e^-depth.
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.clear()
+
+    def _indexes(self, key):
+        return [hash((seed, key)) % self.width for seed in range(self.depth)]
+
+    def add(self, key, count: int = 1) -> int:
+        """Adds `count` to `key` and returns its new estimate."""
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(key)):
+            row[index] += count
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+    def estimate(self, key) -> int:
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def clear(self) -> None:
+        self.rows = [array("I", bytes(4 * self.width)) for _ in range(self.depth)]
+
+    def memory_bytes(self) -> int:
+        return sum(row.itemsize * len(row) for row in self.rows)
+
+
+class DistinctCounter:
+    """
+    Linear counting over a fixed bitmap: estimates how many distinct keys
+    were added, in `bits` / 8 bytes, accurate while well under `bits` keys.
+    """
+
+    def __init__(self, bits: int = 1 << 16):
+        self.bits = bits
+        self.clear()
+
+    def add(self, key) -> None:
+        index = hash(("distinct", key)) % self.bits
+        self.bitmap[index >> 3] |= 1 << (index & 7)
+
+    def estimate(self) -> int:
+        zeros = self.bits - sum(bin(byte).count("1") for byte in self.bitmap)
+        if zeros == 0:
+            return self.bits
+        return round(-self.bits * math.log(zeros / self.bits))
+
+    def clear(self) -> None:
+        self.bitmap = bytearray(self.bits // 8)
+
+
+class CredentialAggregator:
+    """
+    Counts password attempts per (username, password, source /24) instead of
+    logging each one. The first `max_keys` distinct credentials in a window
+    are counted exactly and every one of them is reported; past that,
+    attempts only go into a count-min sketch and the `top_n` heaviest
+    overflow credentials are kept by estimate (with an estimate of how many
+    distinct overflow credentials there were), so memory stays bounded under
+    any brute-force rate. A window's credentials are reported across as many
+    summaries as it takes, `summary_size` credentials each.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = 50000,
+        top_n: int = 100,
+        sketch_width: int = 4096,
+        sketch_depth: int = 4,
+        summary_size: int = 1000,
+        clock=time.time,
+    ):
+        self.max_keys = max_keys
+        self.top_n = top_n
+        self.summary_size = max(1, summary_size)
+        self.clock = clock
+        self.sketch = CountMinSketch(sketch_width, sketch_depth)
+        self.overflow_distinct = DistinctCounter()
+        self.total_attempts = 0
+        self._reset()
+
+    @classmethod
+    def from_config(cls, section) -> "CredentialAggregator":
+        return cls(
+            max_keys=section.getint("max_keys", 50000),
+            top_n=section.getint("top_n", 100),
+            sketch_width=section.getint("sketch_width", 4096),
+            sketch_depth=section.getint("sketch_depth", 4),
+            summary_size=section.getint("summary_size", 1000),
+        )
+
+    def _reset(self) -> None:
+        self.window_start = self.clock()
+        self.attempts = 0
+        self.successes = 0
+        self.exact = {}
+        self.heavy = {}
+        self.overflow_attempts = 0
+
+    def record(self, username: str, password: str, src_ip: str, success: bool = False) -> None:
+        key = (username, password, source_prefix(src_ip))
+        self.attempts += 1
+        self.total_attempts += 1
+        if success:
+            self.successes += 1
+        estimate = self.sketch.add(key)
+
+        count = self.exact.get(key)
+        if count is not None:
+            self.exact[key] = count + 1
+            return
+        if len(self.exact) < self.max_keys:
+            self.exact[key] = 1
+            return
+
+        self.overflow_attempts += 1
+        self.overflow_distinct.add(key)
+        if key in self.heavy or len(self.heavy) < self.top_n:
+            self.heavy[key] = estimate
+            return
+        lightest = min(self.heavy, key=self.heavy.__getitem__)
+        if estimate > self.heavy[lightest]:
+            del self.heavy[lightest]
+            self.heavy[key] = estimate
+
+    def __len__(self) -> int:
+        return len(self.exact) + len(self.heavy)
+
+    def flush(self) -> list:
+        """
+        Returns the summaries for the current window and starts a new one:
+        every exactly counted credential, then the heaviest overflow ones,
+        split `summary_size` credentials per summary. Each summary carries
+        the window's totals with its `part` of `parts`.
+        """
+        if self.attempts == 0:
+            self.window_start = self.clock()
+            return []
+
+        exact = sorted(self.exact.items(), key=lambda item: item[1], reverse=True)
+        heavy = sorted(self.heavy.items(), key=lambda item: item[1], reverse=True)
+        credentials = [
+            {"username": u, "password": p, "src_prefix": prefix, "count": c}
+            for (u, p, prefix), c in exact
+        ] + [
+            {"username": u, "password": p, "src_prefix": prefix, "count": c, "estimated": True}
+            for (u, p, prefix), c in heavy
+        ]
+        totals = {
+            "window_start": datetime.datetime.fromtimestamp(
+                self.window_start, datetime.timezone.utc
+            ).isoformat(sep="T", timespec="milliseconds"),
+            "window_seconds": round(self.clock() - self.window_start, 3),
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "distinct_credentials": len(self.exact),
+            "overflow_attempts": self.overflow_attempts,
+            "overflow_distinct": self.overflow_distinct.estimate() if self.overflow_attempts else 0,
+        }
+        chunks = [
+            credentials[start : start + self.summary_size]
+            for start in range(0, len(credentials), self.summary_size)
+        ] or [[]]
+        summaries = [
+            {**totals, "part": part, "parts": len(chunks), "credentials": chunk}
+            for part, chunk in enumerate(chunks, 1)
+        ]
+        self.sketch.clear()
+        self.overflow_distinct.clear()
+        self._reset()
+        return summaries
+
+    async def run(self, interval: float, emit) -> None:
+        """Flushes every `interval` seconds, passing each summary to `emit`."""
+        while True:
+            await asyncio.sleep(interval)
+            for summary in self.flush():
+                emit(summary)
+
+    def memory_bytes(self) -> int:
+        # Tuples of three short strings plus a dict slot, roughly.
+        return self.sketch.memory_bytes() + len(self.overflow_distinct.bitmap) + len(self) * 320
@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+from collections import deque
+
+_ORIGIN_RE = re.compile(r"created at (\S+:\d+)")
+_RUNNING_AT_RE = re.compile(r"(\w+\(\)) running at (\S+:\d+)")
+
+
+def new_event_loop(kind: str = "asyncio") -> asyncio.AbstractEventLoop:
+    """
+    Creates the runtime's event loop. `kind` is "asyncio" or "uvloop"; uvloop
+    is optional and we fall back to the default loop when it isn't installed.
+    """
+    kind = (kind or "asyncio").strip().lower()
+    if kind == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            print("⚠️ uvloop is not installed, using the default asyncio event loop")
+        else:
+            return uvloop.new_event_loop()
+    elif kind != "asyncio":
+        raise ValueError(f"Invalid event loop {kind!r}, expected 'asyncio' or 'uvloop'.")
+    return asyncio.new_event_loop()
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Picks the "Executing <handle> took N seconds" warnings out of asyncio's logger."""
+
+    def __init__(self, monitor: "LoopLagMonitor"):
+        super().__init__(logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not str(record.msg).startswith("Executing") or len(record.args or ()) != 2:
+            return
+        handle, duration = record.args
+        self.monitor.record_slow_callback(str(handle), float(duration))
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop scheduling delay by sleeping for `interval` and
+    recording how late the wakeup was. With slow-callback debugging on, the
+    loop runs in debug mode and every callback that blocks it for longer than
+    the threshold is kept (the `slowest` worst, with where they came from).
+    Every `report_interval` seconds the percentiles are handed to `emit`.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.25,
+        report_interval: float = 60.0,
+        window: int = 4096,
+        slowest: int = 10,
+        histogram=None,
+    ):
+        self.interval = interval
+        self.report_interval = report_interval
+        self.samples = deque(maxlen=window)
+        self.slowest = slowest
+        self.slow_callbacks = []
+        self.slow_callback_count = 0
+        self._sequence = itertools.count()
+        self.last_lag = 0.0
+        self.histogram = histogram
+
+    @classmethod
+    def from_config(cls, section, histogram=None) -> "LoopLagMonitor":
+        return cls(
+            interval=section.getfloat("loop_lag_interval", 0.25),
+            report_interval=section.getfloat("loop_lag_report_interval", 60.0),
+            slowest=section.getint("slow_callback_keep", 10),
+            histogram=histogram,
+        )
+
+    def enable_slow_callback_debug(self, loop: asyncio.AbstractEventLoop, threshold: float) -> None:
+        loop.set_debug(True)
+        loop.slow_callback_duration = threshold
+        logging.getLogger("asyncio").addHandler(_SlowCallbackHandler(self))
+
+    def record_slow_callback(self, handle: str, duration: float) -> None:
+        self.slow_callback_count += 1
+        match = _RUNNING_AT_RE.search(handle) or _ORIGIN_RE.search(handle)
+        origin = " at ".join(match.groups()) if match else handle[:200]
+        entry = (duration, next(self._sequence), origin)
+        if len(self.slow_callbacks) < self.slowest:
+            heapq.heappush(self.slow_callbacks, entry)
+        elif duration > self.slow_callbacks[0][0]:
+            heapq.heapreplace(self.slow_callbacks, entry)
+
+    def report(self) -> dict:
+        samples = sorted(self.samples)
+        slowest = sorted(self.slow_callbacks, reverse=True)
+        report = {
+            "lag_samples": len(samples),
+            "lag_p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "lag_p90_ms": round(percentile(samples, 0.90) * 1000, 3),
+            "lag_p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "lag_max_ms": round((samples[-1] if samples else 0.0) * 1000, 3),
+            "slow_callbacks": self.slow_callback_count,
+            "slowest_callbacks": [
+                {"duration_ms": round(duration * 1000, 3), "origin": origin}
+                for duration, _, origin in slowest
+            ],
+        }
+        self.samples.clear()
+        self.slow_callbacks = []
+        self.slow_callback_count = 0
+        return report
+
+    async def run(self, emit) -> None:
+        loop = asyncio.get_running_loop()
+        next_report = loop.time() + self.report_interval
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.last_lag = max(0.0, now - started - self.interval)
+            self.samples.append(self.last_lag)
+            if self.histogram is not None:
+                self.histogram.observe(self.last_lag)
+            if now >= next_report:
+                next_report = now + self.report_interval
+                emit(self.report())
@@ -0,0 +1,187 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    message TEXT,
+    src_ip TEXT,
+    task_name TEXT,
+    classification TEXT,
+    sensor_name TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp);
+CREATE INDEX IF NOT EXISTS events_src_ip ON events (src_ip, timestamp);
+CREATE INDEX IF NOT EXISTS events_task_name ON events (task_name, timestamp);
+CREATE INDEX IF NOT EXISTS events_classification ON events (classification, timestamp);
+CREATE INDEX IF NOT EXISTS events_message ON events (message, timestamp);
+"""
+
+# Query parameter → indexed column.
+FILTER_COLUMNS = {
+    "src_ip": "src_ip",
+    "session": "task_name",
+    "classification": "classification",
+    "message": "message",
+    "sensor": "sensor_name",
+}
+
+INSERT = (
+    "INSERT INTO events (timestamp, message, src_ip, task_name, classification, sensor_name, data)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def connect(path: str, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+    connection.execute("PRAGMA busy_timeout=5000")
+    return connection
+
+
+def event_row(event: dict) -> tuple:
+    return (
+        event.get("timestamp", ""),
+        event.get("message"),
+        event.get("src_ip"),
+        event.get("task_name"),
+        event.get("classification"),
+        event.get("sensor_name"),
+        json.dumps(event, default=str),
+    )
+
+
+class EventStoreHandler(logging.Handler):
+    """
+    Logging handler that writes every record into the SQLite event store as
+    well. `emit` only queues the record; a writer thread inserts them in
+    batches of up to `batch_size` (or every `flush_interval` seconds), one
+    transaction per batch, so the event loop never waits on the database.
+    If the writer falls `queue_size` records behind, new records are counted
+    in `dropped` instead of queued.
+
+    The formatter must have `build_record(record) -> dict` (JSONFormatter).
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0,
+                 queue_size: int = 100000):
+        super().__init__()
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.thread = threading.Thread(target=self._write, name="event-store", daemon=True)
+        self.connection = connect(path)
+        self.thread.start()
+
+    @classmethod
+    def from_config(cls, section) -> "EventStoreHandler":
+        return cls(
+            section.get("path", "logs/events.db"),
+            batch_size=section.getint("batch_size", 500),
+            flush_interval=section.getfloat("flush_interval", 1.0),
+            queue_size=section.getint("queue_size", 100000),
+        )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            row = event_row(self.formatter.build_record(record))
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self) -> None:
+        while True:
+            row = self.queue.get()
+            if row is None:
+                return
+            batch = [row]
+            try:
+                while len(batch) < self.batch_size:
+                    row = self.queue.get(timeout=self.flush_interval)
+                    if row is None:
+                        self._insert(batch)
+                        return
+                    batch.append(row)
+            except queue.Empty:
+                pass
+            self._insert(batch)
+
+    def _insert(self, batch: list) -> None:
+        try:
+            with self.connection:
+                self.connection.executemany(INSERT, batch)
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.dropped += len(batch)
+            print(f"❌ Error writing {len(batch)} events to {self.path}: {e}")
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=10)
+        self.connection.close()
+        super().close()
+
+
+def encode_cursor(timestamp: str, event_id: int) -> str:
+    return f"{timestamp}|{event_id}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    timestamp, _, event_id = cursor.rpartition("|")
+    if not timestamp or not event_id.isdigit():
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return timestamp, int(event_id)
+
+
+def query_events(connection: sqlite3.Connection, filters: dict, start=None, end=None,
+                 cursor=None, limit: int = 100) -> dict:
+    """
+    Newest-first events matching `filters` (FILTER_COLUMNS keys → value)
+    within [start, end], paginated by keyset: `cursor` is the `next` value of
+    the previous page, so every page is one index range scan however deep it is.
+    """
+    clauses, params = [], []
+    for name, value in filters.items():
+        clauses.append(f"{FILTER_COLUMNS[name]} = ?")
+        params.append(value)
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("timestamp <= ?")
+        params.append(end)
+    if cursor is not None:
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = connection.execute(
+        f"SELECT id, timestamp, data FROM events {where}"
+        " ORDER BY timestamp DESC, id DESC LIMIT ?",
+        params + [limit + 1],
+    ).fetchall()
+
+    events = [json.loads(data) for _, _, data in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last_id, last_timestamp, _ = rows[limit - 1]
+        next_cursor = encode_cursor(last_timestamp, last_id)
+    return {"events": events, "next": next_cursor}
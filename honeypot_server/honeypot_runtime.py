@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 import socket
 import sys
 import threading
+import time
 import traceback
 import uuid
 from base64 import b64encode
@@ -25,20 +26,46 @@ from langchain_core.chat_history import (
 )
 from langchain_core.messages import HumanMessage, SystemMessage, trim_messages
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_openai import ChatOpenAI
 
+from honeypot_server.admission import (
+    ADMIT,
+    AUTH_ONLY,
+    REJECT,
+    TARPIT,
+    AdmissionController,
+    TokenBucket,
+)
+from honeypot_server import command_classifier
 from honeypot_server.command_classifier import analyze_command, classify_command
+from honeypot_server.credential_harvest import CredentialAggregator
+from honeypot_server.event_loop import LoopLagMonitor, new_event_loop
+from honeypot_server.event_store import EventStoreHandler
 from honeypot_server.logging_util import log_event
+from honeypot_server.metrics import Registry
+from honeypot_server.stage_timing import (
+    ANOMALY_WRITE,
+    CLASSIFY,
+    DISABLED_TIMER,
+    DRAIN,
+    LLM,
+    SUMMARY,
+    TRIM,
+    STAGE_BUCKETS,
+    CommandTimer,
+    current_command_timer,
+)
+from honeypot_server.tarpit import Tarpit
 
 global_command_database = []
+background_tasks = set()
 geo_reader = geoip2.database.Reader("GeoLite2-City.mmdb")
 
 
 def get_location(ip_address):
     try:
-        geo_reader = geoip2.database.Reader("GeoLite2-City.mmdb")
         response = geo_reader.city(ip_address)
         location_data = {
             "country": response.country.name,
@@ -46,7 +73,6 @@ def get_location(ip_address):
             "latitude": response.location.latitude,
             "longitude": response.location.longitude,
         }
-        geo_reader.close()
         return location_data
     except Exception as e:
         print(f"GeoIP lookup failed: {e}")
@@ -58,7 +84,7 @@ class JSONFormatter(logging.Formatter):
         super().__init__(*args, **kwargs)
         self.sensor_name = sensor_name
 
-    def format(self, record):
+    def build_record(self, record) -> dict:
         log_record = {
             "timestamp": datetime.datetime.fromtimestamp(
                 record.created, datetime.timezone.utc
@@ -79,13 +105,19 @@ class JSONFormatter(logging.Formatter):
         for key, value in record.__dict__.items():
             if key not in log_record and key != "args" and key != "msg":
                 log_record[key] = value
-        return json.dumps(log_record)
+        return log_record
+
+    def format(self, record):
+        return json.dumps(self.build_record(record))
 
 
 class MySSHServer(asyncssh.SSHServer):
     def __init__(self):
         super().__init__()
         self.summary_generated = False
+        self.admission = None
+        self.peer = None
+        self.announced = False
 
     def connection_made(self, conn: asyncssh.SSHServerConnection) -> None:
 
@@ -107,26 +139,64 @@ class MySSHServer(asyncssh.SSHServer):
         thread_local.dst_ip = dst_ip
         thread_local.dst_port = dst_port
 
-        location = get_location(src_ip)
+        self.peer = {
+            "src_ip": src_ip,
+            "src_port": src_port,
+            "dst_ip": dst_ip,
+            "dst_port": dst_port,
+        }
 
+        self.admission = admission_controller.admit(src_ip)
+        if self.admission.decision == REJECT:
+            # Close before key exchange; nothing else is spent on this peer.
+            asyncio.get_running_loop().call_soon(conn.abort)
+            return
+        if self.admission.decision != ADMIT:
+            return
+
+        # On the credential fast path, brute-force bots that never log in
+        # never cost a GeoIP lookup or a connection record.
+        if not credential_fast_path:
+            self.announce_connection()
+
+    def announce_connection(self) -> None:
+        if self.announced or self.peer is None:
+            return
+        self.announced = True
+
+        location = get_location(self.peer["src_ip"])
+
+        logger.info("SSH connection received", extra=dict(self.peer))
+        print(f"🚨 New Attack from {location} (IP: {self.peer['src_ip']})")
+
+    def record_credentials(self, username: str, password: str, success: bool, **extra) -> None:
+        if credential_fast_path:
+            credential_aggregator.record(username, password, self.peer["src_ip"], success)
+            if not success:
+                return
+        if success:
+            self.announce_connection()
         logger.info(
-            "SSH connection received",
-            extra={
-                "src_ip": src_ip,
-                "src_port": src_port,
-                "dst_ip": dst_ip,
-                "dst_port": dst_port,
-            },
+            "Authentication success" if success else "Authentication failed",
+            extra={"username": username, "password": password, **self.peer, **extra},
         )
-        print(f"🚨 New Attack from {location} (IP: {src_ip})")
 
     def connection_lost(self, exc: Optional[Exception]) -> None:
+        admission_controller.release(self.admission)
+        if self.admission is not None and self.admission.decision == REJECT:
+            return
+
+        # thread_local holds whichever connection the loop saw last; use our own peer.
+        peer = self.peer or {}
+        # Like the connection record, the close record is only written for
+        # sessions that authenticated when the credential fast path is on.
         if exc:
-            logger.error("SSH connection error", extra={"error": str(exc)})
+            if self.announced or not credential_fast_path:
+                logger.error("SSH connection error", extra={"error": str(exc), **peer})
             if not isinstance(exc, ConnectionLost):
                 traceback.print_exception(exc)
-        else:
-            logger.info("SSH connection closed")
+        elif self.announced or not credential_fast_path:
+            logger.info("SSH connection closed", extra=peer)
 
         if (
             hasattr(self, "_process")
@@ -137,13 +207,16 @@ class MySSHServer(asyncssh.SSHServer):
             logger.info(summary)
 
     def begin_auth(self, username: str) -> bool:
+        if self.admission is not None and not self.admission.admitted:
+            # Excess connections always have to go through password auth.
+            return True
+
         if accounts.get(username) != "":
-            logger.info("User attempting to authenticate", extra={"username": username})
+            if not credential_fast_path:
+                logger.info("User attempting to authenticate", extra={"username": username})
             return True
         else:
-            logger.info(
-                "Authentication success", extra={"username": username, "password": ""}
-            )
+            self.record_credentials(username, "", True)
             return False
 
     def password_auth_supported(self) -> bool:
@@ -159,21 +232,28 @@ class MySSHServer(asyncssh.SSHServer):
         return False
 
     def validate_password(self, username: str, password: str) -> bool:
+        if self.admission is not None and self.admission.decision == TARPIT:
+            return self._tarpit_password(username, password)
+        if self.admission is not None and self.admission.decision == AUTH_ONLY:
+            self.record_credentials(username, password, False, admission=AUTH_ONLY)
+            return False
+
         pw = accounts.get(username, "*")
 
         if pw == "*" or (pw != "*" and password == pw):
-            logger.info(
-                "Authentication success",
-                extra={"username": username, "password": password},
-            )
+            self.record_credentials(username, password, True)
             return True
         else:
-            logger.info(
-                "Authentication failed",
-                extra={"username": username, "password": password},
-            )
+            self.record_credentials(username, password, False)
             return False
 
+    async def _tarpit_password(self, username: str, password: str) -> bool:
+        # asyncssh awaits coroutine results, so this holds the peer for the
+        # delay on nothing but a timer and then refuses the credentials.
+        await asyncio.sleep(admission_tarpit_delay)
+        self.record_credentials(username, password, False, admission=TARPIT)
+        return False
+
 
 def session_summary(command_log):
     total = len(command_log)
@@ -202,6 +282,38 @@ def load_prompt():
         return "Simulate a realistic Linux system."
 
 
+def run_classifier(command: str):
+    started = time.perf_counter()
+    prediction, is_anomaly = analyze_command(command)
+    classification = classify_command(prediction)
+    classifier_seconds.observe(time.perf_counter() - started)
+    return prediction, is_anomaly, classification
+
+
+async def invoke_llm(kind: str, inputs: dict, llm_config: dict):
+    """Calls the LLM chain, recording latency, outcome and token usage."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await with_message_history.ainvoke(inputs, config=llm_config)
+        outcome = "ok"
+        usage = getattr(response, "usage_metadata", None) or {}
+        llm_tokens_total.inc("input", amount=usage.get("input_tokens", 0))
+        llm_tokens_total.inc("output", amount=usage.get("output_tokens", 0))
+        return response
+    finally:
+        llm_request_seconds.observe(time.perf_counter() - started, kind)
+        llm_requests_total.inc(kind, outcome)
+
+
+def demote_to_tarpit(
+    process: asyncssh.SSHServerProcess, task_uuid: str, reason: str
+) -> None:
+    logger.info("Session demoted to tarpit", extra={"reason": reason})
+    llm_sessions.pop(task_uuid, None)
+    tarpit.hold(process, reason)
+
+
 async def handle_client(
     process: asyncssh.SSHServerProcess, server: MySSHServer
 ) -> None:
@@ -212,6 +324,13 @@ async def handle_client(
     llm_config = {"configurable": {"session_id": task_uuid}}
     command_log = []
     system_prompt = load_prompt()
+    demoted = False
+
+    timer = CommandTimer(command_stage_seconds) if stage_timing_enabled else DISABLED_TIMER
+    current_command_timer.set(timer)
+
+    sessions_total.inc("exec" if process.command else "shell")
+    sessions_open.inc()
 
     try:
         if process.command:
@@ -225,30 +344,25 @@ async def handle_client(
                 },
             )
 
-            prediction, is_anomaly = analyze_command(command)
-            classification = classify_command(prediction)
+            timer.start()
+            prediction, is_anomaly, classification = run_classifier(command)
+            timer.mark(CLASSIFY)
 
             if is_anomaly:
                 classification = "ANOMALOUS"
                 with open("logs/anomalous_commands.csv", "a") as f:
                     f.write(f"{command}\n")
+            timer.mark(ANOMALY_WRITE)
 
+            commands_total.inc(classification)
             cmd_entry = {"command": command, "classification": classification}
             command_log.append(cmd_entry)
             global_command_database.append(cmd_entry)
-            logger.info(
-                "Command Classified",
-                extra={
-                    "command": command,
-                    "classification": classification,
-                    "prediction": (
-                        str(prediction.tolist()) if prediction is not None else "None"
-                    ),
-                },
-            )
+            timer.mark(SUMMARY)
 
             try:
-                ai_response = await with_message_history.ainvoke(
+                ai_response = await invoke_llm(
+                    "command",
                     {
                         "messages": [
                             SystemMessage(content=system_prompt),
@@ -257,7 +371,7 @@ async def handle_client(
                         "username": process.get_extra_info("username"),
                         "interactive": True,
                     },
-                    config=llm_config,
+                    llm_config,
                 )
 
                 if hasattr(ai_response, "content"):
@@ -270,14 +384,29 @@ async def handle_client(
             except Exception as e:
                 logger.error(f"Error generating AI response: {str(e)}")
                 process.stdout.write("Command executed successfully.\n")
+            timer.mark(LLM)
+            timer.exclude(LLM, TRIM)
 
-            await session_summary(command_log)
-            process.exit(0)
+            await process.stdout.drain()
+            timer.mark(DRAIN)
+
+            logger.info(
+                "Command Classified",
+                extra={
+                    "command": command,
+                    "classification": classification,
+                    "prediction": (
+                        str(prediction.tolist()) if prediction is not None else "None"
+                    ),
+                    **timer.finish(),
+                },
+            )
 
         else:
 
             try:
-                ai_welcome = await with_message_history.ainvoke(
+                ai_welcome = await invoke_llm(
+                    "welcome",
                     {
                         "messages": [
                             SystemMessage(content=system_prompt),
@@ -288,7 +417,7 @@ async def handle_client(
                         "username": process.get_extra_info("username"),
                         "interactive": True,
                     },
-                    config=llm_config,
+                    llm_config,
                 )
 
                 if hasattr(ai_welcome, "content"):
@@ -304,7 +433,26 @@ async def handle_client(
             process.stdout.write("> ")
             await process.stdout.drain()
 
-            async for line in process.stdin:
+            command_bucket = (
+                TokenBucket(tarpit_command_rate, tarpit_command_burst, time.monotonic())
+                if tarpit_enabled and tarpit_command_rate > 0
+                else None
+            )
+            demote_hits = 0
+
+            while True:
+                try:
+                    line = await asyncio.wait_for(
+                        process.stdin.readline(), session_idle_timeout or None
+                    )
+                except asyncio.TimeoutError:
+                    logger.info(
+                        "Session idle timeout", extra={"idle_timeout": session_idle_timeout}
+                    )
+                    break
+                if not line:
+                    break
+
                 command = line.strip()
 
                 if not command:
@@ -312,6 +460,11 @@ async def handle_client(
                     await process.stdout.drain()
                     continue
 
+                if command_bucket is not None and not command_bucket.take(time.monotonic()):
+                    demote_to_tarpit(process, task_uuid, "command_rate")
+                    demoted = True
+                    return
+
                 logger.info(
                     "User input",
                     extra={
@@ -320,38 +473,54 @@ async def handle_client(
                     },
                 )
 
-                prediction, is_anomaly = analyze_command(command)
-                classification = classify_command(prediction)
+                timer.start()
+                prediction, is_anomaly, classification = run_classifier(command)
+                timer.mark(CLASSIFY)
 
                 if is_anomaly:
                     classification = "ANOMALOUS"
                     with open("logs/anomalous_commands.csv", "a") as f:
                         f.write(f"{command}\n")
+                timer.mark(ANOMALY_WRITE)
 
+                commands_total.inc(classification)
                 cmd_entry = {"command": command, "classification": classification}
                 command_log.append(cmd_entry)
                 global_command_database.append(cmd_entry)
                 # ✅ Immediately update session summary after the command
                 summary_text = session_summary(command_log)
                 logger.info("Session Summary", extra={"summary": summary_text})
-                logger.info(
-                    "Command Classified",
-                    extra={
-                        "command": command,
-                        "classification": classification,
-                        "prediction": (
-                            str(prediction.tolist())
-                            if prediction is not None
-                            else "None"
-                        ),
-                    },
-                )
                 log_event(
                     "CommandClassified", command=command, classification=classification
                 )
+                timer.mark(SUMMARY)
+
+                classified_extra = {
+                    "command": command,
+                    "classification": classification,
+                    "prediction": (
+                        str(prediction.tolist())
+                        if prediction is not None
+                        else "None"
+                    ),
+                }
+
+                if tarpit_enabled and classification in tarpit_demote_classifications:
+                    demote_hits += 1
+                    if demote_hits >= tarpit_demote_threshold:
+                        logger.info(
+                            "Command Classified",
+                            extra={**classified_extra, **timer.finish()},
+                        )
+                        demote_to_tarpit(
+                            process, task_uuid, f"classification:{classification}"
+                        )
+                        demoted = True
+                        return
 
                 try:
-                    ai_response = await with_message_history.ainvoke(
+                    ai_response = await invoke_llm(
+                        "command",
                         {
                             "messages": [
                                 SystemMessage(content=system_prompt),
@@ -360,7 +529,7 @@ async def handle_client(
                             "username": process.get_extra_info("username"),
                             "interactive": True,
                         },
-                        config=llm_config,
+                        llm_config,
                     )
 
                     if hasattr(ai_response, "content"):
@@ -372,26 +541,77 @@ async def handle_client(
                 except Exception as e:
                     logger.error(f"Error generating AI system response: {str(e)}")
                     process.stdout.write("Command executed successfully.\n")
+                timer.mark(LLM)
+                timer.exclude(LLM, TRIM)
 
                 process.stdout.write("> ")
                 await process.stdout.drain()
+                timer.mark(DRAIN)
+
+                # Logged once the response is out, so it carries every stage's timing.
+                logger.info(
+                    "Command Classified", extra={**classified_extra, **timer.finish()}
+                )
 
     except asyncssh.BreakReceived:
         pass
 
     finally:
+        sessions_open.dec()
         summary_text = session_summary(command_log)
         print(f"📊 Generated session summary:\n{summary_text}")
 
         logger.info("Session Summary", extra={"summary": summary_text})
 
-        process.exit(0)
+        if not demoted:
+            llm_sessions.pop(task_uuid, None)
+            process.exit(0)
+
+async def watch_model_updates(interval: float) -> None:
+    """Swaps in models published by the dashboard's training jobs."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await loop.run_in_executor(None, command_classifier.reload_if_published):
+                logger.info("Classifier models reloaded", extra={"manifest": command_classifier.MANIFEST_FILE})
+        except Exception as e:
+            logging.error(f"Reloading classifier models failed: {e}")
+
 
 async def start_server() -> None:
     async def process_factory(process: asyncssh.SSHServerProcess) -> None:
         server = process.get_server()
         await handle_client(process, server)
 
+    loop = asyncio.get_running_loop()
+    if config["metrics"].getboolean("enabled", True):
+        await metrics.serve(
+            config["metrics"].get("host", "127.0.0.1"),
+            config["metrics"].getint("port", 9108),
+        )
+    if loop_lag_monitor is not None:
+        background_tasks.add(
+            loop.create_task(
+                loop_lag_monitor.run(
+                    lambda report: logger.info("Event loop lag", extra=report)
+                )
+            )
+        )
+    if tarpit_enabled:
+        background_tasks.add(loop.create_task(tarpit.run()))
+    if model_reload_interval > 0:
+        background_tasks.add(loop.create_task(watch_model_updates(model_reload_interval)))
+    if credential_fast_path:
+        background_tasks.add(
+            loop.create_task(
+                credential_aggregator.run(
+                    credential_flush_interval,
+                    lambda summary: logger.info("Credential summary", extra=summary),
+                )
+            )
+        )
+
     await asyncssh.listen(
         port=config["ssh"].getint("port", 8022),
         reuse_address=True,
@@ -414,10 +634,11 @@ class ContextFilter(logging.Filter):
         else:
             task_name = thread_local.__dict__.get("session_id", "-")
 
-        record.src_ip = thread_local.__dict__.get("src_ip", "-")
-        record.src_port = thread_local.__dict__.get("src_port", "-")
-        record.dst_ip = thread_local.__dict__.get("dst_ip", "-")
-        record.dst_port = thread_local.__dict__.get("dst_port", "-")
+        # Connection details passed explicitly via `extra` win over the
+        # last connection seen on this thread.
+        for key in ("src_ip", "src_port", "dst_ip", "dst_port"):
+            if not hasattr(record, key):
+                setattr(record, key, thread_local.__dict__.get(key, "-"))
 
         record.task_name = task_name
 
@@ -427,6 +648,16 @@ class ContextFilter(logging.Filter):
 llm_sessions = dict()
 
 
+def timed_trim(messages):
+    """Runs the history trimmer, charging its time to the current command."""
+    started = time.perf_counter()
+    trimmed = llm_trimmer.invoke(messages)
+    timer = current_command_timer.get()
+    if timer is not None:
+        timer.add(TRIM, time.perf_counter() - started)
+    return trimmed
+
+
 def llm_get_session_history(session_id: str) -> BaseChatMessageHistory:
     if session_id not in llm_sessions:
         llm_sessions[session_id] = InMemoryChatMessageHistory()
@@ -580,6 +811,30 @@ try:
 
     accounts = get_user_accounts()
 
+    # Tuning sections are optional; missing ones fall back to the defaults.
+    for section in ("runtime", "metrics", "admission", "tarpit", "credentials", "event_store"):
+        if not config.has_section(section):
+            config.add_section(section)
+
+    admission_controller = AdmissionController.from_config(config["admission"])
+    admission_tarpit_delay = config["admission"].getfloat("tarpit_delay", 10.0)
+
+    tarpit = Tarpit.from_config(config["tarpit"])
+    tarpit_enabled = config["tarpit"].getboolean("enabled", True)
+    session_idle_timeout = config["tarpit"].getfloat("idle_timeout", 600.0)
+    tarpit_command_rate = config["tarpit"].getfloat("command_rate", 0.0)
+    tarpit_command_burst = config["tarpit"].getfloat("command_burst", 20.0)
+    tarpit_demote_classifications = {
+        c.strip().upper()
+        for c in config["tarpit"].get("demote_classifications", "").split(",")
+        if c.strip()
+    }
+    tarpit_demote_threshold = config["tarpit"].getint("demote_threshold", 1)
+
+    credential_fast_path = config["credentials"].getboolean("fast_path", True)
+    credential_flush_interval = config["credentials"].getfloat("flush_interval", 60.0)
+    credential_aggregator = CredentialAggregator.from_config(config["credentials"])
+
     logging.Formatter.formatTime = (
         lambda self, record, datefmt=None: datetime.datetime.fromtimestamp(
             record.created, datetime.timezone.utc
@@ -588,6 +843,97 @@ try:
 
     sensor_name = config["honeypot"].get("sensor_name", socket.gethostname())
 
+    stage_timing_enabled = config["runtime"].getboolean("stage_timing", True)
+    model_reload_interval = config["runtime"].getfloat("model_reload_interval", 30.0)
+
+    # Runtime metrics. Everything is updated from the event loop thread and
+    # scraped there too, so plain (lock-free) updates are consistent.
+    metrics = Registry()
+    sessions_total = metrics.counter(
+        "honeypot_sessions_total", "SSH sessions started.", ("kind",)
+    )
+    sessions_open = metrics.gauge("honeypot_sessions_open", "SSH sessions in progress.")
+    commands_total = metrics.counter(
+        "honeypot_commands_total", "Commands handled, by classification.", ("classification",)
+    )
+    classifier_seconds = metrics.histogram(
+        "honeypot_classifier_seconds", "Time spent classifying one command."
+    )
+    metrics.callback(
+        "honeypot_classifier_lookups_total",
+        "Commands answered from the labeled dataset (hit) or by the model (miss).",
+        lambda: {(k,): v for k, v in command_classifier.lookup_stats.items()},
+        ("result",),
+        type="counter",
+    )
+    llm_request_seconds = metrics.histogram(
+        "honeypot_llm_request_seconds", "LLM request latency.", ("kind",)
+    )
+    llm_requests_total = metrics.counter(
+        "honeypot_llm_requests_total", "LLM requests, by outcome.", ("kind", "outcome")
+    )
+    llm_tokens_total = metrics.counter(
+        "honeypot_llm_tokens_total", "LLM tokens used.", ("direction",)
+    )
+    metrics.callback(
+        "honeypot_llm_histories", "LLM chat histories held in memory.", lambda: len(llm_sessions)
+    )
+    command_stage_seconds = metrics.histogram(
+        "honeypot_command_stage_seconds",
+        "Time spent in each stage of handling a command.",
+        ("stage",),
+        STAGE_BUCKETS,
+    )
+    event_loop_lag_seconds = metrics.histogram(
+        "honeypot_event_loop_lag_seconds", "Event loop scheduling delay."
+    )
+    metrics.callback(
+        "honeypot_event_loop_tasks",
+        "Tasks scheduled on the event loop.",
+        lambda: len(asyncio.all_tasks()),
+    )
+    metrics.callback(
+        "honeypot_admission_decisions_total",
+        "Admission decisions for new connections.",
+        lambda: dict(admission_controller.decisions),
+        ("decision", "reason"),
+        type="counter",
+    )
+    metrics.callback(
+        "honeypot_connections_admitted",
+        "Connections currently admitted for a full session.",
+        lambda: admission_controller.active_sessions,
+    )
+    metrics.callback(
+        "honeypot_connections_excess",
+        "Tarpitted or auth-only connections currently held.",
+        lambda: admission_controller.excess_connections,
+    )
+    metrics.callback(
+        "honeypot_tarpit_held", "Sessions held in the tarpit.", lambda: len(tarpit.held)
+    )
+    metrics.callback(
+        "honeypot_tarpit_memory_bytes",
+        "Approximate memory used by tarpitted sessions.",
+        tarpit.memory_bytes,
+    )
+    metrics.callback(
+        "honeypot_tarpit_timers_pending",
+        "Entries waiting on the tarpit timer wheel.",
+        lambda: len(tarpit.wheel),
+    )
+    metrics.callback(
+        "honeypot_credential_attempts_total",
+        "Password attempts seen.",
+        lambda: credential_aggregator.total_attempts,
+        type="counter",
+    )
+    metrics.callback(
+        "honeypot_credential_keys_pending",
+        "Distinct credentials waiting for the next summary flush.",
+        lambda: len(credential_aggregator),
+    )
+
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
 
@@ -598,6 +944,23 @@ try:
 
     log_file_handler.setFormatter(JSONFormatter(sensor_name))
 
+    if config["event_store"].getboolean("enabled", True):
+        event_store_handler = EventStoreHandler.from_config(config["event_store"])
+        event_store_handler.setFormatter(JSONFormatter(sensor_name))
+        logger.addHandler(event_store_handler)
+        metrics.callback(
+            "honeypot_event_store_written_total",
+            "Log records written to the event store.",
+            lambda: event_store_handler.written,
+            type="counter",
+        )
+        metrics.callback(
+            "honeypot_event_store_dropped_total",
+            "Log records the event store dropped because its writer fell behind.",
+            lambda: event_store_handler.dropped,
+            type="counter",
+        )
+
     f = ContextFilter()
     logger.addFilter(f)
 
@@ -624,7 +987,9 @@ try:
         ]
     )
     llm_chain = (
-        RunnablePassthrough.assign(messages=itemgetter("messages") | llm_trimmer)
+        RunnablePassthrough.assign(
+            messages=itemgetter("messages") | RunnableLambda(timed_trim)
+        )
         | llm_prompt
         | llm
     )
@@ -633,8 +998,17 @@ try:
     )
     thread_local = threading.local()
 
-    loop = asyncio.new_event_loop()
+    loop = new_event_loop(config["runtime"].get("event_loop", "asyncio"))
     asyncio.set_event_loop(loop)
+
+    loop_lag_monitor = None
+    if config["runtime"].getboolean("loop_lag_monitor", True):
+        loop_lag_monitor = LoopLagMonitor.from_config(config["runtime"], event_loop_lag_seconds)
+        if config["runtime"].getboolean("slow_callback_debug", False):
+            loop_lag_monitor.enable_slow_callback_debug(
+                loop, config["runtime"].getfloat("slow_callback_threshold", 0.05)
+            )
+
     loop.run_until_complete(start_server())
     loop.run_forever()
 
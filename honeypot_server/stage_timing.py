@@ -0,0 +1,87 @@
+import time
+from array import array
+from contextvars import ContextVar
+
+# Stages of handling one command in handle_client, in order.
+STAGES = ("classify", "anomaly_write", "summary", "trim", "llm", "drain")
+CLASSIFY, ANOMALY_WRITE, SUMMARY, TRIM, LLM, DRAIN = range(len(STAGES))
+
+# Upper bounds (seconds) of the per-stage histogram buckets.
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# The timer of the command being handled, so stages that run inside the LLM
+# chain (history trimming) can report into it.
+current_command_timer: ContextVar["CommandTimer | None"] = ContextVar(
+    "current_command_timer", default=None
+)
+
+
+class CommandTimer:
+    """
+    Monotonic-clock spans for the stages of one command. A session keeps one
+    timer and resets it per command, so timing allocates nothing per stage.
+    """
+
+    __slots__ = ("spans", "histogram", "_mark")
+
+    enabled = True
+
+    def __init__(self, histogram):
+        """`histogram` is a metrics.Histogram labelled by stage name."""
+        self.spans = array("d", bytes(8 * len(STAGES)))
+        self.histogram = histogram
+        self._mark = 0.0
+
+    def start(self) -> None:
+        for i in range(len(STAGES)):
+            self.spans[i] = 0.0
+        self._mark = time.perf_counter()
+
+    def mark(self, stage: int) -> None:
+        """Closes `stage`: everything since the previous mark is charged to it."""
+        now = time.perf_counter()
+        self.spans[stage] += now - self._mark
+        self._mark = now
+
+    def add(self, stage: int, seconds: float) -> None:
+        self.spans[stage] += seconds
+
+    def exclude(self, stage: int, nested: int) -> None:
+        """Takes the time of `nested`, which ran inside `stage`, out of `stage`."""
+        self.spans[stage] = max(0.0, self.spans[stage] - self.spans[nested])
+
+    def finish(self) -> dict:
+        """Records the spans in the histogram and returns the log fields."""
+        timing = {}
+        for i, name in enumerate(STAGES):
+            seconds = self.spans[i]
+            self.histogram.observe(seconds, name)
+            timing[name] = round(seconds * 1000, 3)
+        timing["total"] = round(sum(self.spans) * 1000, 3)
+        return {"timing": timing}
+
+
+class _DisabledTimer:
+    """Stand-in when stage timing is switched off; every call is a no-op."""
+
+    __slots__ = ()
+
+    enabled = False
+
+    def start(self) -> None:
+        pass
+
+    def mark(self, stage: int) -> None:
+        pass
+
+    def add(self, stage: int, seconds: float) -> None:
+        pass
+
+    def exclude(self, stage: int, nested: int) -> None:
+        pass
+
+    def finish(self) -> dict:
+        return {}
+
+
+DISABLED_TIMER = _DisabledTimer()
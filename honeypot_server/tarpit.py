@@ -0,0 +1,148 @@
+import asyncio
+import sys
+import time
+from functools import partial
+
+# Output trickled to tarpitted sessions, one character per wheel firing. It
+# looks like a package manager that is very slowly making progress.
+TRICKLE_TEXT = "Reading package lists... Building dependency tree... Reading state information... "
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel driven by a single asyncio task. Scheduling and firing
+    are O(1) per entry no matter how many entries are pending, and there is
+    one sleeping coroutine for the whole wheel instead of one per entry.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.cursor = 0
+
+    def schedule(self, callback, delay: float) -> None:
+        ticks = max(1, int(round(delay / self.tick)))
+        rounds, offset = divmod(ticks, len(self.slots))
+        if offset == 0:
+            rounds, offset = rounds - 1, len(self.slots)
+        slot = (self.cursor + offset) % len(self.slots)
+        self.slots[slot].append([rounds, callback])
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self.slots)
+
+    def advance(self) -> None:
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        due, waiting = [], []
+        for entry in self.slots[self.cursor]:
+            if entry[0] > 0:
+                entry[0] -= 1
+                waiting.append(entry)
+            else:
+                due.append(entry[1])
+        self.slots[self.cursor] = waiting
+        for callback in due:
+            callback()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self.advance()
+
+
+class _HeldSession:
+    __slots__ = ("process", "reason", "held_since", "deadline", "position", "bytes_sent")
+
+    def __init__(self, process, reason: str, now: float, deadline: float):
+        self.process = process
+        self.reason = reason
+        self.held_since = now
+        self.deadline = deadline
+        self.position = 0
+        self.bytes_sent = 0
+
+
+class Tarpit:
+    """
+    Holds demoted SSH sessions open at near-zero cost. A held session has no
+    coroutine, no LLM history and is never classified again; the shared timer
+    wheel writes one character to it every `trickle_interval` seconds until
+    the peer goes away or `max_hold` seconds have passed.
+    """
+
+    def __init__(self, trickle_interval: float = 10.0, max_hold: float = 3600.0, tick: float = 1.0):
+        self.trickle_interval = trickle_interval
+        self.max_hold = max_hold
+        self.wheel = TimerWheel(tick=tick)
+        self.held = set()
+        self.total_held = 0
+        self.total_reaped = 0
+        self.total_bytes_sent = 0
+
+    @classmethod
+    def from_config(cls, section) -> "Tarpit":
+        return cls(
+            trickle_interval=section.getfloat("trickle_interval", 10.0),
+            max_hold=section.getfloat("max_hold", 3600.0),
+            tick=section.getfloat("tick", 1.0),
+        )
+
+    async def run(self) -> None:
+        await self.wheel.run()
+
+    def hold(self, process, reason: str) -> None:
+        now = time.monotonic()
+        session = _HeldSession(process, reason, now, now + self.max_hold)
+        self.held.add(session)
+        self.total_held += 1
+        self.wheel.schedule(partial(self._trickle, session), self.trickle_interval)
+
+    def _trickle(self, session: _HeldSession) -> None:
+        if session not in self.held:
+            return
+        if time.monotonic() >= session.deadline:
+            self._release(session)
+            return
+
+        char = TRICKLE_TEXT[session.position % len(TRICKLE_TEXT)]
+        try:
+            session.process.stdout.write(char)
+        except Exception:
+            # The peer went away; nothing left to hold.
+            self._release(session, close=False)
+            return
+        session.position += 1
+        session.bytes_sent += 1
+        self.total_bytes_sent += 1
+        self.wheel.schedule(partial(self._trickle, session), self.trickle_interval)
+
+    def _release(self, session: _HeldSession, close: bool = True) -> None:
+        self.held.discard(session)
+        self.total_reaped += 1
+        if close:
+            try:
+                session.process.exit(0)
+            except Exception:
+                pass
+        session.process = None
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the tarpit's own bookkeeping."""
+        size = sys.getsizeof(self.held) + sum(sys.getsizeof(slot) for slot in self.wheel.slots)
+        for session in self.held:
+            size += sys.getsizeof(session) + sys.getsizeof(session.reason)
+        # Each pending wheel entry is a two-item list plus a partial.
+        size += len(self.wheel) * (sys.getsizeof([0, None]) + 80)
+        return size
+
+    def stats(self) -> dict:
+        return {
+            "held": len(self.held),
+            "memory_bytes": self.memory_bytes(),
+            "total_held": self.total_held,
+            "total_reaped": self.total_reaped,
+            "bytes_sent": self.total_bytes_sent,
+        }
@@ -1,19 +1,35 @@
 #!/usr/bin/env python3
+"""
+Generates a synthetic honeypot log dataset as sharded NDJSON.
+
+Shards of --shard-size entries are written in parallel, one per process at a
+time, each streamed to disk in blocks rather than built in memory. Every
+shard has its own random generator, seeded from --seed and the shard number,
+and timestamps count up from --start, so the same arguments give the same
+files whatever the number of processes. data_processing/parse_logs.py reads
+the shards back one line at a time.
+"""
 import json
 import random
 import datetime
+import gzip
+import io
 import os
 import argparse
+import multiprocessing
 
 # Set dataset directory
 DATASET_DIR = "model_assets"
-os.makedirs(DATASET_DIR, exist_ok=True)
+OUTPUT_DIR = os.path.join(DATASET_DIR, "honeypot_logs")
+SHARD_SIZE = 1_000_000
+# Entries serialized before each write
+WRITE_BLOCK = 10_000
 
-def random_ip():
-    return ".".join(str(random.randint(1, 255)) for _ in range(4))
+def random_ip(rng):
+    return ".".join(str(rng.randint(1, 255)) for _ in range(4))
 
-def random_task():
-    return f"Task-{random.randint(1000, 9999)}"
+def random_task(rng):
+    return f"Task-{rng.randint(1000, 9999)}"
 
 # Static command dictionary
 command_classification = {
@@ -77,7 +93,7 @@ command_classification = {
 }
 
 # Dynamic realistic command generator
-def generate_dynamic_command():
+def generate_dynamic_command(rng):
     templates = [
         "scp {file} {user}@{host}:{path}",
         "sudo apt install {package}",
@@ -107,42 +123,45 @@ def generate_dynamic_command():
         "proc": ["sshd", "nginx", "mysql"]
     }
 
-    template = random.choice(templates)
+    template = rng.choice(templates)
     for key in placeholders:
-        template = template.replace(f"{{{key}}}", random.choice(placeholders[key]))
+        template = template.replace(f"{{{key}}}", rng.choice(placeholders[key]))
     return template
 
 # Text distortion for realism
-def augment_command(command):
-    if random.random() < 0.3:
-        command = command.upper() if random.random() < 0.5 else command.lower()
-    if random.random() < 0.3:
-        command = " " + command if random.random() < 0.5 else command + " "
+def augment_command(command, rng):
+    if rng.random() < 0.3:
+        command = command.upper() if rng.random() < 0.5 else command.lower()
+    if rng.random() < 0.3:
+        command = " " + command if rng.random() < 0.5 else command + " "
     words = command.split()
-    if len(words) > 1 and random.random() < 0.3:
-        i = random.randint(0, len(words) - 2)
+    if len(words) > 1 and rng.random() < 0.3:
+        i = rng.randint(0, len(words) - 2)
         words[i] = words[i] + "  "
         command = " ".join(words)
     return command
 
-def generate_log_entry():
-    if random.random() < 0.3:
+LOG_LEVELS = {"BENIGN": "INFO", "SUSPICIOUS": "WARNING", "MALICIOUS": "ERROR"}
+STATIC_COMMANDS = list(command_classification.items())
+
+def generate_log_entry(rng, timestamp):
+    if rng.random() < 0.3:
         # 30% chance to generate dynamic command
-        command = generate_dynamic_command()
-        classification = random.choice(["BENIGN", "SUSPICIOUS", "MALICIOUS"])
-        log_level = {"BENIGN": "INFO", "SUSPICIOUS": "WARNING", "MALICIOUS": "ERROR"}[classification]
+        command = generate_dynamic_command(rng)
+        classification = rng.choice(["BENIGN", "SUSPICIOUS", "MALICIOUS"])
+        log_level = LOG_LEVELS[classification]
     else:
-        command, (classification, log_level) = random.choice(list(command_classification.items()))
+        command, (classification, log_level) = rng.choice(STATIC_COMMANDS)
 
-    if random.random() < 0.5:
-        command = augment_command(command)
+    if rng.random() < 0.5:
+        command = augment_command(command, rng)
 
     log_entry = {
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "timestamp": timestamp.isoformat() + "Z",
         "level": log_level,
-        "task_name": random_task(),
-        "src_ip": random_ip(),
-        "src_port": random.randint(1024, 65535),
+        "task_name": random_task(rng),
+        "src_ip": random_ip(rng),
+        "src_port": rng.randint(1024, 65535),
         "dst_ip": "192.168.1.100",
         "dst_port": 22,
         "event": "Session summary",
@@ -152,21 +171,62 @@ def generate_log_entry():
         "sensor_protocol": "ssh",
         "command": command,
         "classification": classification,
-        "prediction": f"[[{random.uniform(0, 1):.2f}, {random.uniform(0, 1):.2f}, {random.uniform(0, 1):.2f}]]"
+        "prediction": f"[[{rng.uniform(0, 1):.2f}, {rng.uniform(0, 1):.2f}, {rng.uniform(0, 1):.2f}]]"
     }
     return log_entry
 
-def generate_logs(num_logs):
-    logs = [generate_log_entry() for _ in range(num_logs)]
-    log_file_path = os.path.join(DATASET_DIR, "honeypot_logs.json")
-    with open(log_file_path, "w") as f:
-        json.dump(logs, f, indent=4)
-    return logs, log_file_path
+def shard_path(output_dir, shard, compress=False):
+    return os.path.join(output_dir, f"part-{shard:05d}.ndjson" + (".gz" if compress else ""))
+
+def write_shard(job):
+    """Writes entries [first, first + count) as shard number `shard`; returns its path."""
+    output_dir, shard, first, count, seed, start, compress = job
+    rng = random.Random(f"{seed}:{shard}")
+    path = shard_path(output_dir, shard, compress)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as out:
+        if compress:
+            # No timestamp, and the final name rather than the tmp one, in the gzip header
+            out = gzip.GzipFile(os.path.basename(path)[:-3], "wb", fileobj=out, mtime=0)
+        with io.TextIOWrapper(out, encoding="utf-8") as f:
+            for block_start in range(first, first + count, WRITE_BLOCK):
+                block_end = min(block_start + WRITE_BLOCK, first + count)
+                f.write("".join(
+                    json.dumps(generate_log_entry(rng, start + datetime.timedelta(seconds=index)),
+                               separators=(",", ":")) + "\n"
+                    for index in range(block_start, block_end)
+                ))
+    os.replace(tmp_path, path)
+    return path, count
+
+def generate_logs(num_logs, output_dir=OUTPUT_DIR, shard_size=SHARD_SIZE, seed=0,
+                  start=datetime.datetime(2025, 1, 1), compress=False, processes=None):
+    os.makedirs(output_dir, exist_ok=True)
+    # Shards left over from a larger earlier run would otherwise be read as part of this one
+    for name in os.listdir(output_dir):
+        if name.startswith("part-") and ".ndjson" in name:
+            os.remove(os.path.join(output_dir, name))
+    jobs = [(output_dir, shard, first, min(shard_size, num_logs - first), seed, start, compress)
+            for shard, first in enumerate(range(0, num_logs, shard_size))]
+    paths = []
+    with multiprocessing.Pool(processes) as pool:
+        for path, count in pool.imap(write_shard, jobs):
+            paths.append(path)
+            print(f"✅ Wrote {count} entries to {path}", flush=True)
+    return paths
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Generate honeypot log dataset.")
     parser.add_argument("--num_logs", type=int, default=50000, help="Number of log entries to generate (default: 50000)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Directory for the NDJSON shards.")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Entries per shard.")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed; shard N is seeded from (seed, N).")
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat, default=datetime.datetime(2025, 1, 1),
+                        help="Timestamp of the first entry; each later entry is one second on.")
+    parser.add_argument("--compress", action="store_true", help="Gzip the shards.")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per CPU).")
     args = parser.parse_args()
 
-    logs, path = generate_logs(args.num_logs)
-    print(f"✅ Honeypot logs saved to: {path}")
\ No newline at end of file
+    paths = generate_logs(args.num_logs, args.output_dir, args.shard_size, args.seed,
+                          args.start, args.compress, args.processes)
+    print(f"✅ {args.num_logs} honeypot log entries saved to {len(paths)} shards in: {args.output_dir}")
@@ -1,77 +1,334 @@
 #!/usr/bin/env python3
+"""
+Evaluates the LSTM model on a held-out split, headless and in bounded memory.
+
+The test set is streamed from the dataset and through the model in chunks of
+--chunk-size commands: the confusion matrix is accumulated from counts, and
+misclassified commands are written out as they're found, so memory depends
+on the chunk size, not the test set. Figures are rendered with the Agg
+backend (no display needed).
+
+Speed is reported with accuracy: throughput of the chunked pass (overall
+and per class, by each class's share of every chunk) and single-command
+latency percentiles per class, timed on a sample the way the runtime
+classifies one command at a time.
+
+Predictions go through the shared prediction cache; on a hit no inference
+runs, and the timings are those recorded when the predictions were made
+(--no-cache measures again).
+"""
 import os
+import csv
 import json
+import time
+import random
+import hashlib
+import argparse
 import numpy as np
-import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.model_selection import train_test_split
 from tensorflow.keras.preprocessing.text import tokenizer_from_json
 from tensorflow.keras.preprocessing.sequence import pad_sequences
 from tensorflow.keras.models import load_model
 
+import prediction_cache
+
 # === Config ===
 DATA_FILE = "model_assets/attack_data.csv"
 MODEL_FILE = "model_assets/lstm_attack_model.h5"
 TOKENIZER_FILE = "model_assets/tokenizer.json"
 MAX_SEQUENCE_LENGTH = 30
 
-# === Load Data ===
-df = pd.read_csv(DATA_FILE)
-print("🔢 Dataset shape:", df.shape)
-original_texts = df["command"].values  # ✅ Moved after loading df
-
-# === Load Tokenizer ===
-with open(TOKENIZER_FILE, "r") as f:
-    tokenizer = tokenizer_from_json(f.read())
-
-sequences = tokenizer.texts_to_sequences(df["command"])
-X = pad_sequences(sequences, maxlen=MAX_SEQUENCE_LENGTH)
-
 # === Labels ===
 label_mapping = {"BENIGN": 0, "SUSPICIOUS": 1, "MALICIOUS": 2}
 reverse_label_map = {v: k for k, v in label_mapping.items()}
-y = df["label"].map(label_mapping).values
-
-# === Split Data ===
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
-
-# === Load Trained Model ===
-model = load_model(MODEL_FILE)
-
-# === Predict ===
-y_pred_probs = model.predict(X_test)
-y_pred = np.argmax(y_pred_probs, axis=1)
-
-# === Evaluation ===
-print("📊 Classification Report:")
-print(classification_report(y_test, y_pred, target_names=label_mapping.keys()))
-
-# === Confusion Matrix ===
-cm = confusion_matrix(y_test, y_pred)
-plt.figure(figsize=(6, 5))
-sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', xticklabels=label_mapping.keys(), yticklabels=label_mapping.keys())
-plt.title("Confusion Matrix")
-plt.xlabel("Predicted")
-plt.ylabel("Actual")
-plt.tight_layout()
-plt.savefig("confusion_matrix.png")
-plt.show()
-
-# === Misclassified Commands Logger ===
-misclassified = []
-for i in range(len(y_test)):
-    true_label = y_test[i]
-    predicted_label = y_pred[i]
-    if true_label != predicted_label:
-        misclassified.append({
-            "command": original_texts[i],
-            "true_label": reverse_label_map[true_label],
-            "predicted_label": reverse_label_map[predicted_label]
-        })
-
-# Save misclassified to CSV
-df_errors = pd.DataFrame(misclassified)
-df_errors.to_csv("model_assets/misclassified_commands.csv", index=False)
-print("❌ Misclassified commands saved to 'model_assets/misclassified_commands.csv'")
\ No newline at end of file
+NUM_CLASSES = len(label_mapping)
+MISCLASSIFIED_FIELDS = ("command", "true_label", "predicted_label", "confidence")
+
+
+def test_bucket(command):
+    normalized = " ".join(command.split())
+    return int(hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:8], 16) % 100
+
+
+def iter_dataset(path):
+    """(row number, command, label id) for every row with a known label."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for index, row in enumerate(csv.DictReader(f)):
+            label = label_mapping.get(row.get("label"))
+            if label is not None:
+                yield index, row.get("command") or "", label
+
+
+def stratified_test_rows(path, test_percent):
+    """
+    Row numbers of the stratified split the script has always used. Needs
+    every label in memory (one byte per row), unlike the hash split.
+    """
+    rows = np.fromiter((index for index, _, _ in iter_dataset(path)), dtype=np.int64)
+    labels = np.fromiter((label for _, _, label in iter_dataset(path)), dtype=np.int8)
+    _, test_idx = train_test_split(np.arange(len(labels)), test_size=test_percent / 100,
+                                   stratify=labels, random_state=42)
+    return set(rows[test_idx].tolist())
+
+
+def iter_test_set(path, split, test_percent, stratified_rows=None):
+    """(command, label id) pairs of the test split, in dataset order."""
+    for index, command, label in iter_dataset(path):
+        if split == "hash":
+            if test_bucket(command) < test_percent:
+                yield command, label
+        elif index in stratified_rows:
+            yield command, label
+
+
+def iter_chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def scan_test_set(rows, sample_size, seed):
+    """
+    One pass without inference: the dataset hash of the test commands (the
+    prediction cache key), the row count, and a per-class reservoir sample
+    for latency timing.
+    """
+    digest = hashlib.sha256()
+    rng = random.Random(seed)
+    samples = {label: [] for label in reverse_label_map}
+    seen = dict.fromkeys(reverse_label_map, 0)
+    count = 0
+    for command, label in rows:
+        digest.update(command.encode("utf-8"))
+        digest.update(b"\0")
+        count += 1
+        seen[label] += 1
+        if len(samples[label]) < sample_size:
+            samples[label].append(command)
+        else:
+            slot = rng.randrange(seen[label])
+            if slot < sample_size:
+                samples[label][slot] = command
+    return digest.hexdigest(), count, samples
+
+
+class Model:
+    """The tokenizer and model, loaded on first use so cache hits never load them."""
+
+    def __init__(self, model_file, tokenizer_file, max_len):
+        self.model_file = model_file
+        self.tokenizer_file = tokenizer_file
+        self.max_len = max_len
+        self.model = None
+
+    def load(self):
+        if self.model is None:
+            with open(self.tokenizer_file, "r") as f:
+                self.tokenizer = tokenizer_from_json(f.read())
+            self.model = load_model(self.model_file)
+        return self
+
+    def encode(self, commands):
+        return pad_sequences(self.tokenizer.texts_to_sequences(commands), maxlen=self.max_len)
+
+    def predict(self, X):
+        return np.asarray(self.model.predict_on_batch(X))
+
+
+def measure_latency(model, samples):
+    """Per-class single-command latency (tokenize + pad + predict), in milliseconds."""
+    model.load()
+    warmup = next((commands[0] for commands in samples.values() if commands), None)
+    if warmup is not None:
+        model.predict(model.encode([warmup]))
+    latency = {}
+    for label, commands in samples.items():
+        timings = []
+        for command in commands:
+            started = time.perf_counter()
+            model.predict(model.encode([command]))
+            timings.append((time.perf_counter() - started) * 1000)
+        if timings:
+            p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+            latency[reverse_label_map[label]] = {
+                "samples": len(timings), "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3),
+            }
+    return latency
+
+
+def class_metrics(cm):
+    report = {}
+    for index, label in reverse_label_map.items():
+        tp = int(cm[index, index])
+        predicted, actual = int(cm[:, index].sum()), int(cm[index, :].sum())
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / actual if actual else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        report[label] = {"precision": precision, "recall": recall, "f1": f1, "support": actual}
+    return report
+
+
+def plot_confusion_matrix(cm, path):
+    labels = list(label_mapping)
+    normalized = cm / np.maximum(cm.sum(axis=1, keepdims=True), 1)
+    plt.figure(figsize=(12, 5))
+    plt.subplot(1, 2, 1)
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', xticklabels=labels, yticklabels=labels)
+    plt.title("Confusion Matrix")
+    plt.xlabel("Predicted")
+    plt.ylabel("Actual")
+    plt.subplot(1, 2, 2)
+    sns.heatmap(normalized, annot=True, fmt='.2f', cmap='Blues', xticklabels=labels, yticklabels=labels)
+    plt.title("Confusion Matrix (recall-normalized)")
+    plt.xlabel("Predicted")
+    plt.ylabel("Actual")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the LSTM model on a held-out split.")
+    parser.add_argument("--output-dir", default="model_assets",
+                        help="Where to write the confusion matrix, report and misclassified commands.")
+    parser.add_argument("--data-file", default=DATA_FILE)
+    parser.add_argument("--model-file", default=MODEL_FILE)
+    parser.add_argument("--tokenizer-file", default=TOKENIZER_FILE)
+    parser.add_argument("--split", choices=("hash", "stratified"), default="hash",
+                        help="hash: streamed, by a hash of each command; stratified: the "
+                             "previous train_test_split (keeps every label in memory).")
+    parser.add_argument("--test-percent", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--latency-sample", type=int, default=100,
+                        help="Commands per class timed one at a time (0 to skip).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", default=prediction_cache.DEFAULT_CACHE_DIR,
+                        help="Shared LSTM prediction cache; a hit skips inference entirely.")
+    parser.add_argument("--no-cache", action="store_true", help="Always run the LSTM.")
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    confusion_matrix_file = os.path.join(args.output_dir, "confusion_matrix.png")
+    misclassified_file = os.path.join(args.output_dir, "misclassified_commands.csv")
+    report_file = os.path.join(args.output_dir, "evaluation_report.json")
+
+    stratified_rows = (stratified_test_rows(args.data_file, args.test_percent)
+                       if args.split == "stratified" else None)
+
+    def test_set():
+        return iter_test_set(args.data_file, args.split, args.test_percent, stratified_rows)
+
+    dataset, rows, samples = scan_test_set(test_set(), args.latency_sample, args.seed)
+    print(f"🔢 {rows} test commands ({args.split} split, {args.test_percent}%)")
+    if not rows:
+        raise SystemExit("❌ Empty test set")
+
+    model = Model(args.model_file, args.tokenizer_file, MAX_SEQUENCE_LENGTH)
+    cache = prediction_cache.PredictionCache(args.cache_dir)
+    bundle = prediction_cache.bundle_hash(args.model_file, args.tokenizer_file, MAX_SEQUENCE_LENGTH)
+    cached = None if args.no_cache else cache.load(bundle, dataset, rows=rows)
+    if cached is not None:
+        print("♻️ Reusing cached predictions; timings are from the run that made them")
+        timing = cache.meta(bundle, dataset).get("timing", {})
+        predictions = cached
+    else:
+        model.load()
+        predictions = cache.create(bundle, dataset, (rows, NUM_CLASSES)) if not args.no_cache else None
+        timing = {"tokenize_seconds": 0.0, "predict_seconds": 0.0, "class_seconds": [0.0] * NUM_CLASSES}
+
+    cm = np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.int64)
+    misclassified_count = 0
+    started = time.perf_counter()
+    offset = 0
+    with open(misclassified_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(MISCLASSIFIED_FIELDS)
+        for chunk in iter_chunks(test_set(), args.chunk_size):
+            commands = [command for command, _ in chunk]
+            y_true = np.fromiter((label for _, label in chunk), dtype=np.int64, count=len(chunk))
+            if cached is not None:
+                probs = np.asarray(cached[offset:offset + len(chunk)])
+            else:
+                t0 = time.perf_counter()
+                X = model.encode(commands)
+                t1 = time.perf_counter()
+                probs = model.predict(X)
+                t2 = time.perf_counter()
+                timing["tokenize_seconds"] += t1 - t0
+                timing["predict_seconds"] += t2 - t1
+                # Each class is charged its share of the chunk's time
+                shares = np.bincount(y_true, minlength=NUM_CLASSES) / len(chunk)
+                for label in range(NUM_CLASSES):
+                    timing["class_seconds"][label] += (t2 - t0) * shares[label]
+                if predictions is not None:
+                    predictions[offset:offset + len(chunk)] = probs
+            print(f"✅ Processed rows {offset + 1} to {offset + len(chunk)}/{rows}", flush=True)
+            offset += len(chunk)
+
+            y_pred = probs.argmax(axis=1)
+            cm += np.bincount(y_true * NUM_CLASSES + y_pred, minlength=NUM_CLASSES ** 2).reshape(NUM_CLASSES, NUM_CLASSES)
+            for i in np.flatnonzero(y_pred != y_true):
+                writer.writerow((commands[i], reverse_label_map[y_true[i]],
+                                 reverse_label_map[y_pred[i]], f"{probs[i, y_pred[i]]:.4f}"))
+                misclassified_count += 1
+    elapsed = time.perf_counter() - started
+
+    if cached is None:
+        timing["latency"] = measure_latency(model, samples) if args.latency_sample else {}
+        if predictions is not None:
+            cache.commit(bundle, dataset, predictions, model_file=args.model_file,
+                         max_len=MAX_SEQUENCE_LENGTH, timing=timing)
+
+    per_class = class_metrics(cm)
+    inference_seconds = timing.get("tokenize_seconds", 0.0) + timing.get("predict_seconds", 0.0)
+    for label, name in reverse_label_map.items():
+        class_seconds = timing.get("class_seconds", [0.0] * NUM_CLASSES)[label]
+        per_class[name]["throughput_per_s"] = (per_class[name]["support"] / class_seconds
+                                               if class_seconds else None)
+        per_class[name]["latency"] = timing.get("latency", {}).get(name)
+    report = {
+        "split": args.split,
+        "test_percent": args.test_percent,
+        "rows": rows,
+        "accuracy": float(np.trace(cm) / cm.sum()),
+        "confusion_matrix": cm.tolist(),
+        "per_class": per_class,
+        "misclassified": misclassified_count,
+        "cached_predictions": cached is not None,
+        "throughput_per_s": rows / inference_seconds if inference_seconds else None,
+        "tokenize_seconds": timing.get("tokenize_seconds"),
+        "predict_seconds": timing.get("predict_seconds"),
+        "wall_seconds": round(elapsed, 3),
+    }
+
+    # === Evaluation ===
+    print("📊 Classification Report:")
+    print(f"{'':>12} {'precision':>9} {'recall':>9} {'f1':>9} {'support':>9} {'cmd/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, metrics in per_class.items():
+        latency = metrics["latency"] or {}
+        throughput = metrics["throughput_per_s"]
+        print(f"{name:>12} {metrics['precision']:9.3f} {metrics['recall']:9.3f} {metrics['f1']:9.3f} "
+              f"{metrics['support']:9d} {throughput or 0:9.0f} "
+              f"{latency.get('p50_ms', float('nan')):9.2f} {latency.get('p95_ms', float('nan')):9.2f}")
+    print(f"Accuracy: {report['accuracy']:.4f} on {rows} commands; "
+          f"{report['throughput_per_s'] or 0:.0f} commands/s")
+
+    # === Confusion Matrix ===
+    plot_confusion_matrix(cm, confusion_matrix_file)
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"❌ {misclassified_count} misclassified commands saved to '{misclassified_file}'")
+    print(f"📄 Report saved to '{report_file}', confusion matrix to '{confusion_matrix_file}'")
+
+
+if __name__ == "__main__":
+    main()
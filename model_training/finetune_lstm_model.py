@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Warm-start fine-tuning of the current LSTM on newly labeled anomalies.
+
+Instead of refitting the tokenizer and training from scratch, this extends
+the existing tokenizer with the new rows' unseen words (existing token IDs
+stay as they are), grows the model's embedding matrix to match (new rows
+start at the mean embedding plus a little noise), and trains a few epochs at
+a low learning rate on the new rows mixed with a replay sample of the
+existing dataset, so the model doesn't forget what it knew.
+
+A held-out slice of attack_data.csv (chosen by a hash of each command, so
+it is the same on every run and never used for training) is scored before
+and after; the report shows the accuracy drift, per class, and how many
+held-out predictions changed. With --max-drift, a larger accuracy drop fails
+the run without writing anything.
+
+Only labels newer than the last fine-tune are used: the report records the
+latest `date_labeled` it trained on, and the next run starts after it
+(--since overrides, --since all uses the whole journal). With no new labels
+the script exits with NO_NEW_LABELS and writes nothing.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.preprocessing.sequence import pad_sequences
+from tensorflow.keras.preprocessing.text import text_to_word_sequence, tokenizer_from_json
+
+import prediction_cache
+
+DATASET_DIR = "model_assets"
+DATA_FILE = os.path.join(DATASET_DIR, "attack_data.csv")
+LABELED_DATA_FILE = os.path.join(DATASET_DIR, "labeled_anomalies.csv")
+MODEL_FILE = os.path.join(DATASET_DIR, "lstm_attack_model.h5")
+TOKENIZER_FILE = os.path.join(DATASET_DIR, "tokenizer.json")
+REPORT_FILE = os.path.join(DATASET_DIR, "finetune_report.json")
+MAX_SEQUENCE_LENGTH = 30
+# Exit status when there is nothing to fine-tune on, distinct from a failure.
+NO_NEW_LABELS = 3
+
+label_mapping = {"BENIGN": 0, "SUSPICIOUS": 1, "MALICIOUS": 2}
+reverse_label_map = {v: k for k, v in label_mapping.items()}
+
+class_weight = {
+    0: 2.5,  # BENIGN
+    1: 2.0,  # SUSPICIOUS
+    2: 1.0   # MALICIOUS
+}
+
+
+def holdout_bucket(command):
+    normalized = " ".join(command.split())
+    return int(hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:8], 16) % 100
+
+
+def last_watermark(report_file):
+    """The latest `date_labeled` the previous fine-tune used, if any."""
+    try:
+        with open(report_file, "r") as f:
+            return json.load(f).get("labels_through")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def read_new_rows(path, since=None):
+    """
+    Latest label per command from the label journal, for commands labeled
+    after `since` (a `date_labeled` string; None means all). Also returns
+    the latest date seen.
+    """
+    latest = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            command, label = row.get("command"), row.get("label")
+            if command and label in label_mapping:
+                latest[command] = (label, row.get("date_labeled") or "")
+    rows = {command: label for command, (label, date_labeled) in latest.items()
+            if since is None or date_labeled > since}
+    through = max((latest[command][1] for command in rows), default=since)
+    return rows, through
+
+
+def split_dataset(path, exclude, holdout_percent, replay_size, seed):
+    """
+    One pass over the dataset: the held-out slice, and a reservoir sample of
+    `replay_size` other rows. Commands in `exclude` (the new rows) are skipped.
+    """
+    rng = random.Random(seed)
+    holdout, replay, seen = [], [], 0
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            command, label = row.get("command") or "", row.get("label")
+            if label not in label_mapping or command in exclude:
+                continue
+            if holdout_bucket(command) < holdout_percent:
+                holdout.append((command, label))
+                continue
+            seen += 1
+            if len(replay) < replay_size:
+                replay.append((command, label))
+            else:
+                slot = rng.randrange(seen)
+                if slot < replay_size:
+                    replay[slot] = (command, label)
+    return holdout, replay
+
+
+def extend_tokenizer(tokenizer, commands):
+    """
+    Adds the commands' unseen words at the end of the index, so every
+    existing ID keeps its meaning. Returns the new words.
+    """
+    added = []
+    for command in commands:
+        words = text_to_word_sequence(command, filters=tokenizer.filters,
+                                      lower=tokenizer.lower, split=tokenizer.split)
+        for word in words:
+            tokenizer.word_counts[word] = tokenizer.word_counts.get(word, 0) + 1
+            if word not in tokenizer.word_index:
+                index = len(tokenizer.word_index) + 1
+                tokenizer.word_index[word] = index
+                tokenizer.index_word[index] = word
+                added.append(word)
+        for word in set(words):
+            tokenizer.word_docs[word] = tokenizer.word_docs.get(word, 0) + 1
+            tokenizer.index_docs[tokenizer.word_index[word]] = tokenizer.word_docs[word]
+        tokenizer.document_count += 1
+    return added
+
+
+def grow_embedding(model, vocab_size, seed):
+    """A copy of `model` whose Embedding takes `vocab_size` ids; old rows keep their vectors."""
+    config = model.get_config()
+    embedding_config = next(layer for layer in config["layers"] if layer["class_name"] == "Embedding")
+    old_size = embedding_config["config"]["input_dim"]
+    if vocab_size <= old_size:
+        return model, old_size
+
+    embedding_config["config"]["input_dim"] = vocab_size
+    grown = tf.keras.Sequential.from_config(config)
+    grown.build(model.input_shape)
+    rng = np.random.default_rng(seed)
+    for old_layer, new_layer in zip(model.layers, grown.layers):
+        weights = old_layer.get_weights()
+        if isinstance(old_layer, tf.keras.layers.Embedding):
+            matrix = weights[0]
+            extra = matrix.mean(axis=0) + rng.normal(0, matrix.std() * 0.1,
+                                                     (vocab_size - old_size, matrix.shape[1]))
+            weights = [np.vstack([matrix, extra.astype(matrix.dtype)])]
+        new_layer.set_weights(weights)
+    return grown, old_size
+
+
+def encode(tokenizer, rows, max_len):
+    X = pad_sequences(tokenizer.texts_to_sequences([command for command, _ in rows]), maxlen=max_len)
+    y = np.array([label_mapping[label] for _, label in rows])
+    return X, y
+
+
+def accuracy_report(y_true, y_pred):
+    report = {"accuracy": float(np.mean(y_true == y_pred)) if len(y_true) else None, "per_class": {}}
+    for index, label in reverse_label_map.items():
+        mask = y_true == index
+        if mask.any():
+            report["per_class"][label] = float(np.mean(y_pred[mask] == index))
+    return report
+
+
+def drift(before, after):
+    if before["accuracy"] is None:
+        return None
+    return {
+        "accuracy": after["accuracy"] - before["accuracy"],
+        "per_class": {label: after["per_class"][label] - before["per_class"][label]
+                      for label in before["per_class"]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune the current LSTM on newly labeled commands.")
+    parser.add_argument("--new-data", default=LABELED_DATA_FILE,
+                        help="CSV of newly labeled commands (command, label[, date_labeled]).")
+    parser.add_argument("--data-file", default=DATA_FILE, help="Existing training data to replay from.")
+    parser.add_argument("--model-file", default=MODEL_FILE)
+    parser.add_argument("--tokenizer-file", default=TOKENIZER_FILE)
+    parser.add_argument("--output-dir", default=DATASET_DIR,
+                        help="Where to write the model, tokenizer and report.")
+    parser.add_argument("--replay", type=int, default=0,
+                        help="Old rows mixed in (default: 10 per new row, at least 500).")
+    parser.add_argument("--holdout", type=int, default=10, help="Percent of the dataset held out.")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--learning-rate", type=float, default=1e-4)
+    parser.add_argument("--max-drift", type=float, default=None,
+                        help="Fail, writing nothing, if held-out accuracy drops by more than this (e.g. 0.02).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report-file", default=REPORT_FILE,
+                        help="Previous report, whose labels_through is where this run starts.")
+    parser.add_argument("--since", default=None,
+                        help="Use labels dated after this (e.g. '2025-04-18 19:30:34'), or 'all'.")
+    parser.add_argument("--cache-dir", default=prediction_cache.DEFAULT_CACHE_DIR,
+                        help="Shared prediction cache for the current model's scores.")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    started = time.perf_counter()
+    tf.random.set_seed(args.seed)
+
+    since = args.since if args.since is not None else last_watermark(args.report_file)
+    new_rows, labels_through = read_new_rows(args.new_data, None if since == "all" else since)
+    if not new_rows:
+        print(f"ℹ️ No commands labeled in '{args.new_data}' since {since or 'ever'}; "
+              f"nothing to fine-tune, so no model is written (exit status {NO_NEW_LABELS}).")
+        return NO_NEW_LABELS
+    replay_size = args.replay or max(500, 10 * len(new_rows))
+    holdout, replay = split_dataset(args.data_file, new_rows, args.holdout, replay_size, args.seed)
+    print(f"🔢 {len(new_rows)} new rows, {len(replay)} replayed, {len(holdout)} held out")
+
+    with open(args.tokenizer_file, "r") as f:
+        tokenizer = tokenizer_from_json(f.read())
+    model = tf.keras.models.load_model(args.model_file)
+    max_len = model.input_shape[1] or MAX_SEQUENCE_LENGTH
+
+    # Score the current model with the current tokenizer before touching either
+    new_list = list(new_rows.items())
+    y_hold = np.array([label_mapping[label] for _, label in holdout])
+    y_new = np.array([label_mapping[label] for _, label in new_list])
+
+    def predict_current(commands):
+        X = pad_sequences(tokenizer.texts_to_sequences(commands), maxlen=max_len)
+        return model.predict(X, verbose=0)
+
+    def score_current(rows):
+        if not rows:
+            return np.array([], dtype=int)
+        predictions = prediction_cache.cached_predictions(
+            [command for command, _ in rows], args.model_file, args.tokenizer_file, max_len,
+            predict_current, cache_dir=args.cache_dir, enabled=not args.no_cache,
+        )
+        return np.argmax(predictions, axis=1)
+
+    hold_before = score_current(holdout)
+    new_before = score_current(new_list)
+
+    added = extend_tokenizer(tokenizer, new_rows)
+    vocab_size = len(tokenizer.word_index) + 1
+    if tokenizer.num_words:
+        # Ids past num_words are mapped to OOV, so the embedding needn't grow
+        vocab_size = min(vocab_size, tokenizer.num_words)
+    model, old_vocab_size = grow_embedding(model, vocab_size, args.seed)
+    print(f"🔤 {len(added)} new words; embedding {old_vocab_size} → {max(vocab_size, old_vocab_size)} rows")
+
+    X_train, y_train = encode(tokenizer, new_list + replay, max_len)
+    model.compile(loss='sparse_categorical_crossentropy',
+                  optimizer=tf.keras.optimizers.Adam(learning_rate=args.learning_rate),
+                  metrics=['accuracy'])
+    model.fit(X_train, y_train, epochs=args.epochs, batch_size=args.batch_size,
+              class_weight=class_weight, shuffle=True, verbose=2)
+
+    X_hold, _ = encode(tokenizer, holdout, max_len)
+    X_new, _ = encode(tokenizer, new_list, max_len)
+    hold_after = np.argmax(model.predict(X_hold, verbose=0), axis=1) if holdout else np.array([], dtype=int)
+    new_after = np.argmax(model.predict(X_new, verbose=0), axis=1)
+
+    before, after = accuracy_report(y_hold, hold_before), accuracy_report(y_hold, hold_after)
+    report = {
+        "new_rows": len(new_rows),
+        "labels_since": None if since == "all" else since,
+        "labels_through": labels_through,
+        "replay_rows": len(replay),
+        "holdout_rows": len(holdout),
+        "new_words": added,
+        "vocab_size": {"before": old_vocab_size, "after": max(vocab_size, old_vocab_size)},
+        "holdout": {"before": before, "after": after, "drift": drift(before, after),
+                    "changed_predictions": int(np.sum(hold_before != hold_after))},
+        "new_data": {"before": accuracy_report(y_new, new_before),
+                     "after": accuracy_report(y_new, new_after)},
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    print(json.dumps(report["holdout"], indent=2))
+    print(f"🎯 New rows: {report['new_data']['before']['accuracy']:.2f} → "
+          f"{report['new_data']['after']['accuracy']:.2f} accuracy")
+
+    holdout_drift = report["holdout"]["drift"]
+    if args.max_drift is not None and holdout_drift and holdout_drift["accuracy"] < -args.max_drift:
+        print(f"❌ Held-out accuracy dropped by {-holdout_drift['accuracy']:.3f} "
+              f"(more than {args.max_drift}); not saving the fine-tuned model.")
+        return 1
+
+    model.save(os.path.join(args.output_dir, "lstm_attack_model.h5"))
+    with open(os.path.join(args.output_dir, "tokenizer.json"), "w") as f:
+        f.write(tokenizer.to_json())
+    with open(os.path.join(args.output_dir, "finetune_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Fine-tuned model saved to '{args.output_dir}' in {report['seconds']:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Streaming input pipeline for LSTM training on command datasets too large to
+hold in memory.
+
+Input is any number of shards: CSV files with `command` and `label` columns
+or NDJSON files with those keys, optionally gzipped. Three steps, each with
+memory bounded by the vocabulary or a chunk, never by the dataset:
+
+1. `build_tokenizer` counts words in every shard in parallel and writes a
+   Keras-compatible tokenizer JSON (same filters, lowercasing and OOV handling
+   as `Tokenizer.fit_on_texts`; ties in word frequency are broken
+   alphabetically so the result doesn't depend on shard order).
+2. `encode_shards` tokenizes and pads every shard in parallel into a cache
+   of fixed-length int32 records: MAX_SEQUENCE_LENGTH token ids, the label,
+   and a hash bucket of the normalized command that assigns it to a fold, so
+   duplicates of a command never straddle train and validation. Cache files
+   are keyed by the shard's path, size and mtime plus the tokenizer, so
+   unchanged shards are never encoded twice; the least recently used entries
+   beyond MAX_CACHE_ENTRIES are removed.
+3. `record_dataset` reads the cache with tf.data: interleaved shard reads,
+   parallel decoding, a bounded shuffle buffer, batching and prefetching.
+"""
+import array
+import argparse
+import collections
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+
+import tensorflow as tf
+
+LABELS = {"BENIGN": 0, "SUSPICIOUS": 1, "MALICIOUS": 2}
+MAX_SEQUENCE_LENGTH = 30
+OOV_TOKEN = "<UNK>"
+# Keras' Tokenizer defaults
+TOKEN_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+FILTER_TABLE = str.maketrans({c: " " for c in TOKEN_FILTERS})
+CACHE_FORMAT = 1
+WRITE_CHUNK_ROWS = 65536
+DEFAULT_CACHE_DIR = os.path.join("model_assets", ".input_cache")
+# Least recently used shard entries beyond this many (or beyond the current
+# run's, if more) are removed after encoding.
+MAX_CACHE_ENTRIES = 256
+# Only files named like encode_shard's output are ever pruned.
+CACHE_FILE_PATTERN = re.compile(r"([0-9a-f]{20})\.(?:rec|json|rec\.tmp\.\d+)")
+
+
+def expand_inputs(patterns):
+    """Files matching the glob patterns (directories mean every shard in them), sorted."""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*")
+        files.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    if not files:
+        raise FileNotFoundError(f"No input files match {', '.join(patterns)}")
+    return sorted(files)
+
+
+def open_text(path):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def iter_rows(path):
+    """(command, label) pairs from a CSV or NDJSON shard, read one line at a time."""
+    name = path[:-3] if path.endswith(".gz") else path
+    with open_text(path) as f:
+        if name.endswith((".ndjson", ".jsonl", ".json")):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(row, dict):
+                    yield str(row.get("command", "")), row.get("label")
+        else:
+            for row in csv.DictReader(f):
+                yield row.get("command") or "", row.get("label")
+
+
+def tokenize(text):
+    """Keras' text_to_word_sequence with the default filters."""
+    return text.lower().translate(FILTER_TABLE).split()
+
+
+def fold_bucket(command):
+    normalized = " ".join(command.split())
+    return int(hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:8], 16) & 0x7FFFFFFF
+
+
+def count_shard(path):
+    word_counts, word_docs, documents = collections.Counter(), collections.Counter(), 0
+    for command, label in iter_rows(path):
+        if label not in LABELS:
+            continue
+        words = tokenize(command)
+        word_counts.update(words)
+        word_docs.update(set(words))
+        documents += 1
+    return word_counts, word_docs, documents
+
+
+def tokenizer_json(word_counts, word_docs, documents, num_words=None):
+    """The JSON `Tokenizer.to_json()` would produce after fitting on the same texts."""
+    vocabulary = sorted(word_counts, key=lambda word: (-word_counts[word], word))
+    word_index = {word: index for index, word in enumerate([OOV_TOKEN] + vocabulary, 1)}
+    index_word = {index: word for word, index in word_index.items()}
+    index_docs = {word_index[word]: count for word, count in word_docs.items()}
+    return json.dumps({
+        "class_name": "Tokenizer",
+        "config": {
+            "num_words": num_words,
+            "filters": TOKEN_FILTERS,
+            "lower": True,
+            "split": " ",
+            "char_level": False,
+            "oov_token": OOV_TOKEN,
+            "document_count": documents,
+            "word_counts": json.dumps({word: word_counts[word] for word in vocabulary}),
+            "word_docs": json.dumps(dict(word_docs)),
+            "index_docs": json.dumps(index_docs),
+            "index_word": json.dumps(index_word),
+            "word_index": json.dumps(word_index),
+        },
+    })
+
+
+def build_tokenizer(files, tokenizer_file, processes=None, num_words=None):
+    """Counts words across all shards in parallel and writes the tokenizer JSON; returns it."""
+    word_counts, word_docs, documents = collections.Counter(), collections.Counter(), 0
+    with multiprocessing.Pool(processes) as pool:
+        for counts, docs, n in pool.imap_unordered(count_shard, files):
+            word_counts.update(counts)
+            word_docs.update(docs)
+            documents += n
+    text = tokenizer_json(word_counts, word_docs, documents, num_words)
+    tmp_path = f"{tokenizer_file}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, tokenizer_file)
+    print(f"🔤 Tokenizer: {len(word_counts)} words from {documents} commands in {len(files)} shards")
+    return text
+
+
+# Per-worker encoding state, set once by _init_encoder instead of pickled per shard.
+_encoder = {}
+
+
+def _init_encoder(tokenizer_text, max_len):
+    config = json.loads(tokenizer_text)["config"]
+    _encoder["word_index"] = json.loads(config["word_index"])
+    _encoder["num_words"] = config["num_words"]
+    _encoder["max_len"] = max_len
+
+
+def encode_command(command, word_index, num_words, max_len):
+    """Token ids padded and truncated at the front, like pad_sequences' defaults."""
+    oov = word_index[OOV_TOKEN]
+    ids = []
+    for word in tokenize(command):
+        index = word_index.get(word, oov)
+        if num_words and index >= num_words:
+            index = oov
+        ids.append(index)
+    ids = ids[-max_len:]
+    return [0] * (max_len - len(ids)) + ids
+
+
+def shard_key(path, tokenizer_text, max_len):
+    stat = os.stat(path)
+    vocab = hashlib.sha1(tokenizer_text.encode("utf-8")).hexdigest()
+    ident = f"{CACHE_FORMAT}|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{vocab}|{max_len}"
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()[:20]
+
+
+def encode_shard(job):
+    path, cache_dir, key = job
+    records_file = os.path.join(cache_dir, f"{key}.rec")
+    meta_file = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(records_file) and os.path.exists(meta_file):
+        with open(meta_file) as f:
+            return json.load(f)
+
+    word_index, num_words, max_len = _encoder["word_index"], _encoder["num_words"], _encoder["max_len"]
+    labels = collections.Counter()
+    rows = skipped = 0
+    chunk = array.array("i")
+    tmp_path = f"{records_file}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as out:
+        for command, label in iter_rows(path):
+            label_id = LABELS.get(label)
+            if label_id is None:
+                skipped += 1
+                continue
+            chunk.extend(encode_command(command, word_index, num_words, max_len))
+            chunk.append(label_id)
+            chunk.append(fold_bucket(command))
+            labels[label] += 1
+            rows += 1
+            if rows % WRITE_CHUNK_ROWS == 0:
+                chunk.tofile(out)
+                chunk = array.array("i")
+        chunk.tofile(out)
+    os.replace(tmp_path, records_file)
+
+    meta = {"source": path, "records_file": records_file, "rows": rows,
+            "skipped": skipped, "labels": dict(labels), "max_len": max_len}
+    with open(meta_file, "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def cache_entries(cache_dir):
+    """{key: [paths]} of the record cache's files in `cache_dir`, ignoring anything else there."""
+    entries = collections.defaultdict(list)
+    for name in os.listdir(cache_dir):
+        match = CACHE_FILE_PATTERN.fullmatch(name)
+        path = os.path.join(cache_dir, name)
+        if match and os.path.isfile(path):
+            entries[match.group(1)].append(path)
+    return entries
+
+
+def prune_cache(cache_dir, keep_keys=(), max_entries=MAX_CACHE_ENTRIES):
+    """Removes the least recently used entries beyond `max_entries`, never those in `keep_keys`."""
+    entries = cache_entries(cache_dir)
+
+    def last_used(key):
+        times = []
+        for path in entries[key]:
+            try:
+                times.append(os.path.getmtime(path))
+            except FileNotFoundError:
+                pass
+        return max(times, default=0)
+
+    others = sorted((key for key in entries if key not in keep_keys), key=last_used, reverse=True)
+    for key in others[max(max_entries - len(keep_keys), 0):]:
+        for path in entries[key]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def encode_shards(files, tokenizer_text, cache_dir=DEFAULT_CACHE_DIR,
+                  max_len=MAX_SEQUENCE_LENGTH, processes=None, max_entries=MAX_CACHE_ENTRIES):
+    """Encodes every shard not already cached; returns the shards' metadata in input order."""
+    if sys.byteorder != "little" or array.array("i").itemsize != 4:
+        raise RuntimeError("The record cache holds little-endian int32; decode_raw would misread it here")
+    os.makedirs(cache_dir, exist_ok=True)
+    jobs = [(path, cache_dir, shard_key(path, tokenizer_text, max_len)) for path in files]
+    with multiprocessing.Pool(processes, initializer=_init_encoder,
+                              initargs=(tokenizer_text, max_len)) as pool:
+        shards = pool.map(encode_shard, jobs, chunksize=1)
+    # Mark this run's entries as just used, so pruning takes the oldest others.
+    for shard in shards:
+        for path in (shard["records_file"], f"{shard['records_file'][:-4]}.json"):
+            os.utime(path)
+    prune_cache(cache_dir, {key for _, _, key in jobs}, max_entries)
+    rows = sum(shard["rows"] for shard in shards)
+    print(f"📦 {rows} commands encoded in {len(shards)} cached shards under '{cache_dir}'")
+    return shards
+
+
+def record_dataset(record_files, max_len=MAX_SEQUENCE_LENGTH, batch_size=64, folds=None,
+                   fold=None, training=True, shuffle_buffer=65536):
+    """
+    (x, y) batches from the record cache. With `folds`, fold `fold` (1-based)
+    is the validation part: training=True yields every other bucket,
+    training=False only that one.
+    """
+    autotune = tf.data.AUTOTUNE
+    record_bytes = (max_len + 2) * 4
+    files = tf.data.Dataset.from_tensor_slices(list(record_files))
+    if training:
+        files = files.shuffle(len(record_files), reshuffle_each_iteration=True)
+    dataset = files.interleave(
+        lambda path: tf.data.FixedLengthRecordDataset(path, record_bytes, buffer_size=1 << 20),
+        cycle_length=min(len(record_files), 8),
+        num_parallel_calls=autotune,
+        deterministic=not training,
+    )
+
+    def decode(record):
+        values = tf.io.decode_raw(record, tf.int32)
+        return values[:max_len], values[max_len], values[max_len + 1]
+
+    dataset = dataset.map(decode, num_parallel_calls=autotune)
+    if folds:
+        validation_bucket = fold - 1
+        if training:
+            dataset = dataset.filter(lambda x, y, bucket: tf.not_equal(bucket % folds, validation_bucket))
+        else:
+            dataset = dataset.filter(lambda x, y, bucket: tf.equal(bucket % folds, validation_bucket))
+    dataset = dataset.map(lambda x, y, bucket: (x, y), num_parallel_calls=autotune)
+    if training:
+        dataset = dataset.shuffle(shuffle_buffer, reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).prefetch(autotune)
+
+
+class RecordSource:
+    """Train/validation datasets per fold from the record cache; picklable for fold workers."""
+
+    def __init__(self, record_files, folds, max_len=MAX_SEQUENCE_LENGTH, batch_size=64,
+                 shuffle_buffer=65536):
+        self.record_files = list(record_files)
+        self.folds = folds
+        self.max_len = max_len
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+
+    def datasets(self, fold):
+        options = dict(max_len=self.max_len, batch_size=self.batch_size, folds=self.folds, fold=fold)
+        return (
+            record_dataset(self.record_files, training=True, shuffle_buffer=self.shuffle_buffer, **options),
+            record_dataset(self.record_files, training=False, **options),
+        )
+
+
+def prepare(patterns, tokenizer_file, cache_dir=DEFAULT_CACHE_DIR, max_len=MAX_SEQUENCE_LENGTH,
+            processes=None, num_words=None):
+    """Tokenizer plus encoded cache for the inputs; returns (tokenizer_text, shards)."""
+    files = expand_inputs(patterns)
+    tokenizer_text = build_tokenizer(files, tokenizer_file, processes, num_words)
+    shards = encode_shards(files, tokenizer_text, cache_dir, max_len, processes)
+    return tokenizer_text, shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the tokenizer and encoded record cache for training.")
+    parser.add_argument("inputs", nargs="+", help="CSV/NDJSON shards (globs or directories, .gz allowed).")
+    parser.add_argument("--tokenizer-file", default=os.path.join("model_assets", "tokenizer.json"))
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-len", type=int, default=MAX_SEQUENCE_LENGTH)
+    parser.add_argument("--max-words", type=int, default=None,
+                        help="Keep only the most frequent words (the rest map to the OOV token).")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    _, shards = prepare(args.inputs, args.tokenizer_file, args.cache_dir, args.max_len,
+                        args.processes, args.max_words)
+    labels = collections.Counter()
+    for shard in shards:
+        labels.update(shard["labels"])
+    print(f"🏷️ Labels: {dict(labels)}")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of LSTM predictions, shared by the scripts in
+model_training/.
+
+An entry is keyed by two hashes: the model bundle (the bytes of the model
+and tokenizer files, plus the sequence length used to pad) and the dataset
+(the exact commands predicted, in order). Anything that would change the
+predictions changes the key, so an entry never goes stale; it just stops
+being used. Predictions are stored as a .npy file and returned memory-mapped,
+so a hit costs neither inference nor a copy into memory.
+
+    predictions = prediction_cache.cached_predictions(
+        commands, MODEL_FILE, TOKENIZER_FILE, MAX_SEQUENCE_LENGTH, predict)
+
+`predict(commands)` is only called on a miss.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join("model_assets", ".prediction_cache")
+# Least recently used entries beyond this many are removed when storing.
+MAX_ENTRIES = 16
+
+
+def file_sha256(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest
+
+
+def bundle_hash(model_file, tokenizer_file, max_len):
+    digest = hashlib.sha256(f"max_len={max_len}\0".encode("utf-8"))
+    file_sha256(model_file, digest)
+    digest.update(b"\0")
+    file_sha256(tokenizer_file, digest)
+    return digest.hexdigest()
+
+
+def dataset_hash(commands):
+    digest = hashlib.sha256()
+    for command in commands:
+        digest.update(str(command).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def path(self, bundle, dataset):
+        return os.path.join(self.cache_dir, f"{bundle[:20]}-{dataset[:20]}.npy")
+
+    def load(self, bundle, dataset, rows=None):
+        path = self.path(bundle, dataset)
+        try:
+            predictions = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        if rows is not None and len(predictions) != rows:
+            return None
+        # Recently used entries survive pruning.
+        os.utime(path)
+        return predictions
+
+    def meta(self, bundle, dataset):
+        try:
+            with open(f"{self.path(bundle, dataset)[:-4]}.json") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def store(self, bundle, dataset, predictions, **meta):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(bundle, dataset)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(predictions))
+        return self._commit(bundle, dataset, tmp_path, meta)
+
+    def create(self, bundle, dataset, shape, dtype=np.float32):
+        """
+        A writable memmap for a new entry, for callers that predict in chunks;
+        `commit` it once it's filled. Until then it's invisible to readers.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.path(bundle, dataset)}.{os.getpid()}.tmp"
+        return np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+
+    def commit(self, bundle, dataset, predictions, **meta):
+        predictions.flush()
+        tmp_path = predictions.filename
+        del predictions
+        return self._commit(bundle, dataset, tmp_path, meta)
+
+    def _commit(self, bundle, dataset, tmp_path, meta):
+        path = self.path(bundle, dataset)
+        os.replace(tmp_path, path)
+        predictions = np.load(path, mmap_mode="r")
+        with open(f"{path[:-4]}.json", "w") as f:
+            json.dump({"bundle": bundle, "dataset": dataset, "rows": len(predictions),
+                       "created_at": time.time(), **meta}, f)
+        self.prune()
+        return predictions
+
+    def entries(self):
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith(".npy")]
+        except FileNotFoundError:
+            return []
+        paths = [os.path.join(self.cache_dir, name) for name in names]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def prune(self, keep=None):
+        keep = self.max_entries if keep is None else keep
+        for path in self.entries()[keep:]:
+            for stale in (path, f"{path[:-4]}.json"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+
+def cached_predictions(commands, model_file, tokenizer_file, max_len, predict,
+                       cache_dir=DEFAULT_CACHE_DIR, enabled=True):
+    """Predictions for `commands` from the cache, running `predict(commands)` only on a miss."""
+    if not enabled:
+        return predict(commands)
+    cache = PredictionCache(cache_dir)
+    bundle, dataset = bundle_hash(model_file, tokenizer_file, max_len), dataset_hash(commands)
+    predictions = cache.load(bundle, dataset, rows=len(commands))
+    if predictions is not None:
+        print(f"♻️ Reusing cached predictions for {len(commands)} commands ({os.path.basename(cache.path(bundle, dataset))})")
+        return predictions
+    predictions = predict(commands)
+    return cache.store(bundle, dataset, predictions, model_file=model_file, max_len=max_len)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the prediction cache.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    cache = PredictionCache(args.cache_dir)
+    if args.clear:
+        cache.prune(keep=0)
+    for path in cache.entries():
+        try:
+            with open(f"{path[:-4]}.json") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            meta = {}
+        print(f"{os.path.basename(path)}  {meta.get('rows', '?')} rows  "
+              f"{meta.get('model_file', '?')} (max_len {meta.get('max_len', '?')})")
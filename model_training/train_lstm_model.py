@@ -10,36 +10,28 @@ from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import confusion_matrix
 import seaborn as sns
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+import multiprocessing
+import concurrent.futures
+import tempfile
+import time
 import os
 import json
+import argparse
+
+import input_pipeline
 
 # Dataset paths
 DATASET_DIR = "model_assets"
 DATA_FILE = os.path.join(DATASET_DIR, "attack_data.csv")
-MODEL_FILE = os.path.join(DATASET_DIR, "lstm_attack_model.h5")
-TOKENIZER_FILE = os.path.join(DATASET_DIR, "tokenizer.json")
-
-# Load dataset
-df = pd.read_csv(DATA_FILE)
-print("Dataset sample:", df.head())
-
-# Tokenizer setup
-tokenizer = Tokenizer(oov_token="<UNK>")  # Handle unseen words
-tokenizer.fit_on_texts(df["command"])
-sequences = tokenizer.texts_to_sequences(df["command"])
-
-# Save tokenizer
-with open(TOKENIZER_FILE, "w") as f:
-    f.write(tokenizer.to_json())
 
 # Define sequence length
 MAX_SEQUENCE_LENGTH = 30
-X = pad_sequences(sequences, maxlen=MAX_SEQUENCE_LENGTH)
 
 # Label mapping
 label_mapping = {"BENIGN": 0, "SUSPICIOUS": 1, "MALICIOUS": 2}
-y = df["label"].map(label_mapping).values
 
 class_weight = {
     0: 2.5,  # BENIGN
@@ -47,19 +39,10 @@ class_weight = {
     2: 1.0   # MALICIOUS (was over-dominating)
 }
 
-# Cross-validation setup
-skf = StratifiedKFold(n_splits=3, shuffle=True, random_state=42)
-best_accuracy = 0
-best_model = None
-
-# Training
-for fold, (train_index, val_index) in enumerate(skf.split(X, y), 1):
-    print(f"Training fold {fold}/3...")
-    X_train, X_val = X[train_index], X[val_index]
-    y_train, y_val = y[train_index], y[val_index]
 
+def build_model(vocab_size):
     model = Sequential([
-        Embedding(input_dim=len(tokenizer.word_index) + 1, output_dim=32, input_length=MAX_SEQUENCE_LENGTH),
+        Embedding(input_dim=vocab_size, output_dim=32, input_length=MAX_SEQUENCE_LENGTH),
         LSTM(128, return_sequences=True),
         BatchNormalization(),
         Dropout(0.6),
@@ -71,49 +54,217 @@ for fold, (train_index, val_index) in enumerate(skf.split(X, y), 1):
     ])
 
     optimizer = tf.keras.optimizers.Adam(learning_rate=0.001)
-    lr_scheduler = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, verbose=1)
-
     model.compile(loss='sparse_categorical_crossentropy', optimizer=optimizer, metrics=['accuracy'])
+    return model
+
 
+def limit_threads(threads):
+    """Caps TensorFlow's thread pools; must run before the process's first op."""
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(max(1, threads // 2))
+
+
+class ArraySource:
+    """
+    StratifiedKFold splits of padded sequences held in memory-mapped .npy
+    files, so fold workers share them instead of each getting a pickled copy.
+    """
+
+    def __init__(self, arrays_dir, splits, batch_size=64):
+        self.arrays_dir = arrays_dir
+        self.splits = splits
+        self.batch_size = batch_size
+
+    def datasets(self, fold):
+        X = np.load(os.path.join(self.arrays_dir, "X.npy"), mmap_mode="r")
+        y = np.load(os.path.join(self.arrays_dir, "y.npy"), mmap_mode="r")
+        train_index, val_index = self.splits[fold - 1]
+        train = tf.data.Dataset.from_tensor_slices((X[train_index], y[train_index]))
+        val = tf.data.Dataset.from_tensor_slices((X[val_index], y[val_index]))
+        return (
+            train.shuffle(len(train_index), reshuffle_each_iteration=True).batch(self.batch_size),
+            val.batch(self.batch_size),
+        )
+
+
+def train_fold(fold, folds, source, vocab_size, model_file, verbose=1):
+    """
+    Trains one fold and saves its model to `model_file`. Runs in the main
+    process or a worker; `source` (ArraySource or input_pipeline.RecordSource)
+    provides the fold's training and validation datasets.
+    """
+    print(f"Training fold {fold}/{folds}...", flush=True)
+    started = time.perf_counter()
+    train_data, val_data = source.datasets(fold)
+
+    model = build_model(vocab_size)
+    lr_scheduler = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, verbose=1)
     early_stopping = EarlyStopping(monitor='val_loss', patience=2, restore_best_weights=True)
-    
+
     history = model.fit(
-        X_train, y_train,
+        train_data,
         epochs=10,
-        batch_size=64,
-        validation_data=(X_val, y_val),
+        validation_data=val_data,
         class_weight=class_weight,
-        callbacks=[early_stopping, lr_scheduler]
+        callbacks=[early_stopping, lr_scheduler],
+        verbose=verbose
     )
-    # Plot training history (optional, can be skipped for other folds)
+    loss, accuracy = model.evaluate(val_data, verbose=0)
+    model.save(model_file)
+    print(f"Validation Accuracy (fold {fold}): {accuracy:.2f}", flush=True)
+
+    return {
+        "fold": fold,
+        "loss": float(loss),
+        "accuracy": float(accuracy),
+        "epochs": len(history.history["loss"]),
+        "seconds": round(time.perf_counter() - started, 2),
+        "history": {name: [float(v) for v in values] for name, values in history.history.items()},
+        "model_file": model_file,
+    }
+
+
+def plot_history(result, path):
+    history = result["history"]
     plt.figure(figsize=(12, 5))
     plt.subplot(1, 2, 1)
-    plt.plot(history.history['loss'], label='Train Loss')
-    plt.plot(history.history['val_loss'], label='Val Loss')
-    plt.title("Loss Over Epochs")
+    plt.plot(history['loss'], label='Train Loss')
+    plt.plot(history['val_loss'], label='Val Loss')
+    plt.title(f"Loss Over Epochs (fold {result['fold']})")
     plt.xlabel("Epoch")
     plt.ylabel("Loss")
     plt.legend()
 
     plt.subplot(1, 2, 2)
-    plt.plot(history.history['accuracy'], label='Train Accuracy')
-    plt.plot(history.history['val_accuracy'], label='Val Accuracy')
-    plt.title("Accuracy Over Epochs")
+    plt.plot(history['accuracy'], label='Train Accuracy')
+    plt.plot(history['val_accuracy'], label='Val Accuracy')
+    plt.title(f"Accuracy Over Epochs (fold {result['fold']})")
     plt.xlabel("Epoch")
     plt.ylabel("Accuracy")
     plt.legend()
 
     plt.tight_layout()
-    plt.savefig(f"model_assets/train_history_fold_{fold}.png")
+    plt.savefig(path)
     plt.close()
-    loss, accuracy = model.evaluate(X_val, y_val)
-    print(f"Validation Accuracy (fold {fold}): {accuracy:.2f}")
 
-    if accuracy > best_accuracy:
-        best_accuracy = accuracy
-        best_model = model
 
-# Save best model
-if best_model:
-    best_model.save(MODEL_FILE)
-    print(f"✅ Best model saved to '{MODEL_FILE}'")
+def main():
+    parser = argparse.ArgumentParser(description="Train the LSTM command classifier.")
+    parser.add_argument("--output-dir", default=DATASET_DIR,
+                        help="Where to write the model, tokenizer and training plots.")
+    parser.add_argument("--folds", type=int, default=3, help="Cross-validation folds.")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Folds trained at once, each in its own process.")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="TensorFlow threads per fold process (default: cores / jobs).")
+    parser.add_argument("--input", nargs="+",
+                        help="Stream CSV/NDJSON shards (globs or directories, .gz allowed) "
+                             f"through the input pipeline instead of loading {DATA_FILE}.")
+    parser.add_argument("--cache-dir", default=input_pipeline.DEFAULT_CACHE_DIR,
+                        help="Where --input keeps its encoded shards between runs.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-words", type=int, default=None,
+                        help="With --input, keep only the most frequent words.")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="With --input, tokenizer processes (default: all cores).")
+    args = parser.parse_args()
+    if args.folds < 2:
+        parser.error("--folds must be at least 2")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    model_file = os.path.join(args.output_dir, "lstm_attack_model.h5")
+    tokenizer_file = os.path.join(args.output_dir, "tokenizer.json")
+    metrics_file = os.path.join(args.output_dir, "cv_metrics.json")
+    jobs = max(1, min(args.jobs, args.folds))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // jobs)
+
+    with tempfile.TemporaryDirectory(dir=args.output_dir, prefix=".folds-") as work_dir:
+        if args.input:
+            # Streaming: the dataset is never loaded as a whole
+            tokenizer_text, shards = input_pipeline.prepare(
+                args.input, tokenizer_file, args.cache_dir, MAX_SEQUENCE_LENGTH,
+                args.processes, args.max_words,
+            )
+            word_index = json.loads(json.loads(tokenizer_text)["config"]["word_index"])
+            vocab_size = args.max_words or len(word_index) + 1
+            source = input_pipeline.RecordSource(
+                [shard["records_file"] for shard in shards if shard["rows"]],
+                args.folds, MAX_SEQUENCE_LENGTH, args.batch_size,
+            )
+        else:
+            # Load dataset
+            df = pd.read_csv(DATA_FILE)
+            print("Dataset sample:", df.head())
+
+            # Tokenizer setup
+            tokenizer = Tokenizer(oov_token="<UNK>")  # Handle unseen words
+            tokenizer.fit_on_texts(df["command"])
+            sequences = tokenizer.texts_to_sequences(df["command"])
+
+            # Save tokenizer
+            with open(tokenizer_file, "w") as f:
+                f.write(tokenizer.to_json())
+
+            X = pad_sequences(sequences, maxlen=MAX_SEQUENCE_LENGTH)
+            y = df["label"].map(label_mapping).values
+            vocab_size = len(tokenizer.word_index) + 1
+
+            # Cross-validation setup
+            skf = StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=42)
+            np.save(os.path.join(work_dir, "X.npy"), X)
+            np.save(os.path.join(work_dir, "y.npy"), y)
+            source = ArraySource(work_dir, list(skf.split(X, y)), args.batch_size)
+            del df, sequences, X, y
+
+        started = time.perf_counter()
+        fold_args = [
+            (fold, args.folds, source, vocab_size, os.path.join(work_dir, f"fold_{fold}.h5"))
+            for fold in range(1, args.folds + 1)
+        ]
+        if jobs == 1:
+            limit_threads(args.threads)
+            results = [train_fold(*a) for a in fold_args]
+        else:
+            print(f"Training {args.folds} folds, {jobs} at a time with {threads} threads each")
+            # Spawned, not forked: TensorFlow's runtime doesn't survive fork.
+            context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs, mp_context=context,
+                initializer=limit_threads, initargs=(threads,)
+            ) as pool:
+                # Per-epoch lines only: progress bars from several processes interleave.
+                futures = [pool.submit(train_fold, *a, verbose=2) for a in fold_args]
+                results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        for result in results:
+            plot_history(result, os.path.join(args.output_dir, f"train_history_fold_{result['fold']}.png"))
+
+        # Save best model
+        best = max(results, key=lambda result: result["accuracy"])
+        os.replace(best["model_file"], model_file)
+        print(f"✅ Best model (fold {best['fold']}, accuracy {best['accuracy']:.2f}) saved to '{model_file}'")
+
+    accuracies = [result["accuracy"] for result in results]
+    metrics = {
+        "folds": args.folds,
+        "jobs": jobs,
+        "threads": threads if jobs > 1 else (args.threads or None),
+        "seconds": round(elapsed, 2),
+        "best_fold": best["fold"],
+        "mean_accuracy": float(np.mean(accuracies)),
+        "std_accuracy": float(np.std(accuracies)),
+        "per_fold": [
+            {k: v for k, v in result.items() if k not in ("history", "model_file")}
+            for result in results
+        ],
+    }
+    with open(metrics_file, "w") as f:
+        json.dump(metrics, f, indent=2)
+    print(f"📊 Cross-validation: {metrics['mean_accuracy']:.3f} ± {metrics['std_accuracy']:.3f} "
+          f"accuracy in {elapsed:.1f}s; metrics saved to '{metrics_file}'")
+
+
+if __name__ == "__main__":
+    main()
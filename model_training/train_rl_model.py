@@ -4,7 +4,10 @@ import pandas as pd
 import tensorflow as tf
 from tensorflow.keras.preprocessing.sequence import pad_sequences
 import os
-import json
+import time
+import argparse
+
+import prediction_cache
 
 # ✅ Ensure TensorFlow uses the GPU efficiently
 gpus = tf.config.experimental.list_physical_devices('GPU')
@@ -18,14 +21,10 @@ if gpus:
 # ✅ Define dataset directory and file paths
 DATASET_DIR = "model_assets"
 DATA_FILE = os.path.join(DATASET_DIR, "attack_data.csv")
-Q_TABLE_FILE = os.path.join(DATASET_DIR, "q_table.npy")
 MODEL_FILE = os.path.join(DATASET_DIR, "lstm_attack_model.h5")
 TOKENIZER_FILE = os.path.join(DATASET_DIR, "tokenizer.json")
 MAX_SEQUENCE_LENGTH = 20
 
-# ✅ Load dataset
-df = pd.read_csv(DATA_FILE)
-
 # ✅ Q-learning hyperparameters
 NUM_STATES = 100  # Fixed state limit (avoid index out of bounds)
 NUM_ACTIONS = 3   # BENIGN (0), SUSPICIOUS (1), MALICIOUS (2)
@@ -39,81 +38,166 @@ reward_mapping = {
     1: 0.3,   # SUSPICIOUS → Increased reward to make it distinct
     2: 2.0    # MALICIOUS → Strongest reward (highest priority)
 }
-
+REWARDS = np.array([reward_mapping[action] for action in range(NUM_ACTIONS)])
 
 # ✅ Convert labels to integer format
 label_mapping = {"BENIGN": 0, "SUSPICIOUS": 1, "MALICIOUS": 2}
-df["label_int"] = df["label"].map(label_mapping)
 
-# ✅ Initialize Q-table
-Q_table = np.zeros((NUM_STATES, NUM_ACTIONS))
+# ✅ Batch size for faster processing
+BATCH_SIZE = 1024
+
+# Below this many states per step, finishing the updates in plain Python is faster.
+SCALAR_TAIL = 8
+
+
+def load_lstm():
+    # ✅ Load trained LSTM model
+    if not os.path.exists(MODEL_FILE):
+        raise FileNotFoundError(f"❌ LSTM model file '{MODEL_FILE}' not found!")
+    lstm_model = tf.keras.models.load_model(MODEL_FILE)
 
-# ✅ Load trained LSTM model
-if not os.path.exists(MODEL_FILE):
-    raise FileNotFoundError(f"❌ LSTM model file '{MODEL_FILE}' not found!")
-lstm_model = tf.keras.models.load_model(MODEL_FILE)
+    # ✅ Load tokenizer properly
+    if not os.path.exists(TOKENIZER_FILE):
+        raise FileNotFoundError(f"❌ Tokenizer file '{TOKENIZER_FILE}' not found!")
+    with open(TOKENIZER_FILE, 'r') as f:
+        tokenizer = tf.keras.preprocessing.text.tokenizer_from_json(f.read())
+    return lstm_model, tokenizer
 
-# ✅ Load tokenizer properly
-if not os.path.exists(TOKENIZER_FILE):
-    raise FileNotFoundError(f"❌ Tokenizer file '{TOKENIZER_FILE}' not found!")
-with open(TOKENIZER_FILE, 'r') as f:
-    tokenizer_data = json.load(f)
-    tokenizer_json_str = json.dumps(tokenizer_data)  # Convert to JSON string
-    tokenizer = tf.keras.preprocessing.text.tokenizer_from_json(tokenizer_json_str)
 
-def analyze_command_batch(commands):
+def predict_commands(commands):
     """
-    Tokenizes and processes a batch of commands using the trained LSTM model.
-    Returns softmax probability predictions.
+    Softmax predictions for every command, in batches of BATCH_SIZE.
     """
-    sequences = tokenizer.texts_to_sequences(commands)
-    padded_sequences = pad_sequences(sequences, maxlen=MAX_SEQUENCE_LENGTH)
-    predictions = lstm_model.predict(padded_sequences, verbose=0)
-    return predictions
-
-def determine_state(prediction):
+    lstm_model, tokenizer = load_lstm()
+    predictions = []
+    for start_idx in range(0, len(commands), BATCH_SIZE):
+        end_idx = min(start_idx + BATCH_SIZE, len(commands))
+        sequences = tokenizer.texts_to_sequences(commands[start_idx:end_idx])
+        padded_sequences = pad_sequences(sequences, maxlen=MAX_SEQUENCE_LENGTH)
+        predictions.append(lstm_model.predict(padded_sequences, verbose=0))
+        print(f"✅ Processed rows {start_idx + 1} to {end_idx}/{len(commands)}")
+    if not predictions:
+        return np.zeros((0, NUM_ACTIONS), dtype=np.float32)
+    return np.concatenate(predictions)
+
+
+def determine_states(predictions):
     """
-    Maps softmax probabilities to a Q-learning state (0-99).
-    Uses all three class probabilities to generate a more balanced state representation.
+    Maps softmax probabilities to Q-learning states (0-99), for all rows at
+    once. Same arithmetic as the per-row version, in the predictions' dtype.
     """
-    benign, suspicious, malicious = prediction
-    state = int((malicious * 80) + (suspicious * 40) - (benign * 20))  # Adjust scaling
+    benign, suspicious, malicious = predictions[:, 0], predictions[:, 1], predictions[:, 2]
+    states = np.trunc((malicious * 80) + (suspicious * 40) - (benign * 20)).astype(np.int64)
 
     # ✅ Ensure state is within valid bounds (0 to 99)
-    state = max(0, min(NUM_STATES - 1, state))
-    return state
+    return np.clip(states, 0, NUM_STATES - 1)
 
-# ✅ Batch size for faster processing
-BATCH_SIZE = 1024
 
-# ✅ Training loop for Q-table
-for start_idx in range(0, len(df), BATCH_SIZE):
-    end_idx = min(start_idx + BATCH_SIZE, len(df))
-    batch_df = df.iloc[start_idx:end_idx]
-    commands = batch_df["command"].tolist()
-    
-    # ✅ Get LSTM predictions
-    predictions = analyze_command_batch(commands)
-    
-    for idx, prediction in enumerate(predictions):
-        command = batch_df.iloc[idx]["command"]
-        label_int = batch_df.iloc[idx]["label_int"]
-        
-        state = determine_state(prediction)
-        action = label_int
+def update_sequential(Q_table, states, actions):
+    """The original row-by-row update; the reference `--check` compares against."""
+    for state, action in zip(states.tolist(), actions.tolist()):
         reward = reward_mapping.get(action, 0)
-
-        # ✅ Update Q-table with learning rate & discount factor
         current_value = Q_table[state, action]
         best_future = np.max(Q_table[state])  # Best future reward estimate
         Q_table[state, action] = (1 - ALPHA) * current_value + ALPHA * (reward + GAMMA * best_future + EPSILON)
+    return Q_table
 
-        # ✅ Debug unexpected cases
-        if state >= NUM_STATES:
-            print(f"⚠️ Warning: State {state} out of bounds for command '{command}'. Adjusting to {NUM_STATES - 1}")
 
-    print(f"✅ Processed rows {start_idx + 1} to {end_idx}/{len(df)}")
-
-# ✅ Save the trained Q-table
-np.save(Q_TABLE_FILE, Q_table)
-print(f"✅ Q-table trained and saved to '{Q_TABLE_FILE}'")
+def update_grouped(Q_table, states, actions):
+    """
+    Applies the same updates as `update_sequential`, in place and with the
+    same floating-point results, but a whole step of states at a time.
+
+    An update only reads and writes its own state's row, so what matters is
+    the order of updates within each state. Rows are ranked by occurrence
+    within their state (a stable argsort keeps the original order); step k
+    applies every state's k-th update together, since those touch distinct
+    rows. Once few states remain (one state seen far more often than the
+    rest), the tail runs as a plain Python loop on floats.
+    """
+    n = len(states)
+    if n == 0:
+        return Q_table
+    order = np.argsort(states, kind="stable")
+    sorted_states = states[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_states[1:] != sorted_states[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, n])
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n) - np.repeat(group_starts, group_sizes)
+
+    by_step = np.argsort(rank, kind="stable")
+    step_bounds = np.searchsorted(rank[by_step], np.arange(rank.max() + 2))
+    rewards = REWARDS[actions]
+    one_minus_alpha = 1 - ALPHA
+
+    for step in range(len(step_bounds) - 1):
+        rows = by_step[step_bounds[step]:step_bounds[step + 1]]
+        if len(rows) < SCALAR_TAIL:
+            break
+        s, a = states[rows], actions[rows]
+        current_value = Q_table[s, a]
+        best_future = Q_table[s].max(axis=1)
+        Q_table[s, a] = one_minus_alpha * current_value + ALPHA * (rewards[rows] + GAMMA * best_future + EPSILON)
+    else:
+        return Q_table
+
+    # The remaining updates, in their original order within each state.
+    tail = np.sort(by_step[step_bounds[step]:])
+    table = Q_table.tolist()
+    for state, action, reward in zip(states[tail].tolist(), actions[tail].tolist(), rewards[tail].tolist()):
+        row = table[state]
+        row[action] = one_minus_alpha * row[action] + ALPHA * (reward + GAMMA * max(row) + EPSILON)
+    Q_table[:] = table
+    return Q_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the Q-table on the LSTM's predictions.")
+    parser.add_argument("--output-dir", default=DATASET_DIR, help="Where to write the Q-table.")
+    parser.add_argument("--cache-dir", default=prediction_cache.DEFAULT_CACHE_DIR,
+                        help="Shared LSTM prediction cache; a hit skips inference entirely.")
+    parser.add_argument("--no-cache", action="store_true", help="Always run the LSTM.")
+    parser.add_argument("--check", action="store_true",
+                        help="Also run the row-by-row update and verify both tables are identical.")
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    q_table_file = os.path.join(args.output_dir, "q_table.npy")
+
+    # ✅ Load dataset
+    df = pd.read_csv(DATA_FILE)
+    df["label_int"] = df["label"].map(label_mapping)
+    unknown = df["label_int"].isna()
+    if unknown.any():
+        print(f"⚠️ Skipping {int(unknown.sum())} rows with unknown labels")
+        df = df[~unknown]
+    commands = df["command"].astype(str).tolist()
+    actions = df["label_int"].to_numpy(dtype=np.int64)
+
+    # ✅ Get LSTM predictions (cached per model bundle and dataset)
+    predictions = prediction_cache.cached_predictions(
+        commands, MODEL_FILE, TOKENIZER_FILE, MAX_SEQUENCE_LENGTH, predict_commands,
+        cache_dir=args.cache_dir, enabled=not args.no_cache,
+    )
+
+    started = time.perf_counter()
+    states = determine_states(np.asarray(predictions))
+    # ✅ Initialize Q-table and apply every update
+    Q_table = update_grouped(np.zeros((NUM_STATES, NUM_ACTIONS)), states, actions)
+    print(f"✅ Applied {len(states)} Q-updates in {time.perf_counter() - started:.3f}s")
+
+    if args.check:
+        started = time.perf_counter()
+        reference = update_sequential(np.zeros((NUM_STATES, NUM_ACTIONS)), states, actions)
+        elapsed = time.perf_counter() - started
+        if not np.array_equal(Q_table, reference):
+            raise SystemExit(f"❌ Grouped update differs from the sequential one "
+                             f"(max abs diff {np.max(np.abs(Q_table - reference))})")
+        print(f"✅ Identical to the sequential update ({elapsed:.3f}s)")
+
+    # ✅ Save the trained Q-table
+    np.save(q_table_file, Q_table)
+    print(f"✅ Q-table trained and saved to '{q_table_file}'")
+
+
+if __name__ == "__main__":
+    main()